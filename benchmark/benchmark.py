@@ -0,0 +1,611 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import socket
+import sys
+import time
+import uuid
+
+from argparse import ArgumentParser, Namespace
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import grpc
+import jwt
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from environs import Env
+
+from session_dsm_pb2 import RequestCreateGameSession, RequestTerminateGameSession
+from session_dsm_pb2_grpc import SessionDsmStub
+
+PROVIDERS: List[str] = ["DEMO", "GAMELIFT", "GAMELIFT_QUEUE", "GCP"]
+INTERCEPTORS: List[str] = ["auth", "logging", "metrics"]
+
+DEFAULT_NAMESPACE: str = "benchmark"
+DEFAULT_KEY_ID: str = "benchmark"
+DEFAULT_RESULTS_DIR: str = os.path.join(os.path.dirname(__file__), "results")
+
+LAG_SAMPLE_INTERVAL: float = 0.01
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    # in milliseconds
+    return {
+        "p50": round(percentile(values, 0.50) * 1000, 3),
+        "p95": round(percentile(values, 0.95) * 1000, 3),
+        "p99": round(percentile(values, 0.99) * 1000, 3),
+        "max": round(max(values) * 1000, 3) if values else 0.0,
+    }
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET6, socket.SOCK_STREAM) as s:
+        s.bind(("::", 0))
+        return s.getsockname()[1]
+
+
+def create_token(namespace: str) -> Tuple[str, str]:
+    """Returns a signed access token and the PEM public key that verifies it."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    public_key = (
+        private_key.public_key()
+        .public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+    now = int(time.time())
+    token = jwt.encode(
+        {
+            "sub": "benchmark",
+            "namespace": namespace,
+            "iat": now,
+            "exp": now + 3600,
+        },
+        private_key,
+        algorithm="RS256",
+        headers={"kid": DEFAULT_KEY_ID},
+    )
+    return token, public_key
+
+
+# server (runs in a child process)
+
+
+def create_service(provider: str, config: Dict[str, Any], logger: logging.Logger):
+    if provider == "DEMO":
+        from app.services.session_dsm_demo import AsyncSessionDsmDemoService
+
+        return AsyncSessionDsmDemoService(logger=logger), None
+
+    if provider in ("GAMELIFT", "GAMELIFT_QUEUE"):
+        from app.services.gamelift_fake import FakeGameLiftClient
+        from app.services.session_dsm_gamelift import AsyncSessionDsmGameLiftService
+
+        client = FakeGameLiftClient(
+            region_name=config["regions"][0],
+            latency=config["latency"],
+            jitter=config["jitter"],
+            error_rate=config["error_rate"],
+            placement_delay=config["placement_delay"],
+        )
+        service = AsyncSessionDsmGameLiftService(
+            region_name=config["regions"][0],
+            placement_queue="benchmark" if provider == "GAMELIFT_QUEUE" else None,
+            placement_poll_interval=config["poll_interval"],
+            gamelift_client=client,
+            logger=logger,
+        )
+        return service, client
+
+    if provider == "GCP":
+        from app.services.gcp_fake import FakeGcpInstancesClient
+        from app.services.session_dsm_gcp import AsyncSessionDsmGcpService
+
+        client = FakeGcpInstancesClient(
+            latency=config["latency"],
+            jitter=config["jitter"],
+            error_rate=config["error_rate"],
+            operation_delay=config["operation_delay"],
+            boot_delay=config["boot_delay"],
+        )
+        service = AsyncSessionDsmGcpService(
+            service_account_file="",
+            project_id="benchmark",
+            machine_type="e2-micro",
+            network_name="public",
+            repository_name="benchmark",
+            image_open_port=8080,
+            max_retries=int(config["timeout"] / config["poll_interval"]),
+            retry_interval=config["poll_interval"],
+            operation_poll_interval=config["poll_interval"],
+            ready_min_interval=config["poll_interval"],
+            instances_client=client,
+            logger=logger,
+        )
+        return service, client
+
+    raise NotImplementedError(provider)
+
+
+def create_interceptor_options(
+    interceptors: List[str], config: Dict[str, Any], logger: logging.Logger
+) -> List[Any]:
+    from accelbyte_grpc_plugin.app import AppOptionGRPCInterceptor
+
+    options = []
+    if "auth" in interceptors:
+        from accelbyte_py_sdk.core import AccelByteSDK
+
+        from accelbyte_grpc_plugin.interceptors.authorization import (
+            AuthorizationServerInterceptor,
+        )
+        from accelbyte_grpc_plugin.token_validation import (
+            SnapshotTokenValidator,
+            TokenValidationSnapshot,
+        )
+
+        # the JWKS is known up front, so the validator never calls IAM
+        token_validator = SnapshotTokenValidator(sdk=AccelByteSDK(), logger=logger)
+        token_validator.snapshot = TokenValidationSnapshot(
+            jwks={
+                DEFAULT_KEY_ID: serialization.load_pem_public_key(
+                    config["public_key"].encode()
+                )
+            }
+        )
+        options.append(
+            AppOptionGRPCInterceptor(
+                interceptor=AuthorizationServerInterceptor(
+                    namespace=config["namespace"],
+                    token_validator=token_validator,
+                )
+            )
+        )
+    if "logging" in interceptors:
+        from accelbyte_grpc_plugin.interceptors.logging import (
+            LoggingServerInterceptor,
+        )
+
+        # formatted and written, but to nowhere
+        rpc_logger = logging.getLogger("benchmark.rpc")
+        rpc_logger.setLevel(logging.DEBUG)
+        rpc_logger.propagate = False
+        rpc_logger.addHandler(logging.StreamHandler(open(os.devnull, "w")))
+        options.append(
+            AppOptionGRPCInterceptor(
+                interceptor=LoggingServerInterceptor(logger=rpc_logger)
+            )
+        )
+    if "metrics" in interceptors:
+        from accelbyte_grpc_plugin.interceptors.metrics import (
+            MetricsServerInterceptor,
+        )
+
+        options.append(AppOptionGRPCInterceptor(interceptor=MetricsServerInterceptor()))
+    return options
+
+
+async def sample_loop_lag(lags: List[float], recording: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled_at = loop.time() + LAG_SAMPLE_INTERVAL
+        await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+        if recording.is_set():
+            lags.append(max(0.0, loop.time() - scheduled_at))
+
+
+async def run_server(config: Dict[str, Any], conn) -> None:
+    from accelbyte_grpc_plugin.app import App, AppOptionGRPCService
+    from accelbyte_grpc_plugin.event_loop import get_event_loop_implementation
+    from app.services.idempotency import IdempotentSessionDsmService
+    from session_dsm_pb2_grpc import add_SessionDsmServicer_to_server
+
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.WARNING)
+    logger.addHandler(logging.StreamHandler())
+
+    provider_service, client = create_service(config["provider"], config, logger)
+    service = provider_service
+    if config["idempotency"]:
+        service = IdempotentSessionDsmService(service=service, logger=logger)
+
+    options = create_interceptor_options(config["interceptors"], config, logger)
+    options.append(
+        AppOptionGRPCService(
+            full_name=provider_service.full_name,
+            service=service,
+            add_service_fn=add_SessionDsmServicer_to_server,
+        )
+    )
+    app = App(
+        name="benchmark",
+        port=config["port"],
+        env=Env(),
+        logger=logger,
+        options=options,
+    )
+
+    loop = asyncio.get_running_loop()
+    lags: List[float] = []
+    recording = asyncio.Event()
+    sampler = asyncio.create_task(sample_loop_lag(lags, recording))
+    server = asyncio.create_task(app.run())
+    while not app.is_serving:
+        await asyncio.sleep(0.01)
+
+    conn.send("ready")
+    await loop.run_in_executor(None, conn.recv)
+    recording.set()
+    await loop.run_in_executor(None, conn.recv)
+    recording.clear()
+
+    await app.stop(grace=1.0)
+    await server
+    sampler.cancel()
+    placement_tracker = getattr(provider_service, "placement_tracker", None)
+    if placement_tracker is not None:
+        await placement_tracker.stop()
+    termination_reaper = getattr(
+        provider_service,
+        "termination_reaper",
+        getattr(provider_service, "delete_tracker", None),
+    )
+    if termination_reaper is not None:
+        await termination_reaper.stop(timeout=10)
+
+    conn.send(
+        {
+            "event_loop": get_event_loop_implementation(),
+            "loop_lag_ms": summarize(lags),
+            "backend_calls": dict(client.calls) if client is not None else {},
+        }
+    )
+
+
+def serve(config: Dict[str, Any], conn) -> None:
+    from accelbyte_grpc_plugin.event_loop import install_event_loop_policy
+
+    install_event_loop_policy(config["event_loop"])
+    asyncio.run(run_server(config, conn))
+
+
+# client (runs in the main process)
+
+
+class MethodStats:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, fn, *args, **kwargs) -> bool:
+        started_at = time.perf_counter()
+        try:
+            await fn(*args, **kwargs)
+        except grpc.aio.AioRpcError as error:
+            code = error.code().name
+            self.errors[code] = self.errors.get(code, 0) + 1
+            return False
+        self.latencies.append(time.perf_counter() - started_at)
+        return True
+
+    def to_dict(self, duration: float) -> Dict[str, Any]:
+        return {
+            "ok": len(self.latencies),
+            "errors": self.errors,
+            "rps": round(len(self.latencies) / duration, 2),
+            "latency_ms": summarize(self.latencies),
+        }
+
+
+async def drive(
+    args: Namespace, port: int, metadata: Tuple[Tuple[str, str], ...], conn
+) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+        stub = SessionDsmStub(channel)
+
+        async def session(
+            create_stats: MethodStats, terminate_stats: MethodStats
+        ) -> None:
+            async with semaphore:
+                session_id = uuid.uuid4().hex
+                created = await create_stats.call(
+                    stub.CreateGameSession,
+                    RequestCreateGameSession(
+                        namespace=args.namespace,
+                        session_id=session_id,
+                        deployment="benchmark",
+                        requested_region=args.regions,
+                        maximum_player=10,
+                    ),
+                    metadata=metadata,
+                    timeout=args.timeout,
+                )
+                if created and not args.no_terminate:
+                    await terminate_stats.call(
+                        stub.TerminateGameSession,
+                        RequestTerminateGameSession(
+                            namespace=args.namespace, session_id=session_id
+                        ),
+                        metadata=metadata,
+                        timeout=args.timeout,
+                    )
+
+        async def run_load(
+            duration: float, create_stats: MethodStats, terminate_stats: MethodStats
+        ) -> float:
+            # open loop: sessions start at the target rate, however long they take
+            loop = asyncio.get_running_loop()
+            tasks = []
+            started_at = loop.time()
+            for i in range(int(args.rps * duration)):
+                delay = started_at + i / args.rps - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(
+                    asyncio.ensure_future(session(create_stats, terminate_stats))
+                )
+            await asyncio.gather(*tasks)
+            return loop.time() - started_at
+
+        # imports, connections and caches warm up before anything is measured
+        if args.warmup > 0:
+            await run_load(args.warmup, MethodStats(), MethodStats())
+
+        create_stats = MethodStats()
+        terminate_stats = MethodStats()
+        conn.send("start")
+        duration = await run_load(args.duration, create_stats, terminate_stats)
+        conn.send("stop")
+
+    return {
+        "duration": round(duration, 3),
+        "CreateGameSession": create_stats.to_dict(duration),
+        "TerminateGameSession": terminate_stats.to_dict(duration),
+    }
+
+
+def run_one(
+    args: Namespace,
+    provider: str,
+    interceptors: List[str],
+    token: str,
+    public_key: str,
+) -> Dict[str, Any]:
+    port = find_free_port()
+    config = {
+        "provider": provider,
+        "interceptors": interceptors,
+        "port": port,
+        "namespace": args.namespace,
+        "public_key": public_key,
+        "idempotency": not args.no_idempotency,
+        "regions": args.regions,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "placement_delay": args.placement_delay,
+        "operation_delay": args.operation_delay,
+        "boot_delay": args.boot_delay,
+        "poll_interval": args.poll_interval,
+        "timeout": args.timeout,
+        "event_loop": args.event_loop,
+    }
+    metadata = (("authorization", f"Bearer {token}"),) if "auth" in interceptors else ()
+
+    context = multiprocessing.get_context("spawn")
+    conn, child_conn = context.Pipe()
+    process = context.Process(target=serve, args=(config, child_conn), daemon=True)
+    process.start()
+    try:
+        if not conn.poll(60) or conn.recv() != "ready":
+            raise RuntimeError(f"{provider} server did not start")
+        result = asyncio.run(drive(args, port, metadata, conn))
+        if not conn.poll(60):
+            raise RuntimeError(f"{provider} server did not report")
+        result.update(conn.recv())
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+    return {
+        "provider": provider,
+        "interceptors": interceptors,
+        **result,
+    }
+
+
+def get_run_key(run: Dict[str, Any]) -> str:
+    return f"{run['provider']}[{','.join(run['interceptors']) or 'none'}]"
+
+
+def print_runs(runs: List[Dict[str, Any]]) -> None:
+    header = (
+        f"{'configuration':<36} {'rps':>8} {'create p50/p95/p99 ms':>24}"
+        f" {'terminate p50/p95/p99 ms':>26} {'errors':>7} {'lag p99/max ms':>16}"
+    )
+    print(header)
+    print("-" * len(header))
+    for run in runs:
+        create = run["CreateGameSession"]
+        terminate = run["TerminateGameSession"]
+        errors = sum(create["errors"].values()) + sum(terminate["errors"].values())
+        latency = "/".join(
+            f"{create['latency_ms'][p]:.1f}" for p in ("p50", "p95", "p99")
+        )
+        terminate_latency = "/".join(
+            f"{terminate['latency_ms'][p]:.1f}" for p in ("p50", "p95", "p99")
+        )
+        lag = f"{run['loop_lag_ms']['p99']:.1f}/{run['loop_lag_ms']['max']:.1f}"
+        print(
+            f"{get_run_key(run):<36} {create['rps']:>8.1f} {latency:>24}"
+            f" {terminate_latency:>26} {errors:>7} {lag:>16}"
+        )
+
+
+def compare(
+    runs: List[Dict[str, Any]], baseline: Dict[str, Any], max_regression: float
+) -> bool:
+    """Prints the changes against the baseline, returns False if any p99 regressed too much."""
+    baseline_runs = {get_run_key(run): run for run in baseline.get("runs", [])}
+    passed = True
+    print(f"\ncompared to {baseline.get('started_at', 'baseline')}:")
+    for run in runs:
+        key = get_run_key(run)
+        base = baseline_runs.get(key)
+        if base is None:
+            print(f"{key:<36} (not in baseline)")
+            continue
+        changes = []
+        for method in ("CreateGameSession", "TerminateGameSession"):
+            before = base[method]["latency_ms"]["p99"]
+            after = run[method]["latency_ms"]["p99"]
+            change = (after - before) / before if before else 0.0
+            changes.append(f"{method} p99 {change:+.1%}")
+            if change > max_regression:
+                passed = False
+        before_rps = base["CreateGameSession"]["rps"]
+        after_rps = run["CreateGameSession"]["rps"]
+        if before_rps:
+            changes.append(f"rps {(after_rps - before_rps) / before_rps:+.1%}")
+        print(f"{key:<36} " + ", ".join(changes))
+    return passed
+
+
+def parse_args() -> Namespace:
+    parser = ArgumentParser(description="SessionDsm gRPC server benchmark")
+    parser.add_argument(
+        "--providers",
+        nargs="+",
+        default=["GAMELIFT", "GCP"],
+        choices=PROVIDERS,
+        help="providers to benchmark, each against its in-memory stand-in",
+    )
+    parser.add_argument(
+        "--interceptors",
+        nargs="+",
+        default=["none", "metrics", "auth,logging,metrics"],
+        help=f"interceptor configurations, comma separated from {INTERCEPTORS} or 'none'",
+    )
+    parser.add_argument("--rps", type=float, default=50.0, help="target sessions/s")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=2.0, help="seconds of load not measured"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=200, help="max sessions in flight"
+    )
+    parser.add_argument("--timeout", type=float, default=30.0, help="RPC deadline")
+    parser.add_argument(
+        "--regions", nargs="+", default=["us-west-2"], help="requested regions"
+    )
+    parser.add_argument("--namespace", default=DEFAULT_NAMESPACE)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds per backend call"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.02, help="max extra seconds per call"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of failing backend calls"
+    )
+    parser.add_argument("--placement-delay", type=float, default=0.5)
+    parser.add_argument("--operation-delay", type=float, default=0.2)
+    parser.add_argument("--boot-delay", type=float, default=0.5)
+    parser.add_argument(
+        "--poll-interval", type=float, default=0.1, help="provider polling interval"
+    )
+    parser.add_argument(
+        "--event-loop",
+        default="ASYNCIO",
+        help="server event loop: ASYNCIO, UVLOOP, WINLOOP or AUTO",
+    )
+    parser.add_argument("--no-idempotency", action="store_true")
+    parser.add_argument("--no-terminate", action="store_true")
+    parser.add_argument("--output", help="results file (default: results/<time>.json)")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="fail if a p99 latency grew more than this share over the baseline",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    started_at = datetime.now()
+
+    configurations = []
+    for value in args.interceptors:
+        interceptors = [] if value == "none" else value.split(",")
+        unknown = set(interceptors) - set(INTERCEPTORS)
+        if unknown:
+            raise SystemExit(f"unknown interceptors: {', '.join(sorted(unknown))}")
+        configurations.append(interceptors)
+
+    token, public_key = create_token(namespace=args.namespace)
+
+    runs = []
+    for provider in args.providers:
+        for interceptors in configurations:
+            run = run_one(args, provider, interceptors, token, public_key)
+            runs.append(run)
+            print(f"finished {get_run_key(run)}", file=sys.stderr)
+
+    results = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "parameters": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "grpc": grpc.__version__,
+            "cpus": os.cpu_count(),
+        },
+        "runs": runs,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        output = os.path.join(
+            DEFAULT_RESULTS_DIR, f"{started_at.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print_runs(runs)
+    print(f"\nresults saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(runs, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
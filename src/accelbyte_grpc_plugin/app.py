@@ -10,7 +10,9 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import signal
 
 from abc import ABC, abstractmethod
 from enum import IntEnum
@@ -41,6 +43,7 @@ class App:
     DEFAULT_NAME: str = "app"
     DEFAULT_PORT: int = 6565
     DEFAULT_LOG_LEVEL: Union[int, str] = logging.DEBUG
+    DEFAULT_TERMINATION_GRACE: float = 10.0
 
     def __init__(
         self,
@@ -50,6 +53,8 @@ class App:
         env: Optional[Env] = None,
         logger: Optional[Logger] = None,
         options: Optional[List[AppOption]] = None,
+        worker_id: Optional[int] = None,
+        termination_grace: Optional[float] = None,
     ) -> None:
         if env is None:
             env = Env()
@@ -62,6 +67,12 @@ class App:
                 port = env.int("PORT", self.DEFAULT_PORT)
             if log_level is None:
                 log_level = env.log_level("LOG_LEVEL", self.DEFAULT_LOG_LEVEL)
+            if worker_id is None:
+                worker_id = env.int("WORKER_ID", None)
+            if termination_grace is None:
+                termination_grace = env.float(
+                    "TERMINATION_GRACE", self.DEFAULT_TERMINATION_GRACE
+                )
 
         if logger is None:
             logger = logging.getLogger(name)
@@ -73,6 +84,8 @@ class App:
 
         self.name: str = name
         self.port: int = port
+        self.worker_id: Optional[int] = worker_id
+        self.termination_grace: float = termination_grace
         self.env: Env = env
         self.logger: Logger = logger
         self.options: List[AppOption] = list(
@@ -81,11 +94,19 @@ class App:
 
         self.grpc_interceptors: List[ServerInterceptor] = [aio_server_interceptor()]
         self.grpc_server: Optional[Server] = None
+        self.grpc_server_options: List[Tuple[str, Any]] = []
+        self.grpc_server_maximum_concurrent_rpcs: Optional[int] = None
+        self.grpc_server_compression: Optional[grpc.Compression] = None
         self.grpc_service_names: List[str] = []
         self.otel_metric_readers: List[MetricReader] = []
         self.otel_resource: Resource = Resource({RESOURCE_SERVICE_NAME: self.name})
 
         self.is_initialized: bool = False
+        self.is_serving: bool = False
+
+        if self.worker_id is not None:
+            # every worker process binds the same port, the kernel balances connections
+            self.grpc_server_options.append(("grpc.so_reuseport", 1))
 
     def initialize(self, *args, **kwargs) -> None:
         if self.is_initialized:
@@ -128,7 +149,12 @@ class App:
             **kwargs,
         )
 
-        self.grpc_server = grpc.aio.server(interceptors=self.grpc_interceptors)
+        self.grpc_server = grpc.aio.server(
+            interceptors=self.grpc_interceptors,
+            options=self.grpc_server_options,
+            maximum_concurrent_rpcs=self.grpc_server_maximum_concurrent_rpcs,
+            compression=self.grpc_server_compression,
+        )
         self.logger.info("gRPC server created")
 
         self.apply_option_range(
@@ -162,10 +188,34 @@ class App:
         self.grpc_server.add_insecure_port("[::]:{}".format(self.port))
         self.logger.info("gRPC server is starting")
         await self.grpc_server.start()
+        self.is_serving = True
+
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(
+                    signum, lambda: asyncio.ensure_future(self.stop())
+                )
+            except (NotImplementedError, RuntimeError):
+                # not supported on this platform or outside the main thread
+                pass
 
         await self.grpc_server.wait_for_termination(timeout=termination_timeout)
+        self.is_serving = False
         self.logger.info("gRPC server has terminated")
 
+    async def stop(self, grace: Optional[float] = None) -> None:
+        if self.grpc_server is None:
+            return
+
+        if grace is None:
+            grace = self.termination_grace
+
+        # report not ready while in-flight RPCs drain
+        self.is_serving = False
+        self.logger.info("gRPC server is stopping (grace: %ss)", grace)
+        await self.grpc_server.stop(grace)
+
     # noinspection PyShadowingBuiltins
     def apply_option_range(
         self, range: Union[int, Tuple[int, int]], /, *args, **kwargs
@@ -0,0 +1,101 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - prometheus-client
+# - uvloop (optional, or winloop on Windows)
+
+import asyncio
+import importlib
+import logging
+import sys
+
+from logging import Logger
+from typing import Dict, List, Optional
+
+from prometheus_client import Gauge
+
+EVENT_LOOP_INFO = Gauge(
+    name="event_loop_info",
+    documentation="event loop implementation the process runs on",
+    labelnames=["implementation"],
+    multiprocess_mode="max",
+)
+
+DEFAULT_EVENT_LOOP: str = "ASYNCIO"
+
+# faster drop-in loops, by name, in order of preference for AUTO
+EVENT_LOOP_MODULES: Dict[str, str] = {
+    "UVLOOP": "uvloop",
+    "WINLOOP": "winloop",
+}
+
+
+def install_event_loop_policy(
+    name: Optional[str] = None, logger: Optional[Logger] = None
+) -> str:
+    """Installs the event loop policy of `name` and returns the implementation used.
+
+    `name` is ASYNCIO (the standard loop), UVLOOP, WINLOOP, or AUTO for the first
+    of them that is installed. Must be called before the loop is created, i.e.
+    before `asyncio.run`. When the requested loop is not installed, the standard
+    loop is used and a warning is logged.
+    """
+
+    if name is None:
+        name = DEFAULT_EVENT_LOOP
+
+    if logger is None:
+        logger = logging.getLogger("event_loop")
+
+    name = name.upper()
+    if name == "ASYNCIO":
+        return "asyncio"
+    if name == "AUTO":
+        candidates: List[str] = list(EVENT_LOOP_MODULES.values())
+    elif name in EVENT_LOOP_MODULES:
+        candidates = [EVENT_LOOP_MODULES[name]]
+    else:
+        raise ValueError(f"unknown event loop: {name}")
+
+    for module_name in candidates:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        asyncio.set_event_loop_policy(module.EventLoopPolicy())
+        return module_name
+
+    if name != "AUTO":
+        logger.warning(
+            "event loop %s is not installed, falling back to asyncio", name.lower()
+        )
+    return "asyncio"
+
+
+def get_event_loop_implementation(
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> str:
+    """Returns the top-level module of the (running) loop's class, e.g. 'uvloop'."""
+
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    return type(loop).__module__.split(".")[0]
+
+
+def report_event_loop(logger: Logger) -> str:
+    """Logs the running loop's implementation and exports it as `event_loop_info`."""
+
+    implementation = get_event_loop_implementation()
+    EVENT_LOOP_INFO.labels(implementation=implementation).set(1)
+    logger.info("event loop: %s (python %s)", implementation, sys.version.split(" ")[0])
+    return implementation
+
+
+__all__ = [
+    "DEFAULT_EVENT_LOOP",
+    "get_event_loop_implementation",
+    "install_event_loop_policy",
+    "report_event_loop",
+]
@@ -5,8 +5,12 @@
 # requires:
 # - grpcio
 # - accelbyte-py-sdk
+# - prometheus-client
 
-from typing import Awaitable, Callable, List, Optional
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import grpc
 from grpc import HandlerCallDetails, RpcMethodHandler, StatusCode
@@ -14,9 +18,36 @@ from grpc.aio import ServerInterceptor
 
 from accelbyte_py_sdk.services.auth import parse_access_token
 from accelbyte_py_sdk.token_validation import TokenValidatorProtocol
+from prometheus_client import Counter
+
+TOKEN_CACHE_REQUESTS = Counter(
+    name="grpc_server_auth_token_cache_requests",
+    documentation="number of verified-token cache lookups by result (hit or miss)",
+    labelnames=["result"],
+)
+
+AuthorizationError = Tuple[str, StatusCode]
+
+
+class VerifiedTokenEntry:
+    __slots__ = ("claims", "error", "expires_at")
+
+    def __init__(
+        self,
+        claims: Dict[str, Any],
+        error: Optional[AuthorizationError],
+        expires_at: float,
+    ) -> None:
+        self.claims = claims
+        self.error = error
+        self.expires_at = expires_at
 
 
 class AuthorizationServerInterceptor(ServerInterceptor):
+    DEFAULT_CACHE_SIZE: int = 1024
+    # bounds how long a revoked token can still be accepted from the cache
+    DEFAULT_CACHE_MAX_TTL: float = 300.0
+
     whitelisted_methods: List[str] = [
         "/grpc.health.v1.Health/Check",
         "/grpc.health.v1.Health/Watch",
@@ -29,11 +60,20 @@ class AuthorizationServerInterceptor(ServerInterceptor):
         token_validator: TokenValidatorProtocol,
         resource: Optional[str] = None,
         action: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        cache_max_ttl: Optional[float] = None,
     ) -> None:
         self.namespace = namespace
         self.token_validator = token_validator
         self.resource = resource
         self.action = action
+        self.cache_size = (
+            cache_size if cache_size is not None else self.DEFAULT_CACHE_SIZE
+        )
+        self.cache_max_ttl = (
+            cache_max_ttl if cache_max_ttl is not None else self.DEFAULT_CACHE_MAX_TTL
+        )
+        self.cache: OrderedDict[bytes, VerifiedTokenEntry] = OrderedDict()
 
     async def intercept_service(
         self,
@@ -62,30 +102,61 @@ class AuthorizationServerInterceptor(ServerInterceptor):
 
         try:
             token = authorization.removeprefix("Bearer ")
-            error = self.token_validator.validate_token(
-                token=token,
-                resource=self.resource,
-                action=self.action,
-                namespace=self.namespace,
-            )
-            if error is not None:
-                return self.create_aio_rpc_error(error=str(error))
-
-            claims, error = parse_access_token(token)
+            error = self.authorize(token=token)
             if error is not None:
-                return self.create_aio_rpc_error(error=str(error))
-
-            if extend_namespace := claims.get("extend_namespace", None):
-                if extend_namespace != self.namespace:
-                    return self.create_aio_rpc_error(
-                        error=f"'{extend_namespace}' does not match '{self.namespace}'",
-                        code=StatusCode.PERMISSION_DENIED,
-                    )
+                return self.create_aio_rpc_error(error=error[0], code=error[1])
         except Exception as error:
             return self.create_aio_rpc_error(error=str(error), code=StatusCode.INTERNAL)
 
         return await continuation(handler_call_details)
 
+    def authorize(self, token: str) -> Optional[AuthorizationError]:
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self.cache.move_to_end(key)
+                TOKEN_CACHE_REQUESTS.labels(result="hit").inc()
+                return entry.error
+            del self.cache[key]
+        TOKEN_CACHE_REQUESTS.labels(result="miss").inc()
+
+        error = self.token_validator.validate_token(
+            token=token,
+            resource=self.resource,
+            action=self.action,
+            namespace=self.namespace,
+        )
+        if error is not None:
+            # failures are not cached, they may be transient (e.g. JWKS not yet fetched)
+            return str(error), StatusCode.UNAUTHENTICATED
+
+        claims, error = parse_access_token(token)
+        if error is not None:
+            return str(error), StatusCode.UNAUTHENTICATED
+
+        decision: Optional[AuthorizationError] = None
+        if extend_namespace := claims.get("extend_namespace", None):
+            if extend_namespace != self.namespace:
+                decision = (
+                    f"'{extend_namespace}' does not match '{self.namespace}'",
+                    StatusCode.PERMISSION_DENIED,
+                )
+
+        if self.cache_size > 0:
+            expires_at = now + self.cache_max_ttl
+            if exp := claims.get("exp", None):
+                expires_at = min(expires_at, float(exp))
+            self.cache[key] = VerifiedTokenEntry(
+                claims=claims, error=decision, expires_at=expires_at
+            )
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return decision
+
     @staticmethod
     def create_aio_rpc_error(error: str, code: StatusCode = StatusCode.UNAUTHENTICATED):
         async def abort(ignored_request, context):
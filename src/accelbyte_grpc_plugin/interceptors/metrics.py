@@ -5,26 +5,77 @@
 # requires:
 # - prometheus-client
 
+import asyncio
 import platform
-from typing import Any, Awaitable, Callable, Dict, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
 
-from grpc import HandlerCallDetails, RpcMethodHandler
+import grpc
+from grpc import HandlerCallDetails, RpcMethodHandler, StatusCode
 from grpc.aio import ServerInterceptor
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 
 class MetricsServerInterceptor(ServerInterceptor):
+    DEFAULT_BUCKETS: Sequence[float] = (
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1.0,
+        2.5,
+        5.0,
+        10.0,
+        30.0,
+        60.0,
+        120.0,
+        300.0,
+    )
+    DEFAULT_SIZE_BUCKETS: Sequence[float] = tuple(4.0**i for i in range(1, 11))
+
     def __init__(
         self,
         labels: Optional[Dict[str, Any]] = None,
+        buckets: Optional[Sequence[float]] = None,
+        size_buckets: Optional[Sequence[float]] = None,
     ) -> None:
         self.labels = labels if labels else {"os": platform.system().lower()}
+        self.buckets = buckets if buckets else self.DEFAULT_BUCKETS
+        self.size_buckets = size_buckets if size_buckets else self.DEFAULT_SIZE_BUCKETS
+        labelnames = list(self.labels.keys())
         self.counter = Counter(
             name="grpc_server_calls",
             documentation="number of gRPC calls",
-            labelnames=self.labels.keys(),
+            labelnames=labelnames,
             unit="count",
         )
+        self.handling_seconds = Histogram(
+            name="grpc_server_handling_seconds",
+            documentation="time taken to handle gRPC calls",
+            labelnames=[*labelnames, "grpc_method", "grpc_code"],
+            buckets=self.buckets,
+        )
+        self.in_flight = Gauge(
+            name="grpc_server_in_flight",
+            documentation="number of gRPC calls currently being handled",
+            labelnames=[*labelnames, "grpc_method"],
+            multiprocess_mode="livesum",
+        )
+        self.request_bytes = Histogram(
+            name="grpc_server_request_bytes",
+            documentation="size of gRPC request messages",
+            labelnames=[*labelnames, "grpc_method"],
+            buckets=self.size_buckets,
+        )
+        self.response_bytes = Histogram(
+            name="grpc_server_response_bytes",
+            documentation="size of gRPC response messages",
+            labelnames=[*labelnames, "grpc_method"],
+            buckets=self.size_buckets,
+        )
 
     async def intercept_service(
         self,
@@ -32,4 +83,60 @@ class MetricsServerInterceptor(ServerInterceptor):
         handler_call_details: HandlerCallDetails,
     ) -> RpcMethodHandler:
         self.counter.labels(**self.labels).inc(amount=1)
-        return await continuation(handler_call_details)
+        handler = await continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+        # noinspection PyUnresolvedReferences
+        return self.wrap_unary_unary(handler, handler_call_details.method)
+
+    def wrap_unary_unary(self, handler: RpcMethodHandler, method: str):
+        behavior = handler.unary_unary
+
+        async def unary_unary(request, context):
+            in_flight = self.in_flight.labels(**self.labels, grpc_method=method)
+            in_flight.inc()
+            self.observe_size(self.request_bytes, method, request)
+            code = StatusCode.UNKNOWN
+            start = time.perf_counter()
+            try:
+                response = await behavior(request, context)
+                code = self.get_code(context, default=StatusCode.OK)
+                self.observe_size(self.response_bytes, method, response)
+                return response
+            except asyncio.CancelledError:
+                code = StatusCode.CANCELLED
+                raise
+            except BaseException:
+                code = self.get_code(context, default=StatusCode.UNKNOWN)
+                if code == StatusCode.OK:
+                    code = StatusCode.UNKNOWN
+                raise
+            finally:
+                self.handling_seconds.labels(
+                    **self.labels, grpc_method=method, grpc_code=code.name
+                ).observe(time.perf_counter() - start)
+                in_flight.dec()
+
+        return grpc.unary_unary_rpc_method_handler(
+            unary_unary,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+
+    def observe_size(self, histogram: Histogram, method: str, message: Any) -> None:
+        byte_size = getattr(message, "ByteSize", None)
+        if byte_size is not None:
+            histogram.labels(**self.labels, grpc_method=method).observe(byte_size())
+
+    @staticmethod
+    def get_code(context: Any, default: StatusCode) -> StatusCode:
+        try:
+            code = context.code()
+        except (AttributeError, NotImplementedError):
+            return default
+        if code is None:
+            return default
+        if isinstance(code, StatusCode):
+            return code
+        # the aio context may report the raw integer status code
+        return next((c for c in StatusCode if c.value[0] == code), default)
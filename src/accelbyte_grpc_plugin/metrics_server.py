@@ -0,0 +1,124 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - prometheus-client
+
+import socket
+import threading
+import time
+
+from socketserver import ThreadingMixIn
+from typing import Callable, Iterable, Optional
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from prometheus_client import REGISTRY, CollectorRegistry, Histogram, make_wsgi_app
+
+SCRAPE_SECONDS = Histogram(
+    name="metrics_server_scrape_seconds",
+    documentation="time taken to collect and encode the metrics on a scrape",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class ThreadingWSGIServerV6(ThreadingWSGIServer):
+    address_family = socket.AF_INET6
+
+
+class SilentWSGIRequestHandler(WSGIRequestHandler):
+    # noinspection PyShadowingBuiltins
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class MetricsServer:
+    """Serves `/metrics`, `/healthz` and `/readyz` from a small threaded WSGI server.
+
+    Metrics are rendered by `prometheus_client.make_wsgi_app`, which negotiates
+    the OpenMetrics format and gzip compression from the request headers. The
+    server only wakes up on requests, so idle time costs nothing and a scrape
+    holds the GIL only while the registry is collected and encoded.
+
+    `/readyz` answers 200 while `is_ready` returns True and 503 otherwise.
+    """
+
+    DEFAULT_ENDPOINT: str = "/metrics"
+    HEALTH_ENDPOINT: str = "/healthz"
+    READY_ENDPOINT: str = "/readyz"
+
+    def __init__(
+        self,
+        addr: str,
+        port: int,
+        endpoint: Optional[str] = None,
+        registry: CollectorRegistry = REGISTRY,
+        is_ready: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self.addr = addr
+        self.port = port
+        self.endpoint = endpoint if endpoint else self.DEFAULT_ENDPOINT
+        self.metrics_app = make_wsgi_app(registry=registry)
+        self.is_ready = is_ready
+
+        self.server: Optional[WSGIServer] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.server is not None:
+            return
+        server_class = (
+            ThreadingWSGIServerV6 if ":" in self.addr else ThreadingWSGIServer
+        )
+        self.server = make_server(
+            self.addr,
+            self.port,
+            self.wsgi_app,
+            server_class=server_class,
+            handler_class=SilentWSGIRequestHandler,
+        )
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="metrics-server", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        self.thread = None
+
+    def wsgi_app(self, environ, start_response) -> Iterable[bytes]:
+        path = environ.get("PATH_INFO", "")
+        if path == self.endpoint:
+            start = time.perf_counter()
+            try:
+                return self.metrics_app(environ, start_response)
+            finally:
+                SCRAPE_SECONDS.observe(time.perf_counter() - start)
+        if path == self.HEALTH_ENDPOINT:
+            return self.respond(start_response, "200 OK", b"ok")
+        if path == self.READY_ENDPOINT:
+            if self.is_ready is None or self.is_ready():
+                return self.respond(start_response, "200 OK", b"ready")
+            return self.respond(start_response, "503 Service Unavailable", b"not ready")
+        return self.respond(start_response, "404 Not Found", b"not found")
+
+    @staticmethod
+    def respond(start_response, status: str, body: bytes) -> Iterable[bytes]:
+        start_response(
+            status,
+            [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))],
+        )
+        return [body]
+
+
+__all__ = [
+    "MetricsServer",
+]
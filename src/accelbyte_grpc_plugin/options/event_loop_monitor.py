@@ -0,0 +1,215 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - environs
+# - grpcio
+# - prometheus-client
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+import grpc
+from grpc import HandlerCallDetails, RpcMethodHandler
+from grpc.aio import ServerInterceptor
+from prometheus_client import Counter, Histogram
+
+from ..app import App, AppOptionApplyOrderEnum, AppOptionBase
+
+EVENT_LOOP_LAG = Histogram(
+    name="event_loop_lag_seconds",
+    documentation="delay of the event loop in running a callback scheduled to run now",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_BLOCKED = Counter(
+    name="event_loop_blocked",
+    documentation="number of times the event loop was blocked longer than the threshold, by gRPC method",
+    labelnames=["grpc_method"],
+)
+
+
+class InFlightMethodInterceptor(ServerInterceptor):
+    """Remembers the gRPC method every RPC task is handling."""
+
+    def __init__(self) -> None:
+        self.methods: Dict[asyncio.Task, str] = {}
+
+    async def intercept_service(
+        self,
+        continuation: Callable[[HandlerCallDetails], Awaitable[RpcMethodHandler]],
+        handler_call_details: HandlerCallDetails,
+    ) -> RpcMethodHandler:
+        handler = await continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+        # noinspection PyUnresolvedReferences
+        return self.wrap_unary_unary(handler, handler_call_details.method)
+
+    def wrap_unary_unary(self, handler: RpcMethodHandler, method: str):
+        behavior = handler.unary_unary
+
+        async def unary_unary(request, context):
+            task = asyncio.current_task()
+            if task is not None:
+                self.methods[task] = method
+            try:
+                return await behavior(request, context)
+            finally:
+                if task is not None:
+                    self.methods.pop(task, None)
+
+        return grpc.unary_unary_rpc_method_handler(
+            unary_unary,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+
+    def get_method(self, task: Optional[asyncio.Task]) -> str:
+        if task is None:
+            return "unknown"
+        return self.methods.get(task, "unknown")
+
+
+class AppOptionEventLoopMonitor(AppOptionBase):
+    """Measures the event loop lag and exports it as a histogram.
+
+    A task sleeps for `interval` seconds at a time and records how much later
+    than scheduled it woke up. Blocking calls made on the loop thread (e.g. a
+    synchronous SDK call inside a coroutine) show up as lag.
+
+    In debug mode a second task updates a heartbeat every quarter of
+    `block_threshold`, independently of `interval`, and a watchdog thread checks
+    that it keeps coming. When the loop has been stuck for more than
+    `block_threshold` seconds, it logs the stack of the loop thread and the gRPC
+    method whose task is running, once per stall. Debug mode adds an
+    interceptor, so it costs a little on every RPC.
+    """
+
+    DEFAULT_INTERVAL: float = 0.5
+    DEFAULT_DEBUG: bool = False
+    DEFAULT_BLOCK_THRESHOLD: float = 0.1
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        debug: Optional[bool] = None,
+        block_threshold: Optional[float] = None,
+    ) -> None:
+        self.interval = interval
+        self.debug = debug
+        self.block_threshold = block_threshold
+
+        self.interceptor: Optional[InFlightMethodInterceptor] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.heartbeat: float = 0.0
+        self.heartbeat_interval: float = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.watchdog: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    def apply(self, app: App, /, *args, **kwargs) -> None:
+        with app.env.prefixed("EVENT_LOOP_MONITOR_"):
+            if self.interval is None:
+                self.interval = app.env.float("INTERVAL", self.DEFAULT_INTERVAL)
+            if self.debug is None:
+                self.debug = app.env.bool("DEBUG", self.DEFAULT_DEBUG)
+            if self.block_threshold is None:
+                self.block_threshold = app.env.float(
+                    "BLOCK_THRESHOLD", self.DEFAULT_BLOCK_THRESHOLD
+                )
+
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            app.logger.warning("event loop monitor not started: no running loop")
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.task = self.loop.create_task(self.measure())
+
+        if self.debug:
+            self.heartbeat_interval = self.block_threshold / 4
+            self.heartbeat = time.monotonic()
+            self.heartbeat_task = self.loop.create_task(self.beat())
+            self.interceptor = InFlightMethodInterceptor()
+            app.grpc_interceptors.append(self.interceptor)
+            self.watchdog = threading.Thread(
+                target=self.watch,
+                args=(app,),
+                name="event-loop-watchdog",
+                daemon=True,
+            )
+            self.watchdog.start()
+
+        app.logger.info(
+            "event loop monitor started (interval: %ss, debug: %s)",
+            self.interval,
+            self.debug,
+        )
+
+    async def measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled_at = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, loop.time() - scheduled_at))
+
+    async def beat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.heartbeat = time.monotonic()
+
+    def watch(self, app: App) -> None:
+        # the heartbeat is late by up to one period even when the loop is idle
+        threshold = self.heartbeat_interval + self.block_threshold
+        reported = 0.0
+        while not self.stopped.wait(self.heartbeat_interval):
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat
+            if stalled < threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            method = self.get_running_method()
+            EVENT_LOOP_BLOCKED.labels(grpc_method=method).inc()
+            app.logger.warning(
+                "event loop blocked for %.3fs (method: %s), stack:\n%s",
+                stalled - self.heartbeat_interval,
+                method,
+                stack,
+            )
+
+    def get_running_method(self) -> str:
+        try:
+            # reads the loop's current task from this thread, the loop is stuck anyway
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            task = None
+        return self.interceptor.get_method(task) if self.interceptor else "unknown"
+
+    async def stop(self) -> None:
+        self.stopped.set()
+        tasks = [task for task in (self.task, self.heartbeat_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+        self.heartbeat_task = None
+
+    def get_order(self) -> Union[int, AppOptionApplyOrderEnum]:
+        return AppOptionApplyOrderEnum.CREATE_GRPC_SERVER - 1
+
+
+__all__ = [
+    "AppOptionEventLoopMonitor",
+]
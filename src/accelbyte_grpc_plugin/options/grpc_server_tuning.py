@@ -0,0 +1,107 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - environs
+# - grpcio
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import grpc
+
+from ..app import App, AppOptionApplyOrderEnum, AppOptionBase
+
+
+class AppOptionGRPCServerTuning(AppOptionBase):
+    """Builds the gRPC server tuning profile from `SERVICE_GRPC_`-prefixed env vars.
+
+    Unset env vars keep the gRPC core defaults. `MAX_CONCURRENT_RPCS` sheds load
+    by rejecting RPCs above the limit with RESOURCE_EXHAUSTED.
+    """
+
+    # (env var, gRPC channel argument, env parser)
+    CHANNEL_ARGUMENTS: List[Tuple[str, str, str]] = [
+        ("MAX_CONCURRENT_STREAMS", "grpc.max_concurrent_streams", "int"),
+        ("MAX_RECEIVE_MESSAGE_LENGTH", "grpc.max_receive_message_length", "int"),
+        ("MAX_SEND_MESSAGE_LENGTH", "grpc.max_send_message_length", "int"),
+        ("KEEPALIVE_TIME_MS", "grpc.keepalive_time_ms", "int"),
+        ("KEEPALIVE_TIMEOUT_MS", "grpc.keepalive_timeout_ms", "int"),
+        (
+            "KEEPALIVE_PERMIT_WITHOUT_CALLS",
+            "grpc.keepalive_permit_without_calls",
+            "bool",
+        ),
+        ("MAX_CONNECTION_IDLE_MS", "grpc.max_connection_idle_ms", "int"),
+        ("MAX_CONNECTION_AGE_MS", "grpc.max_connection_age_ms", "int"),
+        ("MAX_CONNECTION_AGE_GRACE_MS", "grpc.max_connection_age_grace_ms", "int"),
+        ("HTTP2_MAX_PING_STRIKES", "grpc.http2.max_ping_strikes", "int"),
+        (
+            "HTTP2_MIN_PING_INTERVAL_WITHOUT_DATA_MS",
+            "grpc.http2.min_ping_interval_without_data_ms",
+            "int",
+        ),
+        ("HTTP2_BDP_PROBE", "grpc.http2.bdp_probe", "bool"),
+        ("HTTP2_LOOKAHEAD_BYTES", "grpc.http2.lookahead_bytes", "int"),
+        ("HTTP2_MAX_FRAME_SIZE", "grpc.http2.max_frame_size", "int"),
+        ("HTTP2_WRITE_BUFFER_SIZE", "grpc.http2.write_buffer_size", "int"),
+    ]
+
+    COMPRESSIONS: Dict[str, grpc.Compression] = {
+        "none": grpc.Compression.NoCompression,
+        "gzip": grpc.Compression.Gzip,
+        "deflate": grpc.Compression.Deflate,
+    }
+
+    def __init__(
+        self,
+        options: Optional[Dict[str, Any]] = None,
+        maximum_concurrent_rpcs: Optional[int] = None,
+        compression: Optional[grpc.Compression] = None,
+    ) -> None:
+        self.options = options if options is not None else {}
+        self.maximum_concurrent_rpcs = maximum_concurrent_rpcs
+        self.compression = compression
+
+    def apply(self, app: App, /, *args, **kwargs) -> None:
+        options: Dict[str, Any] = {}
+
+        with app.env.prefixed("SERVICE_GRPC_"):
+            for env_name, argument, parser in self.CHANNEL_ARGUMENTS:
+                value = getattr(app.env, parser)(env_name, None)
+                if value is not None:
+                    options[argument] = int(value)
+            if self.maximum_concurrent_rpcs is None:
+                self.maximum_concurrent_rpcs = app.env.int("MAX_CONCURRENT_RPCS", None)
+            if self.compression is None:
+                compression = app.env.str("COMPRESSION", None)
+                if compression:
+                    self.compression = self.get_compression(compression)
+
+        options.update(self.options)
+
+        app.grpc_server_options.extend(options.items())
+        if self.maximum_concurrent_rpcs is not None:
+            app.grpc_server_maximum_concurrent_rpcs = self.maximum_concurrent_rpcs
+        if self.compression is not None:
+            app.grpc_server_compression = self.compression
+
+        app.logger.info("gRPC server tuning: %s", options)
+
+    @classmethod
+    def get_compression(cls, name: str) -> grpc.Compression:
+        compression = cls.COMPRESSIONS.get(name.strip().lower())
+        if compression is None:
+            raise ValueError(
+                f"Invalid SERVICE_GRPC_COMPRESSION {name!r},"
+                f" expected one of: {', '.join(cls.COMPRESSIONS)}"
+            )
+        return compression
+
+    def get_order(self) -> Union[int, AppOptionApplyOrderEnum]:
+        return AppOptionApplyOrderEnum.CREATE_GRPC_SERVER - 1
+
+
+__all__ = [
+    "AppOptionGRPCServerTuning",
+]
@@ -3,20 +3,225 @@
 # and restrictions contact your company contract manager.
 
 # requires:
+# - prometheus-client
 # - python-logging-loki
 
-from typing import Optional
+import gzip
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+from typing import Any, Dict, List, Optional, Tuple
 
 import logging_loki
+from logging_loki.emitter import BasicAuth, LokiEmitterV1
+from prometheus_client import Counter
 
 from ..app import App, AppOptionBase
 
+LOKI_RECORDS = Counter(
+    name="loki_handler_records",
+    documentation="number of log records handled by the batching Loki handler by result (sent or dropped)",
+    labelnames=["result"],
+)
+LOKI_PUSHES = Counter(
+    name="loki_handler_pushes",
+    documentation="number of batches pushed to Loki by result (success or failure)",
+    labelnames=["result"],
+)
+
+LokiEntry = Tuple[Tuple[Tuple[str, str], ...], str, str]
+
+
+class BatchingLokiHandler(logging.Handler):
+    """Ships log records to Loki from a background thread.
+
+    `emit` only formats the record and puts it on a bounded queue, so logging
+    never waits on Loki. The shipper thread groups the records by label set and
+    pushes them as one gzip-compressed request when `batch_size` records or
+    `batch_bytes` bytes are pending, or `flush_interval` seconds after the
+    first pending record. Records are dropped, and counted, when the queue is
+    full or a push still fails after `max_retries` retries.
+    """
+
+    DEFAULT_BATCH_SIZE: int = 1000
+    DEFAULT_BATCH_BYTES: int = 1024 * 1024
+    DEFAULT_FLUSH_INTERVAL: float = 1.0
+    DEFAULT_QUEUE_SIZE: int = 10000
+    DEFAULT_MAX_RETRIES: int = 3
+    DEFAULT_TIMEOUT: float = 5.0
+    DEFAULT_CLOSE_TIMEOUT: float = 5.0
+
+    def __init__(
+        self,
+        url: str,
+        tags: Optional[Dict[str, Any]] = None,
+        auth: BasicAuth = None,
+        batch_size: Optional[int] = None,
+        batch_bytes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        timeout: Optional[float] = None,
+        compress: bool = True,
+    ) -> None:
+        super().__init__()
+
+        if batch_size is None:
+            batch_size = self.DEFAULT_BATCH_SIZE
+        if batch_bytes is None:
+            batch_bytes = self.DEFAULT_BATCH_BYTES
+        if flush_interval is None:
+            flush_interval = self.DEFAULT_FLUSH_INTERVAL
+        if queue_size is None:
+            queue_size = self.DEFAULT_QUEUE_SIZE
+        if max_retries is None:
+            max_retries = self.DEFAULT_MAX_RETRIES
+        if timeout is None:
+            timeout = self.DEFAULT_TIMEOUT
+
+        self.emitter = LokiEmitterV1(url=url, tags=tags, auth=auth)
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.compress = compress
+
+        self.labels_cache: Dict[Tuple[str, str], Tuple[Tuple[str, str], ...]] = {}
+
+        self.queue: "queue.Queue[Optional[LokiEntry]]" = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(
+            target=self.run, name="loki-shipper", daemon=True
+        )
+        self.thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            labels = self.get_labels(record)
+            timestamp = str(int(record.created * 1e9))
+            self.queue.put_nowait((labels, timestamp, self.format(record)))
+        except queue.Full:
+            LOKI_RECORDS.labels(result="dropped").inc()
+        except Exception:
+            self.handleError(record)
+
+    def get_labels(self, record: logging.LogRecord) -> Tuple[Tuple[str, str], ...]:
+        # records without extra tags share the label set of their level and logger
+        key = None
+        if not getattr(record, "tags", None):
+            key = (record.levelname, record.name)
+            labels = self.labels_cache.get(key)
+            if labels is not None:
+                return labels
+        labels = tuple(
+            (str(k), str(v)) for k, v in self.emitter.build_tags(record).items()
+        )
+        if key is not None:
+            self.labels_cache[key] = labels
+        return labels
+
+    def run(self) -> None:
+        streams: Dict[Tuple[Tuple[str, str], ...], List[List[str]]] = {}
+        pending_records = 0
+        pending_bytes = 0
+        deadline: Optional[float] = None
+        closing = False
+
+        while not closing:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                entry = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = ()
+
+            if entry is None:
+                closing = True
+            elif entry:
+                labels, timestamp, line = entry
+                streams.setdefault(labels, []).append([timestamp, line])
+                pending_records += 1
+                pending_bytes += len(line)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if not pending_records:
+                continue
+            if (
+                closing
+                or pending_records >= self.batch_size
+                or pending_bytes >= self.batch_bytes
+                or time.monotonic() >= deadline
+            ):
+                self.push(streams=streams, records=pending_records)
+                streams = {}
+                pending_records = 0
+                pending_bytes = 0
+                deadline = None
+
+        self.emitter.close()
+
+    def push(
+        self, streams: Dict[Tuple[Tuple[str, str], ...], List[List[str]]], records: int
+    ) -> None:
+        payload = {
+            "streams": [
+                {"stream": dict(labels), "values": values}
+                for labels, values in streams.items()
+            ]
+        }
+        data = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            data = gzip.compress(data, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.emitter.session.post(
+                    self.emitter.url, data=data, headers=headers, timeout=self.timeout
+                )
+                if response.status_code == self.emitter.success_response_code:
+                    LOKI_PUSHES.labels(result="success").inc()
+                    LOKI_RECORDS.labels(result="sent").inc(records)
+                    return
+                error = f"status code: {response.status_code}"
+                retryable = response.status_code == 429 or response.status_code >= 500
+            except Exception as exception:
+                error = str(exception)
+                retryable = True
+            LOKI_PUSHES.labels(result="failure").inc()
+            if not retryable:
+                break
+            if attempt < self.max_retries:
+                time.sleep(min(0.5 * 2**attempt, 5.0))
+
+        LOKI_RECORDS.labels(result="dropped").inc(records)
+        # never log through `logging` here, the record would come back to this handler
+        print(f"failed to push {records} log records to Loki: {error}", file=sys.stderr)
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            try:
+                self.queue.put(None, timeout=self.DEFAULT_CLOSE_TIMEOUT)
+            except queue.Full:
+                pass
+            self.thread.join(timeout=self.DEFAULT_CLOSE_TIMEOUT)
+        super().close()
+
 
 class AppOptionLoki(AppOptionBase):
+    MODE_BATCH: str = "batch"
+    MODE_SYNC: str = "sync"
+
     DEFAULT_URL: str = "http://localhost:3100/loki/api/v1/push"
     DEFAULT_USERNAME: str = ""
     DEFAULT_PASSWORD: str = ""
     DEFAULT_VERSION: str = "1"
+    DEFAULT_MODE: str = MODE_BATCH
 
     def __init__(
         self,
@@ -24,11 +229,19 @@ class AppOptionLoki(AppOptionBase):
         username: Optional[str] = None,
         password: Optional[str] = None,
         version: Optional[str] = None,
+        mode: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        queue_size: Optional[int] = None,
     ) -> None:
         self.url = url
         self.username = username
         self.password = password
         self.version = version
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
 
     def apply(self, app: App, /, *args, **kwargs) -> None:
         with app.env.prefixed("LOKI_"):
@@ -40,11 +253,32 @@ class AppOptionLoki(AppOptionBase):
                 self.password = app.env.str("PASSWORD", self.DEFAULT_PASSWORD)
             if not self.version:
                 self.version = app.env.str("VERSION", self.DEFAULT_VERSION)
+            if not self.mode:
+                self.mode = app.env.str("MODE", self.DEFAULT_MODE).lower()
+            if self.batch_size is None:
+                self.batch_size = app.env.int("BATCH_SIZE", None)
+            if self.flush_interval is None:
+                self.flush_interval = app.env.float("FLUSH_INTERVAL", None)
+            if self.queue_size is None:
+                self.queue_size = app.env.int("QUEUE_SIZE", None)
         auth = (self.username, self.password) if self.username else None
-        hdlr = logging_loki.LokiHandler(url=self.url, auth=auth, version=self.version)
+        # the batching handler speaks the v1 push API only
+        if self.mode == self.MODE_BATCH and self.version == "1":
+            hdlr = BatchingLokiHandler(
+                url=self.url,
+                auth=auth,
+                batch_size=self.batch_size,
+                flush_interval=self.flush_interval,
+                queue_size=self.queue_size,
+            )
+        else:
+            hdlr = logging_loki.LokiHandler(
+                url=self.url, auth=auth, version=self.version
+            )
         app.logger.addHandler(hdlr=hdlr)
 
 
 __all__ = [
     "AppOptionLoki",
+    "BatchingLokiHandler",
 ]
@@ -3,19 +3,16 @@
 # and restrictions contact your company contract manager.
 
 # requires:
-# - Flask
 # - opentelemetry-exporter-prometheus
-# - Werkzeug
+# - prometheus-client
 
-import threading
+import os
 from typing import Optional, Union
 
-from flask import Flask
 from opentelemetry.exporter.prometheus import PrometheusMetricReader
-from prometheus_client import make_wsgi_app
-from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
 from ..app import App, AppOptionApplyOrderEnum, AppOptionBase
+from ..metrics_server import MetricsServer
 
 
 class AppOptionPrometheus(AppOptionBase):
@@ -32,6 +29,7 @@ class AppOptionPrometheus(AppOptionBase):
         self.addr = addr
         self.port = port
         self.endpoint = endpoint
+        self.server: Optional[MetricsServer] = None
 
     def apply(self, app: App, /, *args, **kwargs) -> None:
         with app.env.prefixed("PROMETHEUS_"):
@@ -42,20 +40,28 @@ class AppOptionPrometheus(AppOptionBase):
             if not self.endpoint:
                 self.endpoint = app.env.str("ENDPOINT", self.DEFAULT_ENDPOINT)
             prefix = app.env.str("PREFIX", app.name)
-            mounts = {self.endpoint: make_wsgi_app()}
-            flask_app = Flask(import_name=app.name)
-            flask_app.wsgi_app = DispatcherMiddleware(
-                app=flask_app.wsgi_app, mounts=mounts
-            )
-            threading.Thread(
-                target=lambda: flask_app.run(
-                    host=self.addr,
-                    port=self.port,
-                    debug=True,
-                    use_reloader=False,
+            if app.worker_id is not None and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+                # the worker supervisor serves the metrics of all workers, but
+                # only prometheus_client metrics are written to the shared
+                # directory, so OpenTelemetry metrics could not be exported
+                app.logger.warning(
+                    "OpenTelemetry metrics are not exported with multiple workers"
                 )
-            ).start()
+                return
             app.otel_metric_readers.append(PrometheusMetricReader(prefix=prefix))
+            self.server = MetricsServer(
+                addr=self.addr,
+                port=self.port,
+                endpoint=self.endpoint,
+                is_ready=lambda: app.is_serving,
+            )
+            self.server.start()
+            app.logger.info(
+                "metrics server listening on %s:%d%s",
+                self.addr,
+                self.port,
+                self.endpoint,
+            )
 
     def get_order(self) -> Union[int, AppOptionApplyOrderEnum]:
         return AppOptionApplyOrderEnum.SET_OTEL_METER_PROVIDER - 1
@@ -0,0 +1,248 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - accelbyte-py-sdk
+# - PyJWT[crypto]
+
+import asyncio
+import time
+
+from logging import Logger
+from typing import Any, Dict, List, Optional, Set
+
+import jwt
+
+import accelbyte_py_sdk.api.iam as iam_service
+from accelbyte_py_sdk.core import AccelByteSDK
+from accelbyte_py_sdk.token_validation import (
+    InsufficientPermissionsError,
+    PermissionAction,
+    TokenRevokedError,
+    UserRevokedError,
+    create_permission_struct,
+)
+from accelbyte_py_sdk.token_validation.caching import CachingTokenValidator
+
+# private helpers the SDK's RevocationListCache uses to decode the revocation
+# list, the SDK version is pinned in requirements.txt
+from accelbyte_py_sdk.token_validation._bloom_filter import BloomFilter
+from accelbyte_py_sdk.token_validation._utils import str2datetime
+
+
+class TokenValidationSnapshot:
+    __slots__ = ("jwks", "revoked_token_filter", "revoked_users")
+
+    def __init__(
+        self,
+        jwks: Optional[Dict[str, Any]] = None,
+        revoked_token_filter: Optional[BloomFilter] = None,
+        revoked_users: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.jwks = jwks if jwks is not None else {}
+        self.revoked_token_filter = revoked_token_filter
+        self.revoked_users = revoked_users if revoked_users is not None else {}
+
+
+class SnapshotTokenValidator:
+    """Validates access tokens against an in-memory snapshot of the JWKS and revocation list.
+
+    The JWKS and the revocation list are fetched by a background task on the
+    event loop, using the SDK's async endpoints, and every refresh replaces the
+    whole snapshot at once. `validate_token` therefore never performs network
+    I/O: an unknown key ID is rejected and only schedules an early JWKS refresh.
+
+    Permission checks (`resource` and `action`) are delegated to
+    `permission_validator`, which may still fetch roles on a cache miss.
+    """
+
+    DEFAULT_ALGORITHMS: List[str] = ["RS256"]
+    DEFAULT_OPTIONS: Dict[str, Any] = {"verify_aud": False, "verify_exp": True}
+    DEFAULT_JWKS_REFRESH_INTERVAL: float = 3600.0
+    DEFAULT_REVOCATION_LIST_REFRESH_INTERVAL: float = 300.0
+    # unknown key IDs trigger at most one early JWKS refresh per this many seconds
+    MIN_JWKS_REFRESH_INTERVAL: float = 10.0
+
+    def __init__(
+        self,
+        sdk: AccelByteSDK,
+        algorithms: Optional[List[str]] = None,
+        options: Optional[Dict[str, Any]] = None,
+        jwks_refresh_interval: Optional[float] = None,
+        revocation_list_refresh_interval: Optional[float] = None,
+        permission_validator: Optional[CachingTokenValidator] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        self.sdk = sdk
+        self.algorithms = (
+            algorithms if algorithms is not None else self.DEFAULT_ALGORITHMS
+        )
+        self.options = options if options is not None else self.DEFAULT_OPTIONS
+        self.jwks_refresh_interval = (
+            jwks_refresh_interval
+            if jwks_refresh_interval is not None
+            else self.DEFAULT_JWKS_REFRESH_INTERVAL
+        )
+        self.revocation_list_refresh_interval = (
+            revocation_list_refresh_interval
+            if revocation_list_refresh_interval is not None
+            else self.DEFAULT_REVOCATION_LIST_REFRESH_INTERVAL
+        )
+        self.permission_validator = permission_validator
+        self.logger = logger
+
+        self.snapshot = TokenValidationSnapshot()
+
+        self.jwks_refreshed_at: float = 0.0
+        self.jwks_refresh_task: Optional[asyncio.Task] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        if self.tasks:
+            return
+        await asyncio.gather(self.refresh_jwks(), self.refresh_revocation_list())
+        self.spawn(self.run_periodically(self.refresh_jwks, self.jwks_refresh_interval))
+        self.spawn(
+            self.run_periodically(
+                self.refresh_revocation_list, self.revocation_list_refresh_interval
+            )
+        )
+
+    async def stop(self) -> None:
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run_periodically(self, refresh_fn, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await refresh_fn()
+
+    async def refresh_jwks(self) -> None:
+        self.jwks_refreshed_at = time.monotonic()
+        try:
+            result, error = await iam_service.get_jwksv3_async(sdk=self.sdk)
+            if error:
+                raise Exception(str(error))
+            keys = result.to_dict().get("keys", [])
+            jwks = {jwk.key_id: jwk.key for jwk in jwt.PyJWKSet(keys).keys}
+        except Exception as exception:
+            if self.logger:
+                self.logger.warning(f"Failed to refresh JWKS: {exception}")
+            return
+
+        snapshot = self.snapshot
+        self.snapshot = TokenValidationSnapshot(
+            jwks=jwks,
+            revoked_token_filter=snapshot.revoked_token_filter,
+            revoked_users=snapshot.revoked_users,
+        )
+
+    async def refresh_revocation_list(self) -> None:
+        try:
+            result, error = await iam_service.get_revocation_list_v3_async(sdk=self.sdk)
+            if error:
+                raise Exception(str(error))
+            revoked_tokens = result.revoked_tokens
+            revoked_token_filter = BloomFilter.create_from_bits(
+                bits=revoked_tokens.bits, k=revoked_tokens.k, m=revoked_tokens.m
+            )
+            revoked_users = {
+                user.id_: str2datetime(user.revoked_at).timestamp()
+                for user in result.revoked_users
+                if user.id_ and user.revoked_at
+            }
+        except Exception as exception:
+            if self.logger:
+                self.logger.warning(f"Failed to refresh revocation list: {exception}")
+            return
+
+        snapshot = self.snapshot
+        self.snapshot = TokenValidationSnapshot(
+            jwks=snapshot.jwks,
+            revoked_token_filter=revoked_token_filter,
+            revoked_users=revoked_users,
+        )
+
+    def request_jwks_refresh(self) -> None:
+        if self.jwks_refresh_task is not None and not self.jwks_refresh_task.done():
+            return
+        if time.monotonic() - self.jwks_refreshed_at < self.MIN_JWKS_REFRESH_INTERVAL:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.jwks_refresh_task = self.spawn(self.refresh_jwks())
+
+    def validate_token(
+        self,
+        token: str,
+        resource: Optional[str] = None,
+        action: Optional[PermissionAction] = None,
+        namespace: Optional[str] = None,
+        user_id: Optional[str] = None,
+        **kwargs,
+    ) -> Optional[Exception]:
+        snapshot = self.snapshot
+
+        if snapshot.revoked_token_filter is not None:
+            if snapshot.revoked_token_filter.might_contains(key=token):
+                return TokenRevokedError("token was already revoked")
+
+        try:
+            kid = jwt.get_unverified_header(jwt=token).get("kid")
+            if not kid:
+                return KeyError("kid")
+
+            key = snapshot.jwks.get(kid)
+            if key is None:
+                self.request_jwks_refresh()
+                return KeyError(kid)
+
+            claims = jwt.decode(
+                jwt=token,
+                key=key,
+                algorithms=self.algorithms,
+                options=self.options,
+            )
+        except jwt.PyJWTError as error:
+            return error
+
+        if "user_id" not in claims and (sub := claims.get("sub")):
+            claims["user_id"] = sub
+
+        if claims_user_id := claims.get("user_id", user_id):
+            revoked_at = snapshot.revoked_users.get(claims_user_id)
+            if revoked_at is not None and revoked_at >= claims.get("iat", 0):
+                return UserRevokedError("user was already revoked")
+
+        if resource is not None and action is not None:
+            if self.permission_validator is None:
+                return InsufficientPermissionsError("no permission validator")
+            if not self.permission_validator.has_valid_permissions(
+                claims=claims,
+                permission=create_permission_struct(action, resource),
+                namespace=namespace,
+                user_id=user_id,
+                **kwargs,
+            ):
+                return InsufficientPermissionsError(
+                    f"insufficient permission: resource: {resource}, action: {action}"
+                )
+
+        return None
+
+    def spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+
+__all__ = [
+    "SnapshotTokenValidator",
+    "TokenValidationSnapshot",
+]
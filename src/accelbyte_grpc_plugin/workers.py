@@ -0,0 +1,196 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - environs
+# - prometheus-client
+
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+
+from logging import Logger
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional
+
+from environs import Env
+
+PROMETHEUS_MULTIPROC_DIR_ENV: str = "PROMETHEUS_MULTIPROC_DIR"
+WORKER_ID_ENV: str = "SERVICE_WORKER_ID"
+
+
+def run_worker(worker_id: int, target: Callable[..., None], kwargs: Dict[str, Any]):
+    os.environ[WORKER_ID_ENV] = str(worker_id)
+    target(**kwargs)
+
+
+class AppWorkers:
+    """Runs `target` in N spawned worker processes that share the gRPC port.
+
+    Every worker runs its own `App` with SO_REUSEPORT, so the kernel balances
+    incoming connections across them. The supervisor restarts workers that die
+    unexpectedly, forwards SIGINT/SIGTERM to the workers for a graceful
+    shutdown, and serves `/metrics` for all workers through the Prometheus
+    multiprocess collector.
+
+    Workers are spawned, not forked, so `PROMETHEUS_MULTIPROC_DIR` is set
+    before they import `prometheus_client`. The multiprocess collector only
+    sees `prometheus_client` metrics: OpenTelemetry metrics (e.g. the gRPC
+    instrumentation) are not exported in this mode.
+
+    Workers share nothing but the port. Caches, rate limits, circuit
+    breakers, background refreshes and pools are per worker, so e.g. a warm
+    pool of N instances keeps N instances per worker.
+    """
+
+    DEFAULT_SHUTDOWN_TIMEOUT: float = 30.0
+    DEFAULT_RESTART_DELAY: float = 1.0
+
+    def __init__(
+        self,
+        target: Callable[..., None],
+        workers: int,
+        kwargs: Optional[Dict[str, Any]] = None,
+        env: Optional[Env] = None,
+        shutdown_timeout: Optional[float] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if env is None:
+            env = Env()
+            env.read_env()
+
+        if shutdown_timeout is None:
+            shutdown_timeout = self.DEFAULT_SHUTDOWN_TIMEOUT
+
+        if logger is None:
+            logger = logging.getLogger("workers")
+            logger.addHandler(logging.StreamHandler())
+            logger.setLevel(logging.INFO)
+
+        self.target = target
+        self.workers = workers
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.env = env
+        self.shutdown_timeout = shutdown_timeout
+        self.logger = logger
+
+        self.context = multiprocessing.get_context("spawn")
+        self.processes: List[Optional[multiprocessing.process.BaseProcess]] = [
+            None
+        ] * workers
+        self.is_stopping: bool = False
+
+    def run(self) -> None:
+        multiproc_dir = os.environ.get(PROMETHEUS_MULTIPROC_DIR_ENV)
+        owns_multiproc_dir = not multiproc_dir
+        if owns_multiproc_dir:
+            multiproc_dir = tempfile.mkdtemp(prefix="prometheus-multiproc-")
+            os.environ[PROMETHEUS_MULTIPROC_DIR_ENV] = multiproc_dir
+
+        signal.signal(signal.SIGINT, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+
+        try:
+            for worker_id in range(self.workers):
+                self.start_worker(worker_id)
+            self.serve_metrics()
+            self.supervise()
+        finally:
+            self.stop_workers()
+            if owns_multiproc_dir:
+                shutil.rmtree(multiproc_dir, ignore_errors=True)
+
+    def start_worker(self, worker_id: int) -> None:
+        process = self.context.Process(
+            target=run_worker,
+            args=(worker_id, self.target, self.kwargs),
+            name=f"worker-{worker_id}",
+        )
+        process.start()
+        self.processes[worker_id] = process
+        self.logger.info("worker %d started (pid: %s)", worker_id, process.pid)
+
+    def supervise(self) -> None:
+        while not self.is_stopping:
+            sentinels = {p.sentinel: i for i, p in enumerate(self.processes) if p}
+            for sentinel in wait(list(sentinels), timeout=1.0):
+                if self.is_stopping:
+                    break
+                worker_id = sentinels[sentinel]
+                process = self.processes[worker_id]
+                self.mark_process_dead(process)
+                self.logger.warning(
+                    "worker %d exited unexpectedly (exit code: %s), restarting",
+                    worker_id,
+                    process.exitcode,
+                )
+                time.sleep(self.DEFAULT_RESTART_DELAY)
+                self.start_worker(worker_id)
+
+    def stop_workers(self) -> None:
+        self.is_stopping = True
+        processes = [p for p in self.processes if p is not None]
+
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in processes:
+            process.join(timeout=max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                self.logger.warning("worker %s did not stop in time", process.name)
+                process.kill()
+                process.join()
+            self.mark_process_dead(process)
+
+        self.logger.info("all workers stopped")
+
+    def handle_signal(self, signum, frame) -> None:
+        self.logger.info("received signal %d, stopping workers", signum)
+        self.is_stopping = True
+
+    def serve_metrics(self) -> None:
+        from prometheus_client import CollectorRegistry
+        from prometheus_client.multiprocess import MultiProcessCollector
+
+        from .metrics_server import MetricsServer
+        from .options.prometheus import AppOptionPrometheus
+
+        with self.env.prefixed("PROMETHEUS_"):
+            addr = self.env.str("ADDR", AppOptionPrometheus.DEFAULT_ADDR)
+            port = self.env.int("PORT", AppOptionPrometheus.DEFAULT_PORT)
+            endpoint = self.env.str("ENDPOINT", AppOptionPrometheus.DEFAULT_ENDPOINT)
+
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        MetricsServer(
+            addr=addr,
+            port=port,
+            endpoint=endpoint,
+            registry=registry,
+            is_ready=self.is_ready,
+        ).start()
+        self.logger.info("multiprocess metrics server listening on %s:%d", addr, port)
+
+    def is_ready(self) -> bool:
+        return not self.is_stopping and all(
+            p is not None and p.is_alive() for p in self.processes
+        )
+
+    @staticmethod
+    def mark_process_dead(process) -> None:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(process.pid)
+
+
+__all__ = [
+    "AppWorkers",
+    "run_worker",
+]
@@ -7,7 +7,7 @@ import logging
 
 from argparse import ArgumentParser
 from logging import Logger
-from typing import List, Optional
+from typing import Any, List, Optional
 
 from accelbyte_py_sdk.core import (
     AccelByteSDK,
@@ -25,21 +25,34 @@ from accelbyte_grpc_plugin.app import (
     AppOptionGRPCInterceptor,
     AppOptionGRPCService,
 )
+from accelbyte_grpc_plugin.event_loop import (
+    install_event_loop_policy,
+    report_event_loop,
+)
 
 from session_dsm_pb2_grpc import add_SessionDsmServicer_to_server
 
 from app.services.session_dsm_demo import AsyncSessionDsmDemoService
 from app.services.session_dsm_gamelift import AsyncSessionDsmGameLiftService
+from app.services.gcp_orphan_reconciler import AppOptionGcpOrphanReconciler
+from app.services.gcp_warm_pool import GcpWarmPool
+from app.services.idempotency import IdempotentSessionDsmService
+from app.services.payload_logger import PayloadLogger
 from app.services.session_dsm_gcp import AsyncSessionDsmGcpService
 from app.utils import create_env
 
 DEFAULT_APP_PORT: int = 6565
+DEFAULT_SERVICE_WORKERS: int = 1
+DEFAULT_SERVICE_EVENT_LOOP: str = "ASYNCIO"
+
+DEFAULT_IDEMPOTENCY_ENABLED: bool = True
 
 DEFAULT_AB_BASE_URL: str = "https://test.accelbyte.io"
 DEFAULT_AB_NAMESPACE: str = "accelbyte"
 DEFAULT_AB_CLIENT_ID: Optional[str] = None
 DEFAULT_AB_CLIENT_SECRET: Optional[str] = None
 
+DEFAULT_ENABLE_EVENT_LOOP_MONITOR: bool = True
 DEFAULT_ENABLE_HEALTH_CHECK: bool = True
 DEFAULT_ENABLE_PROMETHEUS: bool = True
 DEFAULT_ENABLE_REFLECTION: bool = True
@@ -73,21 +86,61 @@ async def main(port: int, **kwargs) -> None:
     logger = logging.getLogger("app")
     logger.setLevel(logging.INFO)
     logger.addHandler(logging.StreamHandler())
-    options = create_options(sdk=sdk, env=env, logger=logger)
+    report_event_loop(logger)
+    options = await create_options(sdk=sdk, env=env, logger=logger)
+
+    with env.prefixed("PAYLOAD_LOG_"):
+        payload_logger = PayloadLogger(
+            logger=logger,
+            sample_rate=env.int("SAMPLE_RATE", None),
+            payload_format=env.str("FORMAT", None),
+        )
 
     ds_provider = env("DS_PROVIDER", "DEMO")
     service_full_name = ""
     service = None
+    warm_pool = None
+    termination_reaper = None
+    termination_drain_timeout = None
+    orphan_reconciler = None
+    readiness_watcher = None
     if ds_provider == "GAMELIFT":
         service_full_name = AsyncSessionDsmGameLiftService.full_name
         service = AsyncSessionDsmGameLiftService(
-            region_name=env("AWS_REGION", env("GAMELIFT_REGION")),
+            region_name=env("AWS_REGION", env("GAMELIFT_REGION", None)),
+            max_workers=env.int("GAMELIFT_MAX_WORKERS", None),
+            max_concurrency=env.int("GAMELIFT_MAX_CONCURRENCY", None),
+            circuit_failure_threshold=env.int(
+                "GAMELIFT_CIRCUIT_FAILURE_THRESHOLD", None
+            ),
+            circuit_reset_timeout=env.float("GAMELIFT_CIRCUIT_RESET_TIMEOUT", None),
+            placement_queue=env.str("GAMELIFT_PLACEMENT_QUEUE", None),
+            placement_poll_interval=env.float("GAMELIFT_PLACEMENT_POLL_INTERVAL", None),
+            placement_timeout=env.float("GAMELIFT_PLACEMENT_TIMEOUT", None),
+            termination_mode=env.str("GAMELIFT_TERMINATION_MODE", None),
+            reaper_batch_size=env.int("GAMELIFT_REAPER_BATCH_SIZE", None),
+            reaper_max_attempts=env.int("GAMELIFT_REAPER_MAX_ATTEMPTS", None),
+            max_assigned_game_sessions=env.int(
+                "GAMELIFT_MAX_ASSIGNED_GAME_SESSIONS", None
+            ),
+            gamelift_client=create_gamelift_client(env=env),
+            payload_logger=payload_logger,
             logger=logger,
         )
+        termination_reaper = service.termination_reaper
+        termination_drain_timeout = env.float("GAMELIFT_REAPER_DRAIN_TIMEOUT", 10.0)
     elif ds_provider == "GCP":
         service_full_name = AsyncSessionDsmGcpService.full_name
+        warm_pool = create_gcp_warm_pool(env=env, logger=logger)
+        instances_client = create_gcp_instances_client(env=env)
+        with env.prefixed("SERVICE_"):
+            worker_id = env.int("WORKER_ID", None)
         service = AsyncSessionDsmGcpService(
-            service_account_file=env("GCP_SERVICE_ACCOUNT_FILE"),
+            service_account_file=(
+                env("GCP_SERVICE_ACCOUNT_FILE")
+                if instances_client is None
+                else env.str("GCP_SERVICE_ACCOUNT_FILE", "")
+            ),
             project_id=env("GCP_PROJECT_ID"),
             machine_type=env("GCP_MACHINE_TYPE", "e2-micro"),
             network_name=env("GCP_NETWORK", "public"),
@@ -95,15 +148,55 @@ async def main(port: int, **kwargs) -> None:
             image_open_port=env.int("GCP_IMAGE_OPEN_PORT", 8080),
             max_retries=env.int("GCP_RETRY", 3),
             retry_interval=env.float("GCP_WAIT_GET_IP", 1.0),
+            max_workers=env.int("GCP_MAX_WORKERS", None),
+            max_concurrency=env.int("GCP_MAX_CONCURRENCY", None),
+            circuit_failure_threshold=env.int("GCP_CIRCUIT_FAILURE_THRESHOLD", None),
+            circuit_reset_timeout=env.float("GCP_CIRCUIT_RESET_TIMEOUT", None),
+            operation_poll_interval=env.float("GCP_OPERATION_POLL_INTERVAL", 1.0),
+            ready_min_interval=env.float("GCP_READY_MIN_INTERVAL", None),
+            ready_max_interval=env.float("GCP_READY_MAX_INTERVAL", None),
+            warm_pool=warm_pool,
+            instance_template=env.str("GCP_INSTANCE_TEMPLATE", None),
+            zone_block_duration=env.float("GCP_ZONE_BLOCK_DURATION", None),
+            zone_max_attempts=env.int("GCP_ZONE_MAX_ATTEMPTS", None),
+            region_race=env.bool("GCP_REGION_RACE", None),
+            delete_batch_size=env.int("GCP_DELETE_BATCH_SIZE", None),
+            delete_batch_delay=env.float("GCP_DELETE_BATCH_DELAY", None),
+            delete_verify_interval=env.float("GCP_DELETE_VERIFY_INTERVAL", None),
+            delete_max_attempts=env.int("GCP_DELETE_MAX_ATTEMPTS", None),
+            max_assigned_instances=env.int("GCP_MAX_ASSIGNED_INSTANCES", None),
+            owner_id=env.str("GCP_OWNER_ID", None),
+            always_find_instances=worker_id is not None,
+            instances_client=instances_client,
+            payload_logger=payload_logger,
             logger=logger,
         )
+        termination_reaper = service.delete_tracker
+        readiness_watcher = service.readiness_watcher
+        termination_drain_timeout = env.float("GCP_DELETE_DRAIN_TIMEOUT", 10.0)
+        # one reconciler per deployment is enough, the others would list and
+        # delete the same instances
+        orphan_reconciler = AppOptionGcpOrphanReconciler(
+            service=service, enabled=False if worker_id else None
+        )
+        options.append(orphan_reconciler)
     elif ds_provider == "DEMO":
         service_full_name = AsyncSessionDsmDemoService.full_name
-        service = AsyncSessionDsmDemoService(logger=logger)
+        service = AsyncSessionDsmDemoService(
+            payload_logger=payload_logger, logger=logger
+        )
     else:
         raise NotImplementedError(ds_provider)
     logger.info(f"DS provider: {ds_provider}")
 
+    with env.prefixed("IDEMPOTENCY_"):
+        if env.bool("ENABLED", DEFAULT_IDEMPOTENCY_ENABLED):
+            service = IdempotentSessionDsmService(
+                service=service,
+                ttl=env.float("TTL", None),
+                logger=logger,
+            )
+
     options.append(
         AppOptionGRPCService(
             full_name=service_full_name,
@@ -113,7 +206,26 @@ async def main(port: int, **kwargs) -> None:
     )
 
     app = App(port=port, env=env, logger=logger, options=options)
-    await app.run()
+
+    if warm_pool is not None:
+        warm_pool.start()
+
+    try:
+        await app.run()
+    finally:
+        if orphan_reconciler is not None:
+            await orphan_reconciler.stop()
+        if warm_pool is not None:
+            try:
+                await asyncio.wait_for(
+                    warm_pool.stop(), timeout=termination_drain_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning("warm pool did not stop in time")
+        if readiness_watcher is not None:
+            await readiness_watcher.stop()
+        if termination_reaper is not None:
+            await termination_reaper.stop(timeout=termination_drain_timeout)
 
 
 def parse_args():
@@ -130,13 +242,27 @@ def parse_args():
     return result
 
 
-def create_options(sdk: AccelByteSDK, env: Env, logger: Logger) -> List[AppOption]:
+async def create_options(
+    sdk: AccelByteSDK, env: Env, logger: Logger
+) -> List[AppOption]:
     options: List[AppOption] = []
 
     with env.prefixed("AB_"):
         namespace = env.str("NAMESPACE", DEFAULT_AB_NAMESPACE)
 
+    from accelbyte_grpc_plugin.options.grpc_server_tuning import (
+        AppOptionGRPCServerTuning,
+    )
+
+    options.append(AppOptionGRPCServerTuning())
+
     with env.prefixed("ENABLE_"):
+        if env.bool("EVENT_LOOP_MONITOR", DEFAULT_ENABLE_EVENT_LOOP_MONITOR):
+            from accelbyte_grpc_plugin.options.event_loop_monitor import (
+                AppOptionEventLoopMonitor,
+            )
+
+            options.append(AppOptionEventLoopMonitor())
         if env.bool("HEALTH_CHECK", DEFAULT_ENABLE_HEALTH_CHECK):
             from accelbyte_grpc_plugin.options.grpc_health_check import (
                 AppOptionGRPCHealthCheck,
@@ -161,18 +287,30 @@ def create_options(sdk: AccelByteSDK, env: Env, logger: Logger) -> List[AppOptio
     with env.prefixed("PLUGIN_GRPC_SERVER_"):
         with env.prefixed("AUTH_"):
             if env.bool("ENABLED", DEFAULT_PLUGIN_GRPC_SERVER_AUTH_ENABLED):
-                from accelbyte_py_sdk.token_validation.caching import (
-                    CachingTokenValidator,
-                )
                 from accelbyte_grpc_plugin.interceptors.authorization import (
                     AuthorizationServerInterceptor,
                 )
+                from accelbyte_grpc_plugin.token_validation import (
+                    SnapshotTokenValidator,
+                )
+
+                token_validator = SnapshotTokenValidator(
+                    sdk=sdk,
+                    jwks_refresh_interval=env.float("JWKS_REFRESH_INTERVAL", None),
+                    revocation_list_refresh_interval=env.float(
+                        "REVOCATION_LIST_REFRESH_INTERVAL", None
+                    ),
+                    logger=logger,
+                )
+                await token_validator.start()
 
                 options.append(
                     AppOptionGRPCInterceptor(
                         interceptor=AuthorizationServerInterceptor(
                             namespace=namespace,
-                            token_validator=CachingTokenValidator(sdk=sdk),
+                            token_validator=token_validator,
+                            cache_size=env.int("CACHE_SIZE", None),
+                            cache_max_ttl=env.float("CACHE_MAX_TTL", None),
                         )
                     )
                 )
@@ -193,14 +331,93 @@ def create_options(sdk: AccelByteSDK, env: Env, logger: Logger) -> List[AppOptio
             )
 
             options.append(
-                AppOptionGRPCInterceptor(interceptor=MetricsServerInterceptor())
+                AppOptionGRPCInterceptor(
+                    interceptor=MetricsServerInterceptor(
+                        buckets=env.list("METRICS_BUCKETS", None, subcast=float),
+                    )
+                )
             )
 
     return options
 
 
+def create_gamelift_client(env: Env) -> Optional[Any]:
+    if env.str("GAMELIFT_CLIENT", "AWS").upper() != "FAKE":
+        return None
+
+    from app.services.gamelift_fake import FakeGameLiftClient
+
+    with env.prefixed("GAMELIFT_FAKE_"):
+        return FakeGameLiftClient(
+            region_name=env("AWS_REGION", env("GAMELIFT_REGION", None)),
+            latency=env.float("LATENCY", 0.0),
+            error_rate=env.float("ERROR_RATE", 0.0),
+            placement_delay=env.float("PLACEMENT_DELAY", 1.0),
+        )
+
+
+def create_gcp_instances_client(env: Env) -> Optional[Any]:
+    if env.str("GCP_CLIENT", "GCP").upper() != "FAKE":
+        return None
+
+    from app.services.gcp_fake import FakeGcpInstancesClient
+
+    with env.prefixed("GCP_FAKE_"):
+        return FakeGcpInstancesClient(
+            latency=env.float("LATENCY", 0.0),
+            error_rate=env.float("ERROR_RATE", 0.0),
+            operation_delay=env.float("OPERATION_DELAY", 0.5),
+            boot_delay=env.float("BOOT_DELAY", 1.0),
+        )
+
+
+def create_gcp_warm_pool(env: Env, logger: Logger) -> Optional[GcpWarmPool]:
+    with env.prefixed("GCP_WARM_POOL_"):
+        deployments = env.list("DEPLOYMENTS", [])
+        regions = env.list("REGIONS", [])
+        if not deployments or not regions:
+            return None
+
+        keys = []
+        for region in regions:
+            gcp_region = AsyncSessionDsmGcpService.aws_to_gcp_region_map.get(region)
+            if gcp_region not in AsyncSessionDsmGcpService.gcp_zones_map:
+                logger.warning(f"Warm pool region ignored: {region}")
+                continue
+            keys.extend((gcp_region, deployment) for deployment in deployments)
+
+        return GcpWarmPool(
+            keys=keys,
+            min_size=env.int("MIN_SIZE", None),
+            max_size=env.int("MAX_SIZE", None),
+            idle_timeout=env.float("IDLE_TIMEOUT", None),
+            max_lifetime=env.float("MAX_LIFETIME", None),
+            refill_interval=env.float("REFILL_INTERVAL", None),
+            logger=logger,
+        )
+
+
+def run_app(**kwargs) -> None:
+    env = create_env(**kwargs)
+    with env.prefixed("SERVICE_"):
+        install_event_loop_policy(env.str("EVENT_LOOP", DEFAULT_SERVICE_EVENT_LOOP))
+
+    asyncio.run(main(**kwargs))
+
+
 def run() -> None:
-    asyncio.run(main(**parse_args()))
+    kwargs = parse_args()
+
+    env = create_env()
+    with env.prefixed("SERVICE_"):
+        workers = env.int("WORKERS", DEFAULT_SERVICE_WORKERS)
+
+    if workers > 1:
+        from accelbyte_grpc_plugin.workers import AppWorkers
+
+        AppWorkers(target=run_app, workers=workers, kwargs=kwargs, env=env).run()
+    else:
+        run_app(**kwargs)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+import asyncio
+
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+from grpc import ServicerContext
+
+T = TypeVar("T")
+
+
+class DeadlineExceededError(asyncio.TimeoutError):
+    pass
+
+
+class Deadline:
+    """The time by which the callers of an RPC stop waiting for it.
+
+    Deadlines are kept in event loop time. A deadline can be extended when
+    another caller starts waiting for the same work, and `None` means that at
+    least one caller waits without a deadline.
+    """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, expires_at: Optional[float]) -> None:
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_context(cls, context: ServicerContext) -> "Deadline":
+        return cls(expires_at=cls.get_expires_at(context))
+
+    @staticmethod
+    def get_expires_at(context: ServicerContext) -> Optional[float]:
+        time_remaining = context.time_remaining()
+        if time_remaining is None:
+            return None
+        return asyncio.get_running_loop().time() + time_remaining
+
+    def extend(self, context: ServicerContext) -> None:
+        if self.expires_at is None:
+            return
+        expires_at = self.get_expires_at(context)
+        if expires_at is None or expires_at > self.expires_at:
+            self.expires_at = expires_at
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - asyncio.get_running_loop().time())
+
+
+CURRENT_DEADLINE: ContextVar[Optional[Deadline]] = ContextVar(
+    "CURRENT_DEADLINE", default=None
+)
+
+
+def set_deadline(context: ServicerContext) -> Deadline:
+    """Applies the deadline of the RPC to the current task, unless it already has one.
+
+    A deadline set by a wrapping servicer, such as the idempotency wrapper,
+    already covers every caller of the work and is kept.
+    """
+    deadline = CURRENT_DEADLINE.get()
+    if deadline is None:
+        deadline = Deadline.from_context(context)
+        CURRENT_DEADLINE.set(deadline)
+    return deadline
+
+
+def get_remaining() -> Optional[float]:
+    deadline = CURRENT_DEADLINE.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def cap_timeout(timeout: Optional[float]) -> Optional[float]:
+    """Returns `timeout`, shortened to what is left of the current deadline."""
+    remaining = get_remaining()
+    if remaining is None:
+        return timeout
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def check_deadline(verbose_name: str = "call") -> None:
+    """Raises `DeadlineExceededError` if the current deadline has passed."""
+    if get_remaining() == 0.0:
+        raise DeadlineExceededError(f"deadline exceeded at {verbose_name}")
+
+
+async def wait_for(
+    awaitable: Awaitable[T],
+    timeout: Optional[float] = None,
+    verbose_name: str = "call",
+) -> T:
+    """Like `asyncio.wait_for`, but also bounded by the current deadline.
+
+    Extensions of the deadline made while waiting are followed. Raises
+    `asyncio.TimeoutError` after `timeout` seconds and `DeadlineExceededError`
+    once the deadline has passed.
+    """
+    loop = asyncio.get_running_loop()
+    expires_at = loop.time() + timeout if timeout is not None else None
+    future = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            wait_timeout = None
+            if expires_at is not None:
+                wait_timeout = max(0.0, expires_at - loop.time())
+            done, _ = await asyncio.wait({future}, timeout=cap_timeout(wait_timeout))
+            if done:
+                return future.result()
+            if expires_at is not None and loop.time() >= expires_at:
+                raise asyncio.TimeoutError()
+            check_deadline(verbose_name=verbose_name)
+    finally:
+        if not future.done():
+            future.cancel()
+
+
+async def wait_event(event: asyncio.Event, timeout: Optional[float] = None) -> bool:
+    """Waits up to `timeout` seconds for `event`, returns whether it is set.
+
+    Unlike `asyncio.wait_for`, a cancellation is never swallowed when the event
+    is set at the same time, so background loops built on it stop reliably.
+    """
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({waiter}, timeout=timeout)
+    finally:
+        if not waiter.done():
+            waiter.cancel()
+    return event.is_set()
+
+
+def spawn_detached(awaitable: Awaitable[T]) -> "asyncio.Future[T]":
+    """Runs `awaitable` in a new task that is not bound by the current deadline.
+
+    Background and clean-up work started while serving an RPC must outlive it.
+    """
+
+    async def run() -> T:
+        # the task runs in a copy of the context, the caller keeps its deadline
+        CURRENT_DEADLINE.set(None)
+        return await awaitable
+
+    return asyncio.ensure_future(run())
+
+
+__all__ = [
+    "Deadline",
+    "DeadlineExceededError",
+    "cap_timeout",
+    "check_deadline",
+    "get_remaining",
+    "set_deadline",
+    "spawn_detached",
+    "wait_event",
+    "wait_for",
+]
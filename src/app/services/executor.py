@@ -0,0 +1,231 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - prometheus-client
+
+import asyncio
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.services.deadline import check_deadline, get_remaining, wait_for
+from app.services.resilience import AimdLimiter, CircuitBreaker, CircuitOpenError
+
+T = TypeVar("T")
+
+PROVIDER_CALLS_WAITING = Gauge(
+    name="session_dsm_provider_calls_waiting",
+    documentation="number of provider backend calls waiting for a concurrency slot",
+    labelnames=["provider", "scope"],
+    multiprocess_mode="livesum",
+)
+PROVIDER_CALLS_IN_FLIGHT = Gauge(
+    name="session_dsm_provider_calls_in_flight",
+    documentation="number of provider backend calls currently running",
+    labelnames=["provider", "scope"],
+    multiprocess_mode="livesum",
+)
+PROVIDER_CALLS_REJECTED = Counter(
+    name="session_dsm_provider_calls_rejected",
+    documentation="number of provider backend calls rejected because the circuit was open",
+    labelnames=["provider", "scope"],
+)
+PROVIDER_CIRCUIT_STATE = Gauge(
+    name="session_dsm_provider_circuit_state",
+    documentation="circuit breaker state of the provider backend (0 closed, 1 half-open, 2 open)",
+    labelnames=["provider", "scope"],
+    multiprocess_mode="livemax",
+)
+PROVIDER_CONCURRENCY_LIMIT = Gauge(
+    name="session_dsm_provider_concurrency_limit",
+    documentation="current adaptive concurrency limit of the provider backend",
+    labelnames=["provider", "scope"],
+    multiprocess_mode="livesum",
+)
+PROVIDER_BACKEND_SECONDS = Histogram(
+    name="session_dsm_provider_backend_seconds",
+    documentation="time spent in provider backend calls, excluding time waiting for a slot",
+    labelnames=["provider", "operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+class ProviderExecutor:
+    """Runs blocking cloud SDK calls on a bounded thread pool.
+
+    Calls are grouped by scope (e.g. a region or a zone) and every scope has its
+    own concurrency limit, so a slow scope can only exhaust its own slots and
+    never the whole pool.
+
+    The limit of a scope adapts (AIMD) between 1 and `max_concurrency` to the
+    failures `is_failure` reports, and a circuit breaker per scope rejects calls
+    with `CircuitOpenError` after `failure_threshold` failures in a row, for
+    `reset_timeout` seconds. By default every exception counts as a failure.
+
+    Calls made under a deadline (see `app.services.deadline`) fail with
+    `DeadlineExceededError` instead of starting, or waiting for a slot, after
+    it has passed. A call that already runs in a thread cannot be interrupted
+    and is bounded by the timeouts of the SDK. It keeps its slot until the
+    thread returns, even when the caller is cancelled.
+    """
+
+    DEFAULT_MAX_WORKERS: int = 16
+    DEFAULT_MAX_CONCURRENCY: int = 8
+
+    def __init__(
+        self,
+        provider: str,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ) -> None:
+        if max_workers is None:
+            max_workers = self.DEFAULT_MAX_WORKERS
+        if max_concurrency is None:
+            max_concurrency = self.DEFAULT_MAX_CONCURRENCY
+
+        self.provider = provider
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.thread_pool = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"{provider.lower()}-executor",
+        )
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.limiters: Dict[str, AimdLimiter] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    async def run(
+        self, scope: str, fn: Callable[..., T], /, *args: Any, **kwargs: Any
+    ) -> T:
+        check_deadline(verbose_name=getattr(fn, "__name__", "call"))
+
+        breaker = self.get_breaker(scope=scope)
+        retry_after = breaker.get_retry_after()
+        if retry_after is not None:
+            PROVIDER_CALLS_REJECTED.labels(provider=self.provider, scope=scope).inc()
+            self.update_gauges(scope=scope)
+            raise CircuitOpenError(
+                provider=self.provider, scope=scope, retry_after=retry_after
+            )
+        breaker.begin()
+
+        limiter = self.get_limiter(scope=scope)
+
+        waiting = PROVIDER_CALLS_WAITING.labels(provider=self.provider, scope=scope)
+        waiting.inc()
+        try:
+            if get_remaining() is None:
+                await limiter.acquire()
+            else:
+                await wait_for(
+                    limiter.acquire(), verbose_name=f"{self.provider} slot in {scope}"
+                )
+        except BaseException:
+            breaker.record_unknown()
+            raise
+        finally:
+            waiting.dec()
+
+        in_flight = PROVIDER_CALLS_IN_FLIGHT.labels(provider=self.provider, scope=scope)
+        in_flight.inc()
+
+        def release(future: "Future[T]") -> None:
+            success: Optional[bool] = None
+            if not future.cancelled():
+                exception = future.exception()
+                if exception is None:
+                    success = True
+                elif isinstance(exception, Exception):
+                    # errors of the request itself say nothing about the backend health
+                    success = self.is_failure is not None and not self.is_failure(
+                        exception
+                    )
+            in_flight.dec()
+            limiter.release(success=success)
+            if success is True:
+                breaker.record_success()
+            elif success is False:
+                breaker.record_failure()
+            else:
+                breaker.record_unknown()
+            self.update_gauges(scope=scope)
+
+        def on_done(future: "Future[T]") -> None:
+            try:
+                loop.call_soon_threadsafe(release, future)
+            except RuntimeError:
+                # the loop is closed, nothing is waiting for the slot anymore
+                pass
+
+        # the slot is held until the thread is done, even if the caller is
+        # cancelled or times out while it runs
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.thread_pool.submit(self.call, fn, *args, **kwargs)
+        except BaseException:
+            in_flight.dec()
+            limiter.release(success=None)
+            breaker.record_unknown()
+            self.update_gauges(scope=scope)
+            raise
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def call(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        operation = getattr(fn, "__name__", type(fn).__name__)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            PROVIDER_BACKEND_SECONDS.labels(
+                provider=self.provider, operation=operation
+            ).observe(time.perf_counter() - start)
+
+    def get_limiter(self, scope: str) -> AimdLimiter:
+        limiter = self.limiters.get(scope)
+        if limiter is None:
+            limiter = AimdLimiter(max_limit=self.max_concurrency)
+            self.limiters[scope] = limiter
+        return limiter
+
+    def get_breaker(self, scope: str) -> CircuitBreaker:
+        breaker = self.breakers.get(scope)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout,
+            )
+            self.breakers[scope] = breaker
+        return breaker
+
+    def is_available(self, scope: str) -> bool:
+        breaker = self.breakers.get(scope)
+        return breaker is None or breaker.get_retry_after() is None
+
+    def update_gauges(self, scope: str) -> None:
+        PROVIDER_CIRCUIT_STATE.labels(provider=self.provider, scope=scope).set(
+            self.breakers[scope].get_state()
+        )
+        limiter = self.limiters.get(scope)
+        if limiter is not None:
+            PROVIDER_CONCURRENCY_LIMIT.labels(provider=self.provider, scope=scope).set(
+                int(limiter.limit)
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.thread_pool.shutdown(wait=wait)
+
+
+__all__ = [
+    "ProviderExecutor",
+]
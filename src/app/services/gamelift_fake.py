@@ -0,0 +1,202 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - botocore
+
+import random
+import threading
+import time
+import uuid
+
+from typing import Any, Dict, Optional
+
+from botocore.exceptions import ClientError
+
+
+class FakeGameLiftClient:
+    """In-memory stand-in for the boto3 GameLift client.
+
+    Implements the calls the GameLift service makes, with the same request and
+    response shapes, so the plugin can run locally and under load without AWS.
+    Every call sleeps for `latency` seconds (plus up to `jitter`) on the calling
+    thread and fails with a ThrottlingException with probability `error_rate`.
+    Placements are fulfilled `placement_delay` seconds after they start.
+    """
+
+    DEFAULT_REGION: str = "us-west-2"
+    DEFAULT_FLEET_ID: str = "fleet-00000000-0000-0000-0000-000000000000"
+    DEFAULT_IP_ADDRESS: str = "127.0.0.1"
+    DEFAULT_PORT: int = 7777
+
+    def __init__(
+        self,
+        region_name: Optional[str] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        placement_delay: float = 1.0,
+        fleet_id: Optional[str] = None,
+        ip_address: Optional[str] = None,
+        port: Optional[int] = None,
+    ) -> None:
+        self.region_name = region_name if region_name else self.DEFAULT_REGION
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.placement_delay = placement_delay
+        self.fleet_id = fleet_id if fleet_id else self.DEFAULT_FLEET_ID
+        self.ip_address = ip_address if ip_address else self.DEFAULT_IP_ADDRESS
+        self.port = port if port is not None else self.DEFAULT_PORT
+
+        self.lock = threading.Lock()
+        self.game_sessions: Dict[str, Dict[str, Any]] = {}
+        self.idempotency_tokens: Dict[str, str] = {}
+        self.placements: Dict[str, Dict[str, Any]] = {}
+        self.calls: Dict[str, int] = {}
+
+    def create_game_session(self, **kwargs) -> Dict[str, Any]:
+        self.simulate("CreateGameSession")
+        with self.lock:
+            token = kwargs.get("IdempotencyToken")
+            if token and token in self.idempotency_tokens:
+                game_session_id = self.idempotency_tokens[token]
+            else:
+                game_session = self.new_game_session(
+                    location=kwargs.get("Location") or self.region_name,
+                    game_session_data=kwargs.get("GameSessionData", ""),
+                    maximum_player_session_count=kwargs.get(
+                        "MaximumPlayerSessionCount", 0
+                    ),
+                )
+                game_session_id = game_session["GameSessionId"]
+                if token:
+                    self.idempotency_tokens[token] = game_session_id
+            return {"GameSession": dict(self.game_sessions[game_session_id])}
+
+    def start_game_session_placement(self, **kwargs) -> Dict[str, Any]:
+        self.simulate("StartGameSessionPlacement")
+        placement_id = kwargs["PlacementId"]
+        with self.lock:
+            if placement_id in self.placements:
+                raise self.client_error(
+                    "StartGameSessionPlacement",
+                    "InvalidRequestException",
+                    f"Placement {placement_id} already exists",
+                )
+            placement = {
+                "PlacementId": placement_id,
+                "GameSessionQueueName": kwargs["GameSessionQueueName"],
+                "Status": "PENDING",
+                "MaximumPlayerSessionCount": kwargs.get("MaximumPlayerSessionCount", 0),
+                "GameSessionData": kwargs.get("GameSessionData", ""),
+                "StartTime": time.time(),
+            }
+            self.placements[placement_id] = placement
+            return {"GameSessionPlacement": dict(placement)}
+
+    def describe_game_session_placement(self, PlacementId: str) -> Dict[str, Any]:
+        self.simulate("DescribeGameSessionPlacement")
+        with self.lock:
+            placement = self.placements.get(PlacementId)
+            if placement is None:
+                raise self.client_error(
+                    "DescribeGameSessionPlacement",
+                    "NotFoundException",
+                    f"Placement {PlacementId} not found",
+                )
+            self.fulfill_due(placement, now=time.time())
+            return {"GameSessionPlacement": dict(placement)}
+
+    def stop_game_session_placement(self, PlacementId: str) -> Dict[str, Any]:
+        self.simulate("StopGameSessionPlacement")
+        with self.lock:
+            placement = self.placements.get(PlacementId)
+            if placement is None:
+                raise self.client_error(
+                    "StopGameSessionPlacement",
+                    "NotFoundException",
+                    f"Placement {PlacementId} not found",
+                )
+            now = time.time()
+            self.fulfill_due(placement, now=now)
+            if placement["Status"] == "PENDING":
+                placement.update(Status="CANCELLED", EndTime=now)
+            return {"GameSessionPlacement": dict(placement)}
+
+    def terminate_game_session(self, **kwargs) -> Dict[str, Any]:
+        self.simulate("TerminateGameSession")
+        game_session_id = kwargs["GameSessionId"]
+        with self.lock:
+            game_session = self.game_sessions.get(game_session_id)
+            if game_session is None:
+                raise self.client_error(
+                    "TerminateGameSession",
+                    "NotFoundException",
+                    f"Game session {game_session_id} not found",
+                )
+            if game_session["Status"] == "ACTIVE":
+                game_session["Status"] = "TERMINATING"
+            return {"GameSession": dict(game_session)}
+
+    def fulfill_due(self, placement: Dict[str, Any], now: float) -> None:
+        if (
+            placement["Status"] != "PENDING"
+            or now - placement["StartTime"] < self.placement_delay
+        ):
+            return
+        game_session = self.new_game_session(
+            location=self.region_name,
+            game_session_data=placement["GameSessionData"],
+            maximum_player_session_count=placement["MaximumPlayerSessionCount"],
+        )
+        placement.update(
+            Status="FULFILLED",
+            EndTime=now,
+            GameSessionId=game_session["GameSessionId"],
+            GameSessionArn=game_session["GameSessionId"],
+            GameSessionRegion=game_session["Location"],
+            IpAddress=game_session["IpAddress"],
+            Port=game_session["Port"],
+        )
+
+    def new_game_session(
+        self, location: str, game_session_data: str, maximum_player_session_count: int
+    ) -> Dict[str, Any]:
+        game_session_id = f"arn:aws:gamelift:{location}::gamesession/{self.fleet_id}/gsess-{uuid.uuid4()}"
+        game_session = {
+            "GameSessionId": game_session_id,
+            "FleetId": self.fleet_id,
+            "Location": location,
+            "Status": "ACTIVE",
+            "IpAddress": self.ip_address,
+            "Port": self.port,
+            "GameSessionData": game_session_data,
+            "MaximumPlayerSessionCount": maximum_player_session_count,
+        }
+        self.game_sessions[game_session_id] = game_session
+        return game_session
+
+    def simulate(self, operation_name: str) -> None:
+        with self.lock:
+            self.calls[operation_name] = self.calls.get(operation_name, 0) + 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            raise self.client_error(
+                operation_name, "ThrottlingException", "Rate exceeded"
+            )
+
+    @staticmethod
+    def client_error(operation_name: str, code: str, message: str) -> ClientError:
+        return ClientError(
+            error_response={"Error": {"Code": code, "Message": message}},
+            operation_name=operation_name,
+        )
+
+
+__all__ = [
+    "FakeGameLiftClient",
+]
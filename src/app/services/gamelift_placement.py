@@ -0,0 +1,162 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - prometheus-client
+
+import asyncio
+
+from logging import Logger
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+from app.services.deadline import spawn_detached, wait_for
+from app.services.executor import ProviderExecutor
+
+PLACEMENT_POLLS = Counter(
+    name="session_dsm_gamelift_placement_polls",
+    documentation="number of describe_game_session_placement calls",
+)
+PLACEMENT_WAITERS = Gauge(
+    name="session_dsm_gamelift_placement_waiters",
+    documentation="number of game session placements waiting to be fulfilled",
+    multiprocess_mode="livesum",
+)
+PLACEMENT_RESULTS = Counter(
+    name="session_dsm_gamelift_placement_results",
+    documentation="number of finished game session placements by status",
+    labelnames=["status"],
+)
+
+
+class GameLiftPlacementError(Exception):
+    def __init__(self, placement_id: str, status: str) -> None:
+        super().__init__(f"Game session placement {placement_id} ended as {status}")
+        self.placement_id = placement_id
+        self.status = status
+
+
+class GameLiftPlacementTracker:
+    """Tracks pending game session placements with a single background poller.
+
+    Every `poll_interval` seconds the poller describes each pending placement
+    (GameLift only describes one placement per call) through the executor, so
+    the polls share the "placements" concurrency limit and circuit breaker. It
+    resolves the waiters of the placements that are no longer PENDING, stops
+    when nothing is pending and starts again with the next waiter.
+    """
+
+    DEFAULT_POLL_INTERVAL: float = 1.0
+
+    def __init__(
+        self,
+        gamelift_client: Any,
+        executor: ProviderExecutor,
+        poll_interval: Optional[float] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if poll_interval is None:
+            poll_interval = self.DEFAULT_POLL_INTERVAL
+
+        self.gamelift_client = gamelift_client
+        self.executor = executor
+        self.poll_interval = poll_interval
+        self.logger = logger
+
+        self.waiters: Dict[str, asyncio.Future] = {}
+        self.poller: Optional[asyncio.Task] = None
+
+    async def place(self, timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
+        """Starts a placement with `start_game_session_placement(**kwargs)` and waits for it."""
+        placement_id = kwargs["PlacementId"]
+        await self.executor.run(
+            kwargs["GameSessionQueueName"],
+            self.gamelift_client.start_game_session_placement,
+            **kwargs,
+        )
+        return await self.wait_until_fulfilled(
+            placement_id=placement_id, timeout=timeout
+        )
+
+    async def wait_until_fulfilled(
+        self, placement_id: str, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        future = self.waiters.get(placement_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters[placement_id] = future
+            PLACEMENT_WAITERS.set(len(self.waiters))
+
+        if self.poller is None or self.poller.done():
+            self.poller = spawn_detached(self.poll())
+
+        try:
+            return await wait_for(
+                asyncio.shield(future), timeout=timeout, verbose_name=placement_id
+            )
+        finally:
+            if self.waiters.get(placement_id) is future and not future.done():
+                future.cancel()
+                del self.waiters[placement_id]
+                PLACEMENT_WAITERS.set(len(self.waiters))
+
+    async def poll(self) -> None:
+        while self.waiters:
+            await asyncio.sleep(self.poll_interval)
+            placements = await self.describe_pending(list(self.waiters))
+            for placement in placements:
+                status = placement.get("Status", "PENDING")
+                if status == "PENDING":
+                    continue
+                future = self.waiters.pop(placement.get("PlacementId"), None)
+                if future is None or future.done():
+                    continue
+                PLACEMENT_RESULTS.labels(status=status).inc()
+                if status == "FULFILLED":
+                    future.set_result(placement)
+                else:
+                    future.set_exception(
+                        GameLiftPlacementError(
+                            placement_id=placement["PlacementId"], status=status
+                        )
+                    )
+            PLACEMENT_WAITERS.set(len(self.waiters))
+
+    async def describe(self, placement_id: str) -> Dict[str, Any]:
+        PLACEMENT_POLLS.inc()
+        response = await self.executor.run(
+            "placements",
+            self.gamelift_client.describe_game_session_placement,
+            PlacementId=placement_id,
+        )
+        return response["GameSessionPlacement"]
+
+    async def describe_pending(self, placement_ids: List[str]) -> List[Dict[str, Any]]:
+        results = await asyncio.gather(
+            *(self.describe(placement_id) for placement_id in placement_ids),
+            return_exceptions=True,
+        )
+        placements: List[Dict[str, Any]] = []
+        for placement_id, result in zip(placement_ids, results):
+            if isinstance(result, BaseException):
+                if self.logger:
+                    self.logger.warning(
+                        f"Failed to describe game session placement {placement_id}: {result}"
+                    )
+                continue
+            placements.append(result)
+        return placements
+
+    async def stop(self) -> None:
+        if self.poller is not None:
+            self.poller.cancel()
+            await asyncio.gather(self.poller, return_exceptions=True)
+            self.poller = None
+
+
+__all__ = [
+    "GameLiftPlacementError",
+    "GameLiftPlacementTracker",
+]
@@ -0,0 +1,218 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - botocore
+# - prometheus-client
+
+import asyncio
+import random
+
+from logging import Logger
+from typing import Any, List, Optional, Set
+
+from botocore.exceptions import ClientError
+from prometheus_client import Counter, Gauge
+
+from app.services.deadline import spawn_detached
+from app.services.executor import ProviderExecutor
+
+REAPER_QUEUE_DEPTH = Gauge(
+    name="session_dsm_gamelift_reaper_queue_depth",
+    documentation="number of game sessions waiting to be terminated, including those waiting for a retry",
+    multiprocess_mode="livesum",
+)
+REAPER_RESULTS = Counter(
+    name="session_dsm_gamelift_reaper_results",
+    documentation="number of game session terminations by result (terminated, gone, retried or failed)",
+    labelnames=["result"],
+)
+
+
+class GameLiftTermination:
+    __slots__ = ("game_session_id", "location", "attempts")
+
+    def __init__(self, game_session_id: str, location: str) -> None:
+        self.game_session_id = game_session_id
+        self.location = location
+        self.attempts = 0
+
+
+class GameLiftTerminationReaper:
+    """Terminates game sessions in the background.
+
+    `enqueue` returns immediately. A single worker takes up to `batch_size`
+    queued game sessions at a time and terminates them concurrently through the
+    executor, so the calls share the per-location concurrency limits with the
+    rest of the service. Failed terminations are queued again after an
+    exponential backoff with jitter, up to `max_attempts` attempts. This
+    includes game sessions that cannot be terminated yet, e.g. while they are
+    still activating. Game sessions that no longer exist count as terminated.
+
+    The queue lives in memory: terminations that are still queued when the
+    process exits are lost, and the game servers then end on their own.
+    """
+
+    DEFAULT_BATCH_SIZE: int = 20
+    # with the default backoff, retries span one to two minutes, enough to
+    # outlast the activation of a game session
+    DEFAULT_MAX_ATTEMPTS: int = 8
+    DEFAULT_BACKOFF_BASE: float = 1.0
+    DEFAULT_BACKOFF_MAX: float = 60.0
+    DEFAULT_TERMINATION_MODE: str = "TRIGGER_ON_PROCESS_TERMINATE"
+
+    # the game session no longer exists, InvalidGameSessionStatusException is
+    # retried as it is also returned for game sessions that are still activating
+    GONE_ERROR_CODES = ("NotFoundException",)
+
+    def __init__(
+        self,
+        gamelift_client: Any,
+        executor: ProviderExecutor,
+        termination_mode: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        # TerminateGameSession was added in botocore 1.35.91
+        if not hasattr(gamelift_client, "terminate_game_session"):
+            raise RuntimeError(
+                "GameLift client does not support TerminateGameSession,"
+                " upgrade boto3 and botocore (see requirements.txt)."
+            )
+
+        if termination_mode is None:
+            termination_mode = self.DEFAULT_TERMINATION_MODE
+        if batch_size is None:
+            batch_size = self.DEFAULT_BATCH_SIZE
+        if max_attempts is None:
+            max_attempts = self.DEFAULT_MAX_ATTEMPTS
+        if backoff_base is None:
+            backoff_base = self.DEFAULT_BACKOFF_BASE
+        if backoff_max is None:
+            backoff_max = self.DEFAULT_BACKOFF_MAX
+
+        self.gamelift_client = gamelift_client
+        self.executor = executor
+        self.termination_mode = termination_mode
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.logger = logger
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.retries: Set[asyncio.TimerHandle] = set()
+
+    @property
+    def depth(self) -> int:
+        queued = self.queue.qsize() if self.queue is not None else 0
+        return queued + len(self.retries)
+
+    def enqueue(self, game_session_id: str, location: str) -> None:
+        self.put(
+            GameLiftTermination(game_session_id=game_session_id, location=location)
+        )
+
+    def put(self, termination: GameLiftTermination) -> None:
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.queue.put_nowait(termination)
+        REAPER_QUEUE_DEPTH.set(self.depth)
+
+        if self.worker is None or self.worker.done():
+            self.worker = spawn_detached(self.work())
+
+    async def work(self) -> None:
+        assert self.queue is not None
+        while True:
+            batch: List[GameLiftTermination] = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            REAPER_QUEUE_DEPTH.set(self.depth)
+
+            try:
+                await asyncio.gather(
+                    *[self.terminate(termination) for termination in batch]
+                )
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+                REAPER_QUEUE_DEPTH.set(self.depth)
+
+    async def terminate(self, termination: GameLiftTermination) -> None:
+        termination.attempts += 1
+        try:
+            await self.executor.run(
+                termination.location,
+                self.gamelift_client.terminate_game_session,
+                GameSessionId=termination.game_session_id,
+                TerminationMode=self.termination_mode,
+            )
+        except Exception as exception:
+            if self.get_error_code(exception) in self.GONE_ERROR_CODES:
+                REAPER_RESULTS.labels(result="gone").inc()
+                return
+            if termination.attempts >= self.max_attempts:
+                REAPER_RESULTS.labels(result="failed").inc()
+                if self.logger:
+                    self.logger.error(
+                        f"Giving up terminating game session {termination.game_session_id}"
+                        f" after {termination.attempts} attempts: {exception}"
+                    )
+                return
+            REAPER_RESULTS.labels(result="retried").inc()
+            self.retry_later(termination)
+            return
+        REAPER_RESULTS.labels(result="terminated").inc()
+
+    def retry_later(self, termination: GameLiftTermination) -> None:
+        delay = min(
+            self.backoff_max, self.backoff_base * 2 ** (termination.attempts - 1)
+        )
+        delay = random.uniform(delay / 2, delay)
+
+        def retry() -> None:
+            self.retries.discard(handle)
+            self.put(termination)
+
+        handle = asyncio.get_running_loop().call_later(delay, retry)
+        self.retries.add(handle)
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Waits up to `timeout` seconds for the queued terminations, then stops the worker."""
+        if self.queue is not None and timeout:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        dropped = self.depth
+        for handle in self.retries:
+            handle.cancel()
+        self.retries.clear()
+
+        if self.worker is not None:
+            self.worker.cancel()
+            await asyncio.gather(self.worker, return_exceptions=True)
+            self.worker = None
+
+        if dropped and self.logger:
+            self.logger.warning(
+                f"{dropped} game session termination(s) dropped on shutdown"
+            )
+
+    @staticmethod
+    def get_error_code(exception: BaseException) -> str:
+        if isinstance(exception, ClientError):
+            return exception.response.get("Error", {}).get("Code", "")
+        return ""
+
+
+__all__ = [
+    "GameLiftTerminationReaper",
+]
@@ -0,0 +1,301 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - google-api-core
+# - google-cloud-compute
+# - prometheus-client
+
+import asyncio
+import random
+
+from logging import Logger
+from typing import Dict, List, Optional, Set
+
+from google.api_core import exceptions as core_exceptions
+from google.cloud import compute_v1
+from prometheus_client import Counter, Gauge
+
+from app.services.deadline import spawn_detached, wait_event
+from app.services.executor import ProviderExecutor
+
+GCP_DELETES_PENDING = Gauge(
+    name="session_dsm_gcp_deletes_pending",
+    documentation="number of instance deletions not yet confirmed, by zone",
+    labelnames=["zone"],
+    multiprocess_mode="livesum",
+)
+GCP_DELETE_RESULTS = Counter(
+    name="session_dsm_gcp_delete_results",
+    documentation="number of instance deletions by result (deleted, gone, retried or failed)",
+    labelnames=["result"],
+)
+GCP_DELETE_VERIFICATIONS = Counter(
+    name="session_dsm_gcp_delete_verifications",
+    documentation="number of list calls made to confirm instance deletions",
+)
+
+
+class GcpDeletion:
+    __slots__ = ("instance_name", "attempts", "retry_at", "issued_at")
+
+    def __init__(self, instance_name: str) -> None:
+        self.instance_name = instance_name
+        self.attempts = 0
+        self.retry_at = 0.0
+        self.issued_at = 0.0
+
+
+class GcpZoneDeletions:
+    __slots__ = ("pending", "issued", "wakeup", "worker")
+
+    def __init__(self) -> None:
+        # waiting for the delete call to be issued (or issued again)
+        self.pending: Dict[str, GcpDeletion] = {}
+        # delete call issued, waiting for the instance to disappear
+        self.issued: Dict[str, GcpDeletion] = {}
+        self.wakeup = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.pending) + len(self.issued)
+
+
+class GcpDeleteTracker:
+    """Deletes instances in the background, coalesced per zone.
+
+    `enqueue` returns immediately. Every zone has one worker that waits
+    `batch_delay` seconds to collect the deletions of a burst, issues up to
+    `batch_size` delete calls at a time without waiting for their operations,
+    and then confirms all deletions of the zone with one list call every
+    `verify_interval` seconds. Instances that fail to delete, or are still
+    listed `verify_timeout` seconds after their delete was issued, are deleted
+    again with an exponential backoff, up to `max_attempts` times.
+
+    Deletions live in memory and are lost if the process exits before they
+    are issued.
+    """
+
+    DEFAULT_BATCH_SIZE: int = 50
+    DEFAULT_BATCH_DELAY: float = 0.5
+    DEFAULT_VERIFY_INTERVAL: float = 5.0
+    DEFAULT_VERIFY_TIMEOUT: float = 300.0
+    DEFAULT_MAX_ATTEMPTS: int = 5
+    DEFAULT_BACKOFF_BASE: float = 2.0
+    DEFAULT_BACKOFF_MAX: float = 120.0
+
+    # maximum number of instance names in one list filter
+    MAX_NAMES_PER_FILTER: int = 50
+
+    def __init__(
+        self,
+        instances_client: compute_v1.InstancesClient,
+        executor: ProviderExecutor,
+        project_id: str,
+        batch_size: Optional[int] = None,
+        batch_delay: Optional[float] = None,
+        verify_interval: Optional[float] = None,
+        verify_timeout: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if batch_size is None:
+            batch_size = self.DEFAULT_BATCH_SIZE
+        if batch_delay is None:
+            batch_delay = self.DEFAULT_BATCH_DELAY
+        if verify_interval is None:
+            verify_interval = self.DEFAULT_VERIFY_INTERVAL
+        if verify_timeout is None:
+            verify_timeout = self.DEFAULT_VERIFY_TIMEOUT
+        if max_attempts is None:
+            max_attempts = self.DEFAULT_MAX_ATTEMPTS
+
+        self.instances_client = instances_client
+        self.executor = executor
+        self.project_id = project_id
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay
+        self.verify_interval = verify_interval
+        self.verify_timeout = verify_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = self.DEFAULT_BACKOFF_BASE
+        self.backoff_max = self.DEFAULT_BACKOFF_MAX
+        self.logger = logger
+
+        self.zones: Dict[str, GcpZoneDeletions] = {}
+        self.stopping: bool = False
+
+    def enqueue(self, instance_name: str, zone: str) -> None:
+        deletions = self.zones.get(zone)
+        if deletions is None:
+            deletions = self.zones[zone] = GcpZoneDeletions()
+
+        if instance_name in deletions.pending or instance_name in deletions.issued:
+            return
+        deletions.pending[instance_name] = GcpDeletion(instance_name=instance_name)
+        GCP_DELETES_PENDING.labels(zone=zone).set(len(deletions))
+
+        deletions.wakeup.set()
+        if self.stopping:
+            return
+        if deletions.worker is None or deletions.worker.done():
+            deletions.worker = spawn_detached(self.work(zone, deletions))
+
+    def is_pending(self, instance_name: str, zone: str) -> bool:
+        deletions = self.zones.get(zone)
+        return deletions is not None and (
+            instance_name in deletions.pending or instance_name in deletions.issued
+        )
+
+    async def work(self, zone: str, deletions: GcpZoneDeletions) -> None:
+        loop = asyncio.get_running_loop()
+        next_verify = loop.time() + self.verify_interval
+
+        while deletions and not self.stopping:
+            if deletions.wakeup.is_set():
+                deletions.wakeup.clear()
+                # let the rest of the burst arrive
+                await asyncio.sleep(self.batch_delay)
+
+            now = loop.time()
+            due = [d for d in deletions.pending.values() if d.retry_at <= now]
+            for i in range(0, len(due), self.batch_size):
+                await asyncio.gather(
+                    *[
+                        self.issue(zone, deletions, deletion)
+                        for deletion in due[i : i + self.batch_size]
+                    ]
+                )
+
+            if deletions.issued and loop.time() >= next_verify:
+                await self.verify(zone, deletions)
+                next_verify = loop.time() + self.verify_interval
+
+            GCP_DELETES_PENDING.labels(zone=zone).set(len(deletions))
+            if not deletions:
+                break
+
+            wake_at = [d.retry_at for d in deletions.pending.values()]
+            if deletions.issued:
+                wake_at.append(next_verify)
+            await wait_event(
+                deletions.wakeup, timeout=max(0.0, min(wake_at) - loop.time())
+            )
+
+    async def issue(
+        self, zone: str, deletions: GcpZoneDeletions, deletion: GcpDeletion
+    ) -> None:
+        deletion.attempts += 1
+        request = compute_v1.DeleteInstanceRequest(
+            project=self.project_id,
+            zone=zone,
+            instance=deletion.instance_name,
+        )
+        try:
+            await self.executor.run(zone, self.instances_client.delete, request=request)
+        except core_exceptions.NotFound:
+            del deletions.pending[deletion.instance_name]
+            GCP_DELETE_RESULTS.labels(result="gone").inc()
+            return
+        except Exception as exception:
+            self.retry_later(zone, deletions, deletion, exception)
+            return
+
+        del deletions.pending[deletion.instance_name]
+        deletion.issued_at = asyncio.get_running_loop().time()
+        deletions.issued[deletion.instance_name] = deletion
+
+    async def verify(self, zone: str, deletions: GcpZoneDeletions) -> None:
+        names = list(deletions.issued)
+        remaining: Set[str] = set()
+        try:
+            for i in range(0, len(names), self.MAX_NAMES_PER_FILTER):
+                remaining.update(
+                    await self.executor.run(
+                        zone,
+                        self.list_instance_names,
+                        zone,
+                        names[i : i + self.MAX_NAMES_PER_FILTER],
+                    )
+                )
+        except Exception as exception:
+            if self.logger:
+                self.logger.warning(
+                    f"Failed to confirm instance deletions in {zone}: {exception}"
+                )
+            return
+
+        now = asyncio.get_running_loop().time()
+        for name in names:
+            deletion = deletions.issued[name]
+            if name not in remaining:
+                del deletions.issued[name]
+                GCP_DELETE_RESULTS.labels(result="deleted").inc()
+            elif now - deletion.issued_at >= self.verify_timeout:
+                del deletions.issued[name]
+                deletions.pending[name] = deletion
+                self.retry_later(
+                    zone,
+                    deletions,
+                    deletion,
+                    TimeoutError(f"still listed after {self.verify_timeout}s"),
+                )
+
+    def list_instance_names(self, zone: str, names: List[str]) -> List[str]:
+        GCP_DELETE_VERIFICATIONS.inc()
+        request = compute_v1.ListInstancesRequest(
+            project=self.project_id,
+            zone=zone,
+            filter=" OR ".join(f'(name = "{name}")' for name in names),
+        )
+        return [
+            instance.name for instance in self.instances_client.list(request=request)
+        ]
+
+    def retry_later(
+        self,
+        zone: str,
+        deletions: GcpZoneDeletions,
+        deletion: GcpDeletion,
+        exception: BaseException,
+    ) -> None:
+        if deletion.attempts >= self.max_attempts:
+            deletions.pending.pop(deletion.instance_name, None)
+            GCP_DELETE_RESULTS.labels(result="failed").inc()
+            if self.logger:
+                self.logger.error(
+                    f"Giving up deleting instance {deletion.instance_name} in {zone}"
+                    f" after {deletion.attempts} attempts: {exception}"
+                )
+            return
+
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (deletion.attempts - 1))
+        deletion.retry_at = asyncio.get_running_loop().time() + random.uniform(
+            delay / 2, delay
+        )
+        GCP_DELETE_RESULTS.labels(result="retried").inc()
+        if self.logger:
+            self.logger.warning(
+                f"Failed to delete instance {deletion.instance_name} in {zone}: {exception}"
+            )
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Waits up to `timeout` seconds for the pending deletions, then stops the workers."""
+        workers = [d.worker for d in self.zones.values() if d.worker is not None]
+        if workers and timeout:
+            await asyncio.wait(workers, timeout=timeout)
+
+        self.stopping = True
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        dropped = sum(len(d.pending) for d in self.zones.values())
+        if dropped and self.logger:
+            self.logger.warning(f"{dropped} instance deletion(s) dropped on shutdown")
+
+
+__all__ = [
+    "GcpDeleteTracker",
+]
@@ -0,0 +1,257 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - google-api-core
+# - google-cloud-compute
+
+import random
+import re
+import threading
+import time
+import uuid
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.api_core import exceptions as core_exceptions
+from google.cloud import compute_v1
+
+NAME_FILTER_PATTERN = re.compile(r'name\s*=\s*"([^"]+)"')
+LABEL_FILTER_PATTERN = re.compile(r'labels\.([\w-]+)\s*=\s*"([^"]*)"')
+
+
+class FakeGcpOperation:
+    """In-memory stand-in for a zonal `ExtendedOperation`."""
+
+    def __init__(
+        self, client: "FakeGcpInstancesClient", operation_type: str, done_at: float
+    ) -> None:
+        self.client = client
+        self.name = f"operation-{operation_type}-{uuid.uuid4().hex[:12]}"
+        self.done_at = done_at
+        self.error_code = ""
+        self.error_message = ""
+        self.warnings: List[Any] = []
+
+    def done(self) -> bool:
+        self.client.simulate("GetZoneOperation")
+        return time.time() >= self.done_at
+
+    def result(self) -> None:
+        return None
+
+    def exception(self) -> Optional[Exception]:
+        return None
+
+
+class FakeGcpInstance:
+    __slots__ = (
+        "name",
+        "zone",
+        "labels",
+        "metadata",
+        "created_at",
+        "fingerprint",
+        "label_fingerprint",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        zone: str,
+        labels: Dict[str, str],
+        metadata: Dict[str, str],
+        created_at: float,
+    ) -> None:
+        self.name = name
+        self.zone = zone
+        self.labels = labels
+        self.metadata = metadata
+        self.created_at = created_at
+        self.fingerprint = uuid.uuid4().hex[:16]
+        self.label_fingerprint = uuid.uuid4().hex[:16]
+
+    def matches(self, labels: Dict[str, str]) -> bool:
+        return all(self.labels.get(k) == v for k, v in labels.items())
+
+
+class FakeGcpInstancesClient:
+    """In-memory stand-in for `compute_v1.InstancesClient`.
+
+    Implements the calls the GCP service makes, with the same request and
+    response types, so the plugin can run locally and under load without GCP.
+    Every call (including operation polls) sleeps for `latency` seconds (plus
+    up to `jitter`) on the calling thread and fails with a ServiceUnavailable
+    error with probability `error_rate`. Operations finish `operation_delay`
+    seconds after they start and instances are RUNNING `boot_delay` seconds
+    after they are inserted.
+    """
+
+    DEFAULT_IP_ADDRESS: str = "127.0.0.1"
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        operation_delay: float = 0.5,
+        boot_delay: float = 1.0,
+        ip_address: Optional[str] = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.operation_delay = operation_delay
+        self.boot_delay = boot_delay
+        self.ip_address = ip_address if ip_address else self.DEFAULT_IP_ADDRESS
+
+        self.lock = threading.Lock()
+        self.instances: Dict[Tuple[str, str], FakeGcpInstance] = {}
+        self.calls: Dict[str, int] = {}
+
+    def insert(self, request: compute_v1.InsertInstanceRequest) -> FakeGcpOperation:
+        self.simulate("InsertInstance")
+        resource = request.instance_resource
+        key = (request.zone, resource.name)
+        with self.lock:
+            if key in self.instances:
+                raise core_exceptions.Conflict(
+                    f"The resource '{resource.name}' already exists"
+                )
+            self.instances[key] = FakeGcpInstance(
+                name=resource.name,
+                zone=request.zone,
+                labels=dict(resource.labels),
+                metadata={item.key: item.value for item in resource.metadata.items},
+                created_at=time.time(),
+            )
+        return self.new_operation("insert")
+
+    def delete(self, request: compute_v1.DeleteInstanceRequest) -> FakeGcpOperation:
+        self.simulate("DeleteInstance")
+        with self.lock:
+            if self.instances.pop((request.zone, request.instance), None) is None:
+                raise core_exceptions.NotFound(
+                    f"The resource '{request.instance}' was not found"
+                )
+        return self.new_operation("delete")
+
+    def set_metadata(
+        self, request: compute_v1.SetMetadataInstanceRequest
+    ) -> FakeGcpOperation:
+        self.simulate("SetMetadataInstance")
+        with self.lock:
+            instance = self.instances.get((request.zone, request.instance))
+            if instance is None:
+                raise core_exceptions.NotFound(
+                    f"The resource '{request.instance}' was not found"
+                )
+            instance.metadata = {
+                item.key: item.value for item in request.metadata_resource.items
+            }
+            instance.fingerprint = uuid.uuid4().hex[:16]
+        return self.new_operation("setMetadata")
+
+    def set_labels(
+        self, request: compute_v1.SetLabelsInstanceRequest
+    ) -> FakeGcpOperation:
+        self.simulate("SetLabelsInstance")
+        resource = request.instances_set_labels_request_resource
+        with self.lock:
+            instance = self.instances.get((request.zone, request.instance))
+            if instance is None:
+                raise core_exceptions.NotFound(
+                    f"The resource '{request.instance}' was not found"
+                )
+            if resource.label_fingerprint != instance.label_fingerprint:
+                raise core_exceptions.PreconditionFailed(
+                    f"Labels fingerprint of '{request.instance}' is stale"
+                )
+            instance.labels = dict(resource.labels)
+            instance.label_fingerprint = uuid.uuid4().hex[:16]
+        return self.new_operation("setLabels")
+
+    def list(
+        self, request: compute_v1.ListInstancesRequest
+    ) -> List[compute_v1.Instance]:
+        self.simulate("ListInstances")
+        names = set(NAME_FILTER_PATTERN.findall(request.filter))
+        labels = dict(LABEL_FILTER_PATTERN.findall(request.filter))
+        with self.lock:
+            instances = [
+                instance
+                for (zone, name), instance in self.instances.items()
+                if zone == request.zone
+                and (not names or name in names)
+                and instance.matches(labels)
+            ]
+            return [self.render(instance) for instance in instances]
+
+    def aggregated_list(
+        self, request: compute_v1.AggregatedListInstancesRequest
+    ) -> Iterator[Tuple[str, compute_v1.InstancesScopedList]]:
+        self.simulate("AggregatedListInstances")
+        labels = dict(LABEL_FILTER_PATTERN.findall(request.filter))
+        zones: Dict[str, List[compute_v1.Instance]] = {}
+        with self.lock:
+            for instance in self.instances.values():
+                if instance.matches(labels):
+                    zones.setdefault(instance.zone, []).append(self.render(instance))
+        return iter(
+            [
+                (f"zones/{zone}", compute_v1.InstancesScopedList(instances=instances))
+                for zone, instances in zones.items()
+            ]
+        )
+
+    def render(self, instance: FakeGcpInstance) -> compute_v1.Instance:
+        running = time.time() - instance.created_at >= self.boot_delay
+        return compute_v1.Instance(
+            name=instance.name,
+            zone=instance.zone,
+            status="RUNNING" if running else "PROVISIONING",
+            labels=instance.labels,
+            label_fingerprint=instance.label_fingerprint,
+            creation_timestamp=datetime.fromtimestamp(
+                instance.created_at, tz=timezone.utc
+            ).isoformat(),
+            metadata=compute_v1.Metadata(
+                fingerprint=instance.fingerprint,
+                items=[
+                    compute_v1.Items(key=key, value=value)
+                    for key, value in instance.metadata.items()
+                ],
+            ),
+            network_interfaces=[
+                compute_v1.NetworkInterface(
+                    access_configs=[
+                        compute_v1.AccessConfig(
+                            nat_i_p=self.ip_address if running else ""
+                        )
+                    ]
+                )
+            ],
+        )
+
+    def new_operation(self, operation_type: str) -> FakeGcpOperation:
+        return FakeGcpOperation(
+            client=self,
+            operation_type=operation_type,
+            done_at=time.time() + self.operation_delay,
+        )
+
+    def simulate(self, operation_name: str) -> None:
+        with self.lock:
+            self.calls[operation_name] = self.calls.get(operation_name, 0) + 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            raise core_exceptions.ServiceUnavailable(f"{operation_name}: unavailable")
+
+
+__all__ = [
+    "FakeGcpInstancesClient",
+]
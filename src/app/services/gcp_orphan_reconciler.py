@@ -0,0 +1,262 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - google-cloud-compute
+# - prometheus-client
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from datetime import datetime
+from logging import Logger
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple, Union
+
+from google.cloud import compute_v1
+from prometheus_client import Counter, Gauge
+
+from accelbyte_grpc_plugin.app import App, AppOptionApplyOrderEnum, AppOptionBase
+
+if TYPE_CHECKING:
+    from app.services.session_dsm_gcp import AsyncSessionDsmGcpService
+
+ORPHAN_INSTANCES = Gauge(
+    name="session_dsm_gcp_orphan_instances",
+    documentation="number of orphaned instances found by the last reconciliation",
+    multiprocess_mode="livesum",
+)
+ORPHANS_DELETED = Counter(
+    name="session_dsm_gcp_orphans_deleted",
+    documentation="number of orphaned instances queued for deletion by the reconciler",
+    labelnames=["zone"],
+)
+RECONCILIATIONS = Counter(
+    name="session_dsm_gcp_orphan_reconciliations",
+    documentation="number of orphan reconciliation passes by result (success or failure)",
+    labelnames=["result"],
+)
+
+InstanceKey = Tuple[str, str]
+
+
+class GcpOrphanReconciler:
+    """Deletes GCP instances that were leaked by failed creations or deletions.
+
+    Every `interval` seconds all instances carrying the service's `managed-by`
+    and owner labels are listed with one aggregated call across zones. The
+    owner label is shared by all workers and restarts of a deployment. An
+    instance is an orphan when it is older than `grace_period`, is not
+    assigned to a session of this process, not in its warm pool and not
+    already being deleted, and either
+
+    - was created by this process and never served a session (it has no
+      session labels), so nothing else can be using it, or
+    - is older than `max_age`, the longest a session can last. This covers
+      the instances of crashed or restarted processes and of sibling workers.
+      Warm pool instances are recycled well before they reach it.
+
+    An instance must be an orphan in two passes in a row before it is deleted,
+    so instances moving between the warm pool and a session are never caught
+    in between. At most `max_deletes` orphans are deleted per pass, through
+    the service's per-zone delete tracker.
+    """
+
+    DEFAULT_INTERVAL: float = 300.0
+    DEFAULT_GRACE_PERIOD: float = 900.0
+    DEFAULT_MAX_AGE: float = 86400.0
+    DEFAULT_MAX_DELETES: int = 100
+
+    def __init__(
+        self,
+        service: AsyncSessionDsmGcpService,
+        interval: Optional[float] = None,
+        grace_period: Optional[float] = None,
+        max_age: Optional[float] = None,
+        max_deletes: Optional[int] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if interval is None:
+            interval = self.DEFAULT_INTERVAL
+        if grace_period is None:
+            grace_period = self.DEFAULT_GRACE_PERIOD
+        if max_age is None:
+            max_age = self.DEFAULT_MAX_AGE
+        if max_deletes is None:
+            max_deletes = self.DEFAULT_MAX_DELETES
+
+        self.service = service
+        self.interval = interval
+        self.grace_period = grace_period
+        self.max_age = max_age
+        self.max_deletes = max_deletes
+        self.logger = logger
+
+        self.suspects: Set[InstanceKey] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.reconcile()
+            except Exception as exception:
+                RECONCILIATIONS.labels(result="failure").inc()
+                if self.logger:
+                    self.logger.warning(f"Failed to reconcile instances: {exception}")
+            else:
+                RECONCILIATIONS.labels(result="success").inc()
+
+    async def reconcile(self) -> List[InstanceKey]:
+        instances = await self.service.executor.run(
+            "aggregated", self.list_managed_instances
+        )
+
+        # taken after the list call so that nothing changes in between
+        known = self.get_known_instances()
+        now = time.time()
+        orphans = [
+            (instance.name, zone)
+            for zone, instance in instances
+            if (instance.name, zone) not in known
+            and self.is_orphan(instance=instance, now=now)
+        ]
+        ORPHAN_INSTANCES.set(len(orphans))
+
+        confirmed = [key for key in orphans if key in self.suspects]
+        self.suspects = set(orphans)
+
+        deleted = confirmed[: self.max_deletes]
+        for instance_name, zone in deleted:
+            self.service.delete_tracker.enqueue(instance_name=instance_name, zone=zone)
+            self.suspects.discard((instance_name, zone))
+            ORPHANS_DELETED.labels(zone=zone).inc()
+        if deleted and self.logger:
+            self.logger.warning(
+                f"Deleting {len(deleted)} orphaned instance(s): "
+                + ", ".join(name for name, _ in deleted)
+            )
+        return deleted
+
+    def list_managed_instances(self) -> List[Tuple[str, compute_v1.Instance]]:
+        managed_by = self.service.instance_labels["managed-by"]
+        request = compute_v1.AggregatedListInstancesRequest(
+            project=self.service.project_id,
+            filter=(
+                f'(labels.managed-by = "{managed_by}")'
+                f' AND (labels.{self.service.OWNER_LABEL} = "{self.service.owner_id}")'
+            ),
+            return_partial_success=True,
+        )
+        instances = []
+        for scope, scoped_list in self.service.instances_client.aggregated_list(
+            request=request
+        ):
+            # scopes are named "zones/<zone>"
+            zone = scope.rsplit("/", 1)[-1]
+            instances.extend((zone, instance) for instance in scoped_list.instances)
+        return instances
+
+    def get_known_instances(self) -> Set[InstanceKey]:
+        known = set(self.service.assigned_instances.values())
+        if self.service.warm_pool is not None:
+            known.update(self.service.warm_pool.get_instances())
+        for zone, deletions in self.service.delete_tracker.zones.items():
+            known.update((name, zone) for name in deletions.pending)
+            known.update((name, zone) for name in deletions.issued)
+        return known
+
+    def is_orphan(self, instance: compute_v1.Instance, now: float) -> bool:
+        age = now - self.get_creation_time(instance, default=now)
+        if age < self.grace_period:
+            return False
+        if (
+            instance.labels.get(self.service.PROCESS_LABEL) == self.service.process_id
+            and self.service.SESSION_LABEL not in instance.labels
+        ):
+            return True
+        return bool(self.max_age) and age >= self.max_age
+
+    @staticmethod
+    def get_creation_time(instance: compute_v1.Instance, default: float) -> float:
+        try:
+            return datetime.fromisoformat(instance.creation_timestamp).timestamp()
+        except (TypeError, ValueError):
+            return default
+
+
+class AppOptionGcpOrphanReconciler(AppOptionBase):
+    DEFAULT_ENABLED: bool = True
+
+    def __init__(
+        self,
+        service: AsyncSessionDsmGcpService,
+        enabled: Optional[bool] = None,
+        interval: Optional[float] = None,
+        grace_period: Optional[float] = None,
+        max_age: Optional[float] = None,
+        max_deletes: Optional[int] = None,
+    ) -> None:
+        self.service = service
+        self.enabled = enabled
+        self.interval = interval
+        self.grace_period = grace_period
+        self.max_age = max_age
+        self.max_deletes = max_deletes
+        self.reconciler: Optional[GcpOrphanReconciler] = None
+
+    def apply(self, app: App, /, *args, **kwargs) -> None:
+        with app.env.prefixed("GCP_ORPHAN_"):
+            if self.enabled is None:
+                self.enabled = app.env.bool("ENABLED", self.DEFAULT_ENABLED)
+            if self.interval is None:
+                self.interval = app.env.float("INTERVAL", None)
+            if self.grace_period is None:
+                self.grace_period = app.env.float("GRACE_PERIOD", None)
+            if self.max_age is None:
+                self.max_age = app.env.float("MAX_AGE", None)
+            if self.max_deletes is None:
+                self.max_deletes = app.env.int("MAX_DELETES", None)
+
+        if not self.enabled:
+            return
+
+        self.reconciler = GcpOrphanReconciler(
+            service=self.service,
+            interval=self.interval,
+            grace_period=self.grace_period,
+            max_age=self.max_age,
+            max_deletes=self.max_deletes,
+            logger=app.logger,
+        )
+        self.reconciler.start()
+        app.logger.info(
+            "orphan reconciler started (interval: %ss, grace period: %ss)",
+            self.reconciler.interval,
+            self.reconciler.grace_period,
+        )
+
+    async def stop(self) -> None:
+        if self.reconciler is not None:
+            await self.reconciler.stop()
+
+    def get_order(self) -> Union[int, AppOptionApplyOrderEnum]:
+        return AppOptionApplyOrderEnum.ADD_GRPC_SERVICES
+
+
+__all__ = [
+    "AppOptionGcpOrphanReconciler",
+    "GcpOrphanReconciler",
+]
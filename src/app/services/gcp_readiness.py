@@ -0,0 +1,180 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - google-cloud-compute
+# - prometheus-client
+
+import asyncio
+
+from logging import Logger
+from typing import Dict, List, Optional
+
+from google.cloud import compute_v1
+from prometheus_client import Counter, Gauge
+
+from app.services.deadline import spawn_detached, wait_event, wait_for
+from app.services.executor import ProviderExecutor
+
+READINESS_POLLS = Counter(
+    name="session_dsm_gcp_readiness_polls",
+    documentation="number of batched instance list calls made by the readiness watcher",
+    labelnames=["zone"],
+)
+READINESS_WAITERS = Gauge(
+    name="session_dsm_gcp_readiness_waiters",
+    documentation="number of instances waiting to become RUNNING",
+    labelnames=["zone"],
+    multiprocess_mode="livesum",
+)
+
+
+class GcpReadinessWatcher:
+    """Resolves many pending instances per zone with a single batched list call.
+
+    Every zone with pending instances has one background poller. The poller
+    lists all pending instances of the zone at once, wakes the waiters of the
+    instances that are RUNNING, and backs off exponentially while nothing
+    changes. A new waiter resets the backoff of its zone.
+    """
+
+    DEFAULT_MIN_INTERVAL: float = 0.25
+    DEFAULT_MAX_INTERVAL: float = 5.0
+    DEFAULT_BACKOFF_FACTOR: float = 2.0
+    # keeps the list filter expression well below the request size limits
+    MAX_NAMES_PER_CALL: int = 50
+
+    def __init__(
+        self,
+        instances_client: compute_v1.InstancesClient,
+        executor: ProviderExecutor,
+        project_id: str,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        backoff_factor: Optional[float] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if min_interval is None:
+            min_interval = self.DEFAULT_MIN_INTERVAL
+        if max_interval is None:
+            max_interval = self.DEFAULT_MAX_INTERVAL
+        if backoff_factor is None:
+            backoff_factor = self.DEFAULT_BACKOFF_FACTOR
+
+        self.instances_client = instances_client
+        self.executor = executor
+        self.project_id = project_id
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff_factor = backoff_factor
+        self.logger = logger
+
+        self.waiters: Dict[str, Dict[str, asyncio.Future]] = {}
+        self.wake_events: Dict[str, asyncio.Event] = {}
+        self.pollers: Dict[str, asyncio.Task] = {}
+        self.stopping: bool = False
+
+    async def wait_until_running(
+        self, instance_name: str, zone: str, timeout: Optional[float] = None
+    ) -> compute_v1.Instance:
+        zone_waiters = self.waiters.setdefault(zone, {})
+        future = zone_waiters.get(instance_name)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            zone_waiters[instance_name] = future
+            READINESS_WAITERS.labels(zone=zone).set(len(zone_waiters))
+
+        poller = self.pollers.get(zone)
+        if poller is None or poller.done():
+            self.wake_events[zone] = asyncio.Event()
+            self.pollers[zone] = spawn_detached(self.poll(zone=zone))
+        else:
+            self.wake_events[zone].set()
+
+        try:
+            return await wait_for(
+                asyncio.shield(future), timeout=timeout, verbose_name=instance_name
+            )
+        finally:
+            if zone_waiters.get(instance_name) is future and not future.done():
+                future.cancel()
+                del zone_waiters[instance_name]
+                READINESS_WAITERS.labels(zone=zone).set(len(zone_waiters))
+
+    async def poll(self, zone: str) -> None:
+        loop = asyncio.get_running_loop()
+        zone_waiters = self.waiters[zone]
+        wake_event = self.wake_events[zone]
+        interval = self.min_interval
+
+        while zone_waiters and not self.stopping:
+            polled_at = loop.time()
+            resolved = 0
+            try:
+                instances = await self.list_pending(zone=zone, names=list(zone_waiters))
+                for instance in instances:
+                    if instance.status != "RUNNING":
+                        continue
+                    future = zone_waiters.pop(instance.name, None)
+                    if future is not None and not future.done():
+                        future.set_result(instance)
+                        resolved += 1
+            except Exception as exception:
+                if self.logger:
+                    self.logger.warning(
+                        f"Failed to list pending instances in {zone}: {exception}"
+                    )
+            READINESS_WAITERS.labels(zone=zone).set(len(zone_waiters))
+
+            if resolved:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff_factor, self.max_interval)
+
+            if not zone_waiters:
+                break
+
+            wake_event.clear()
+            if await wait_event(wake_event, timeout=interval):
+                # new waiters reset the backoff, but never poll faster than min_interval
+                interval = self.min_interval
+                elapsed = loop.time() - polled_at
+                if elapsed < self.min_interval:
+                    await asyncio.sleep(self.min_interval - elapsed)
+
+    async def stop(self) -> None:
+        self.stopping = True
+        pollers = list(self.pollers.values())
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        self.pollers.clear()
+
+    async def list_pending(
+        self, zone: str, names: List[str]
+    ) -> List[compute_v1.Instance]:
+        instances: List[compute_v1.Instance] = []
+        for i in range(0, len(names), self.MAX_NAMES_PER_CALL):
+            chunk = names[i : i + self.MAX_NAMES_PER_CALL]
+            li_request = compute_v1.ListInstancesRequest(
+                project=self.project_id,
+                zone=zone,
+                filter=" OR ".join(f'(name = "{name}")' for name in chunk),
+            )
+            READINESS_POLLS.labels(zone=zone).inc()
+            instances.extend(
+                await self.executor.run(zone, self.list_instances, li_request)
+            )
+        return instances
+
+    def list_instances(
+        self, request: compute_v1.ListInstancesRequest
+    ) -> List[compute_v1.Instance]:
+        # the pager fetches the remaining pages lazily, so drain it on the worker thread
+        return list(self.instances_client.list(request=request))
+
+
+__all__ = [
+    "GcpReadinessWatcher",
+]
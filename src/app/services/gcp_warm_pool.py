@@ -0,0 +1,288 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - google-cloud-compute
+# - prometheus-client
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+
+from collections import deque
+from logging import Logger
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Set, Tuple
+
+from google.cloud import compute_v1
+from prometheus_client import Counter, Gauge
+
+from app.services.deadline import wait_event
+
+if TYPE_CHECKING:
+    from app.services.session_dsm_gcp import AsyncSessionDsmGcpService
+
+WARM_POOL_REQUESTS = Counter(
+    name="session_dsm_gcp_warm_pool_requests",
+    documentation="number of warm pool lookups by result (hit or miss)",
+    labelnames=["region", "deployment", "result"],
+)
+WARM_POOL_READY = Gauge(
+    name="session_dsm_gcp_warm_pool_ready",
+    documentation="number of booted instances waiting in the warm pool",
+    labelnames=["region", "deployment"],
+    multiprocess_mode="livesum",
+)
+WARM_POOL_PROVISIONING = Gauge(
+    name="session_dsm_gcp_warm_pool_provisioning",
+    documentation="number of warm pool instances being provisioned",
+    labelnames=["region", "deployment"],
+    multiprocess_mode="livesum",
+)
+WARM_POOL_REAPED = Counter(
+    name="session_dsm_gcp_warm_pool_reaped",
+    documentation="number of idle warm pool instances deleted",
+    labelnames=["region", "deployment"],
+)
+
+WarmPoolKey = Tuple[str, str]
+
+
+class GcpWarmInstance:
+    __slots__ = ("name", "zone", "ip", "instance", "ready_at")
+
+    def __init__(
+        self, name: str, zone: str, ip: str, instance: compute_v1.Instance
+    ) -> None:
+        self.name = name
+        self.zone = zone
+        self.ip = ip
+        self.instance = instance
+        self.ready_at = time.monotonic()
+
+
+class GcpWarmPool:
+    """Keeps booted GCP instances ready to be handed out to new game sessions.
+
+    There is one pool per (GCP region, deployment). Every pool holds at least
+    `min_size` booted instances, grows by one towards `max_size` whenever a
+    request misses, and shrinks back towards `min_size` by deleting instances
+    that stayed idle for longer than `idle_timeout` seconds. Instances idle
+    for longer than `max_lifetime` are replaced even at `min_size`, so they
+    never reach the orphan reconciler's max age.
+    """
+
+    DEFAULT_MIN_SIZE: int = 1
+    DEFAULT_MAX_SIZE: int = 4
+    DEFAULT_IDLE_TIMEOUT: float = 1800.0
+    DEFAULT_MAX_LIFETIME: float = 43200.0
+    DEFAULT_REFILL_INTERVAL: float = 5.0
+    DEFAULT_NAME_PREFIX: str = "dsm-pool"
+
+    def __init__(
+        self,
+        keys: List[WarmPoolKey],
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        max_lifetime: Optional[float] = None,
+        refill_interval: Optional[float] = None,
+        name_prefix: Optional[str] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if min_size is None:
+            min_size = self.DEFAULT_MIN_SIZE
+        if max_size is None:
+            max_size = self.DEFAULT_MAX_SIZE
+        if idle_timeout is None:
+            idle_timeout = self.DEFAULT_IDLE_TIMEOUT
+        if max_lifetime is None:
+            max_lifetime = self.DEFAULT_MAX_LIFETIME
+        if refill_interval is None:
+            refill_interval = self.DEFAULT_REFILL_INTERVAL
+        if not name_prefix:
+            name_prefix = self.DEFAULT_NAME_PREFIX
+
+        self.keys = list(dict.fromkeys(keys))
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.refill_interval = refill_interval
+        self.name_prefix = name_prefix
+        self.logger = logger
+
+        self.service: Optional[AsyncSessionDsmGcpService] = None
+
+        self.ready: Dict[WarmPoolKey, Deque[GcpWarmInstance]] = {
+            key: deque() for key in self.keys
+        }
+        self.provisioning: Dict[WarmPoolKey, int] = {key: 0 for key in self.keys}
+        self.targets: Dict[WarmPoolKey, int] = {key: self.min_size for key in self.keys}
+
+        self.refill_event: Optional[asyncio.Event] = None
+        self.refill_task: Optional[asyncio.Task] = None
+        self.stopping: bool = False
+        self.provision_tasks: Set[asyncio.Task] = set()
+
+    def bind(self, service: AsyncSessionDsmGcpService) -> None:
+        self.service = service
+
+    def start(self) -> None:
+        if self.refill_task is not None:
+            return
+        if self.service is None:
+            raise RuntimeError("warm pool is not bound to a service")
+        self.stopping = False
+        self.refill_event = asyncio.Event()
+        self.refill_task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self.stopping = True
+        tasks = list(self.provision_tasks)
+        if self.refill_task is not None:
+            tasks.append(self.refill_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.refill_task = None
+
+        # idle instances would otherwise keep running without any session
+        deletions = []
+        for key, instances in self.ready.items():
+            while instances:
+                warm_instance = instances.popleft()
+                deletions.append(self.delete(key=key, warm_instance=warm_instance))
+            self.update_gauges(key=key)
+        await asyncio.gather(*deletions, return_exceptions=True)
+
+    def acquire(self, gcp_region: str, deployment: str) -> Optional[GcpWarmInstance]:
+        key = (gcp_region, deployment)
+        instances = self.ready.get(key)
+        if instances is None:
+            return None
+
+        if not instances:
+            WARM_POOL_REQUESTS.labels(
+                region=gcp_region, deployment=deployment, result="miss"
+            ).inc()
+            self.targets[key] = min(self.targets[key] + 1, self.max_size)
+            self.request_refill()
+            return None
+
+        # most recently booted first, so the oldest instances age out when idle
+        warm_instance = instances.pop()
+        WARM_POOL_REQUESTS.labels(
+            region=gcp_region, deployment=deployment, result="hit"
+        ).inc()
+        self.update_gauges(key=key)
+        self.request_refill()
+        return warm_instance
+
+    def get_instances(self) -> Set[Tuple[str, str]]:
+        return {
+            (warm_instance.name, warm_instance.zone)
+            for instances in self.ready.values()
+            for warm_instance in instances
+        }
+
+    def request_refill(self) -> None:
+        if self.refill_event is not None:
+            self.refill_event.set()
+
+    async def run(self) -> None:
+        assert self.refill_event is not None
+        while not self.stopping:
+            for key in self.keys:
+                self.reap(key=key)
+                self.refill(key=key)
+
+            await wait_event(self.refill_event, timeout=self.refill_interval)
+            self.refill_event.clear()
+
+    def reap(self, key: WarmPoolKey) -> None:
+        instances = self.ready[key]
+        now = time.monotonic()
+        while (
+            instances
+            and len(instances) > self.min_size
+            and now - instances[0].ready_at > self.idle_timeout
+        ):
+            warm_instance = instances.popleft()
+            self.targets[key] = max(self.targets[key] - 1, self.min_size)
+            WARM_POOL_REAPED.labels(region=key[0], deployment=key[1]).inc()
+            self.spawn(self.delete(key=key, warm_instance=warm_instance))
+        # the oldest instances are at the left, refill replaces the retired ones
+        while instances and now - instances[0].ready_at > self.max_lifetime:
+            warm_instance = instances.popleft()
+            WARM_POOL_REAPED.labels(region=key[0], deployment=key[1]).inc()
+            self.spawn(self.delete(key=key, warm_instance=warm_instance))
+        self.update_gauges(key=key)
+
+    def refill(self, key: WarmPoolKey) -> None:
+        missing = self.targets[key] - len(self.ready[key]) - self.provisioning[key]
+        for _ in range(max(missing, 0)):
+            self.provisioning[key] += 1
+            self.spawn(self.provision(key=key))
+        self.update_gauges(key=key)
+
+    async def provision(self, key: WarmPoolKey) -> None:
+        assert self.service is not None
+        gcp_region, deployment = key
+        instance_name = f"{self.name_prefix}-{uuid.uuid4().hex[:16]}"
+        try:
+            instance, gcp_zone = await self.service.provision_instance_in_region(
+                instance_name=instance_name,
+                deployment=deployment,
+                gcp_region=gcp_region,
+                labels={"warm-pool": self.name_prefix},
+            )
+            self.ready[key].append(
+                GcpWarmInstance(
+                    name=instance_name,
+                    zone=gcp_zone,
+                    ip=self.service.get_external_ip(instance),
+                    instance=instance,
+                )
+            )
+        except Exception as exception:
+            if self.logger:
+                self.logger.warning(
+                    f"Failed to provision warm pool instance {instance_name}: {exception}"
+                )
+        finally:
+            self.provisioning[key] -= 1
+            self.update_gauges(key=key)
+
+    async def delete(self, key: WarmPoolKey, warm_instance: GcpWarmInstance) -> None:
+        assert self.service is not None
+        success, message = await self.service.delete_instance(
+            instance_name=warm_instance.name,
+            zone=warm_instance.zone,
+        )
+        if not success and self.logger:
+            self.logger.warning(
+                f"Failed to delete warm pool instance {warm_instance.name}: {message}"
+            )
+
+    def spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self.provision_tasks.add(task)
+        task.add_done_callback(self.provision_tasks.discard)
+
+    def update_gauges(self, key: WarmPoolKey) -> None:
+        gcp_region, deployment = key
+        WARM_POOL_READY.labels(region=gcp_region, deployment=deployment).set(
+            len(self.ready[key])
+        )
+        WARM_POOL_PROVISIONING.labels(region=gcp_region, deployment=deployment).set(
+            self.provisioning[key]
+        )
+
+
+__all__ = [
+    "GcpWarmInstance",
+    "GcpWarmPool",
+]
@@ -0,0 +1,168 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - google-api-core
+# - prometheus-client
+
+import random
+import time
+
+from logging import Logger
+from typing import Dict, List, Optional
+
+from google.api_core import exceptions as core_exceptions
+from prometheus_client import Counter, Gauge, Histogram
+
+ZONE_INSERTS = Counter(
+    name="session_dsm_gcp_zone_inserts",
+    documentation="number of instance provisioning attempts by zone and result (success, capacity or failure)",
+    labelnames=["zone", "result"],
+)
+ZONE_LATENCY = Gauge(
+    name="session_dsm_gcp_zone_latency_seconds",
+    documentation="EWMA of the time taken to provision a running instance in the zone",
+    labelnames=["zone"],
+    multiprocess_mode="liveall",
+)
+ZONE_SUCCESS_RATE = Gauge(
+    name="session_dsm_gcp_zone_success_rate",
+    documentation="EWMA of the instance provisioning success rate in the zone",
+    labelnames=["zone"],
+    multiprocess_mode="liveall",
+)
+ZONE_BLOCKED = Gauge(
+    name="session_dsm_gcp_zone_blocked",
+    documentation="1 while the zone is skipped after a stockout or quota error",
+    labelnames=["zone"],
+    multiprocess_mode="livemax",
+)
+ZONE_FAILOVER_SECONDS = Histogram(
+    name="session_dsm_gcp_zone_failover_seconds",
+    documentation="time spent on failed zones before an instance was provisioned in another zone",
+    labelnames=["region"],
+    buckets=(1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+
+class GcpZoneStats:
+    __slots__ = ("latency", "success_rate", "blocked_until")
+
+    def __init__(self) -> None:
+        self.latency: Optional[float] = None
+        self.success_rate: float = 1.0
+        self.blocked_until: float = 0.0
+
+
+class GcpZoneScheduler:
+    """Orders the zones of a region by how well they have been provisioning.
+
+    Every zone keeps an EWMA of its provisioning latency and success rate, and
+    zones are ranked by expected latency (`latency / success_rate`). Zones that
+    report a stockout or quota error are moved to the back of the ranking for
+    `block_duration` seconds; they are only tried when no other zone is left.
+    Zones without any history are tried first, in random order.
+    """
+
+    CAPACITY_ERROR_CODES = (
+        "ZONE_RESOURCE_POOL_EXHAUSTED",
+        "ZONE_RESOURCE_POOL_EXHAUSTED_WITH_DETAILS",
+        "QUOTA_EXCEEDED",
+        "RESOURCE_NOT_AVAILABLE",
+    )
+
+    DEFAULT_ALPHA: float = 0.2
+    DEFAULT_BLOCK_DURATION: float = 300.0
+    MIN_SUCCESS_RATE: float = 0.05
+
+    def __init__(
+        self,
+        alpha: Optional[float] = None,
+        block_duration: Optional[float] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if alpha is None:
+            alpha = self.DEFAULT_ALPHA
+        if block_duration is None:
+            block_duration = self.DEFAULT_BLOCK_DURATION
+
+        self.alpha = alpha
+        self.block_duration = block_duration
+        self.logger = logger
+
+        self.stats: Dict[str, GcpZoneStats] = {}
+
+    def get_stats(self, zone: str) -> GcpZoneStats:
+        stats = self.stats.get(zone)
+        if stats is None:
+            stats = self.stats[zone] = GcpZoneStats()
+        return stats
+
+    def rank(self, zones: List[str]) -> List[str]:
+        now = time.monotonic()
+        # shuffled first so that zones with equal scores share the load
+        zones = random.sample(zones, len(zones))
+        return sorted(zones, key=lambda zone: self.get_score(zone, now))
+
+    def get_score(self, zone: str, now: float):
+        stats = self.get_stats(zone)
+        if stats.blocked_until > now:
+            return 1, stats.blocked_until
+        if stats.blocked_until:
+            stats.blocked_until = 0.0
+            self.update_gauges(zone=zone, stats=stats)
+        if stats.latency is None:
+            return 0, 0.0
+        return 0, stats.latency / max(stats.success_rate, self.MIN_SUCCESS_RATE)
+
+    def is_blocked(self, zone: str) -> bool:
+        return self.get_stats(zone).blocked_until > time.monotonic()
+
+    def is_available(self, zones: List[str]) -> bool:
+        return any(not self.is_blocked(zone) for zone in zones)
+
+    def record_success(self, zone: str, latency: float) -> None:
+        stats = self.get_stats(zone)
+        stats.latency = (
+            latency
+            if stats.latency is None
+            else stats.latency + self.alpha * (latency - stats.latency)
+        )
+        stats.success_rate += self.alpha * (1.0 - stats.success_rate)
+        stats.blocked_until = 0.0
+        ZONE_INSERTS.labels(zone=zone, result="success").inc()
+        self.update_gauges(zone=zone, stats=stats)
+
+    def record_failure(self, zone: str, exception: BaseException) -> None:
+        stats = self.get_stats(zone)
+        stats.success_rate -= self.alpha * stats.success_rate
+        if self.is_capacity_error(exception):
+            stats.blocked_until = time.monotonic() + self.block_duration
+            ZONE_INSERTS.labels(zone=zone, result="capacity").inc()
+            if self.logger:
+                self.logger.warning(
+                    f"Skipping zone {zone} for {self.block_duration}s: {exception}"
+                )
+        else:
+            ZONE_INSERTS.labels(zone=zone, result="failure").inc()
+        self.update_gauges(zone=zone, stats=stats)
+
+    @classmethod
+    def is_capacity_error(cls, exception: BaseException) -> bool:
+        if isinstance(exception, core_exceptions.ResourceExhausted):
+            return True
+        text = f"{getattr(exception, 'error_code', '')} {exception}"
+        return any(code in text for code in cls.CAPACITY_ERROR_CODES)
+
+    @staticmethod
+    def update_gauges(zone: str, stats: GcpZoneStats) -> None:
+        if stats.latency is not None:
+            ZONE_LATENCY.labels(zone=zone).set(stats.latency)
+        ZONE_SUCCESS_RATE.labels(zone=zone).set(stats.success_rate)
+        ZONE_BLOCKED.labels(zone=zone).set(1 if stats.blocked_until else 0)
+
+
+__all__ = [
+    "GcpZoneScheduler",
+]
@@ -0,0 +1,236 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - prometheus-client
+
+import asyncio
+import time
+
+from logging import Logger
+from typing import Any, Dict, Optional, Set, Tuple
+
+from grpc import ServicerContext, StatusCode
+from prometheus_client import Counter
+
+from app.services.deadline import CURRENT_DEADLINE, Deadline
+from session_dsm_pb2 import (
+    RequestCreateGameSession,
+    RequestTerminateGameSession,
+    ResponseCreateGameSession,
+    ResponseTerminateGameSession,
+)
+from session_dsm_pb2_grpc import SessionDsmServicer
+
+IDEMPOTENCY_REQUESTS = Counter(
+    name="session_dsm_idempotency_requests",
+    documentation="number of CreateGameSession calls by idempotency cache result (miss, joined or hit)",
+    labelnames=["result"],
+)
+
+IdempotencyKey = Tuple[str, str]
+
+
+class CallAborted(Exception):
+    def __init__(
+        self, code: StatusCode, details: str, trailing_metadata: tuple = ()
+    ) -> None:
+        super().__init__(f"{code}: {details}")
+        self.code = code
+        self.details = details
+        self.trailing_metadata = trailing_metadata
+
+
+class RecordingServicerContext:
+    """Stands in for the caller's context while the wrapped servicer runs.
+
+    `abort`, `set_code` and `set_details` are recorded instead of being sent,
+    so the outcome can be replayed on the context of every caller that joined
+    the call. Everything else is delegated to the context of the first caller.
+    """
+
+    def __init__(self, context: ServicerContext) -> None:
+        self.context = context
+        self.recorded_code: Optional[StatusCode] = None
+        self.recorded_details: Optional[str] = None
+
+    async def abort(
+        self, code: StatusCode, details: str = "", trailing_metadata: tuple = ()
+    ):
+        self.recorded_code = code
+        self.recorded_details = details
+        raise CallAborted(
+            code=code, details=details, trailing_metadata=trailing_metadata
+        )
+
+    def set_code(self, code: StatusCode) -> None:
+        self.recorded_code = code
+
+    def set_details(self, details: str) -> None:
+        self.recorded_details = details
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.context, name)
+
+
+class IdempotencyEntry:
+    __slots__ = ("future", "deadline", "expires_at")
+
+    def __init__(self, future: asyncio.Future, deadline: Deadline) -> None:
+        self.future = future
+        self.deadline = deadline
+        self.expires_at: Optional[float] = None
+
+
+class IdempotentSessionDsmService(SessionDsmServicer):
+    """Deduplicates `CreateGameSession` calls by `(namespace, session_id)`.
+
+    The Session service retries `CreateGameSession` on timeouts. The first call
+    runs the wrapped servicer in a task that outlives the caller, retries made
+    while it is in flight join it, and retries made afterwards get the cached
+    response for `ttl` seconds without calling the cloud provider again.
+
+    The call runs until the latest deadline of the callers that joined it, so a
+    retry with a fresh deadline gives the call more time instead of starting
+    over.
+
+    Failed calls are not cached: their status code and details are replayed to
+    every caller that joined them and the next retry runs the servicer again.
+    `TerminateGameSession` drops the cached entry of the session.
+    """
+
+    DEFAULT_TTL: float = 600.0
+
+    def __init__(
+        self,
+        service: SessionDsmServicer,
+        ttl: Optional[float] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if ttl is None:
+            ttl = self.DEFAULT_TTL
+
+        self.service = service
+        self.full_name: str = getattr(service, "full_name", "")
+        self.ttl = ttl
+        self.logger = logger
+
+        self.entries: Dict[IdempotencyKey, IdempotencyEntry] = {}
+        self.tasks: Set[asyncio.Task] = set()
+        self.next_sweep_at: float = time.monotonic() + ttl
+
+    async def CreateGameSession(
+        self, request: RequestCreateGameSession, context: ServicerContext
+    ) -> ResponseCreateGameSession:
+        key = (request.namespace, request.session_id)
+        self.sweep()
+
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires_at is not None:
+            if entry.expires_at <= time.monotonic():
+                del self.entries[key]
+                entry = None
+
+        if entry is None:
+            IDEMPOTENCY_REQUESTS.labels(result="miss").inc()
+            entry = IdempotencyEntry(
+                future=asyncio.get_running_loop().create_future(),
+                deadline=Deadline.from_context(context),
+            )
+            self.entries[key] = entry
+            task = asyncio.create_task(self.create(key, entry, request, context))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        elif entry.future.done():
+            IDEMPOTENCY_REQUESTS.labels(result="hit").inc()
+        else:
+            IDEMPOTENCY_REQUESTS.labels(result="joined").inc()
+            entry.deadline.extend(context)
+            if self.logger:
+                self.logger.info(
+                    f"CreateGameSession for {request.namespace}/{request.session_id} "
+                    f"is already in progress, joining it"
+                )
+
+        # cancelling one caller must not cancel the call the others joined
+        try:
+            response, code, details = await asyncio.shield(entry.future)
+        except CallAborted as aborted:
+            await context.abort(
+                code=aborted.code,
+                details=aborted.details,
+                trailing_metadata=aborted.trailing_metadata,
+            )
+            raise
+
+        if code is not None:
+            context.set_code(code)
+        if details is not None:
+            context.set_details(details)
+
+        result = ResponseCreateGameSession()
+        result.CopyFrom(response)
+        return result
+
+    async def create(
+        self,
+        key: IdempotencyKey,
+        entry: IdempotencyEntry,
+        request: RequestCreateGameSession,
+        context: ServicerContext,
+    ) -> None:
+        CURRENT_DEADLINE.set(entry.deadline)
+        recording_context = RecordingServicerContext(context)
+        try:
+            response = await self.service.CreateGameSession(request, recording_context)
+        except asyncio.CancelledError:
+            self.invalidate(key, entry)
+            entry.future.cancel()
+            raise
+        except Exception as exception:
+            self.invalidate(key, entry)
+            entry.future.set_exception(exception)
+            # mark it as retrieved, the callers may all have gone already
+            entry.future.exception()
+            return
+
+        if recording_context.recorded_code not in (None, StatusCode.OK):
+            self.invalidate(key, entry)
+        else:
+            entry.expires_at = time.monotonic() + self.ttl
+        entry.future.set_result(
+            (
+                response,
+                recording_context.recorded_code,
+                recording_context.recorded_details,
+            )
+        )
+
+    async def TerminateGameSession(
+        self, request: RequestTerminateGameSession, context: ServicerContext
+    ) -> ResponseTerminateGameSession:
+        self.entries.pop((request.namespace, request.session_id), None)
+        return await self.service.TerminateGameSession(request, context)
+
+    def invalidate(self, key: IdempotencyKey, entry: IdempotencyEntry) -> None:
+        if self.entries.get(key) is entry:
+            del self.entries[key]
+
+    def sweep(self) -> None:
+        now = time.monotonic()
+        if now < self.next_sweep_at:
+            return
+        self.next_sweep_at = now + self.ttl
+        expired = [
+            key
+            for key, entry in self.entries.items()
+            if entry.expires_at is not None and entry.expires_at <= now
+        ]
+        for key in expired:
+            del self.entries[key]
+
+
+__all__ = [
+    "IdempotentSessionDsmService",
+]
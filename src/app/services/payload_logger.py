@@ -0,0 +1,93 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+import json
+import logging
+import zlib
+
+from logging import Logger
+from typing import Any, Optional
+
+from google.protobuf import text_format
+from google.protobuf.json_format import MessageToDict
+
+
+class LazyPayload:
+    """Serializes the payload only when the log record is actually formatted."""
+
+    __slots__ = ("payload", "payload_format")
+
+    def __init__(self, payload: Any, payload_format: str) -> None:
+        self.payload = payload
+        self.payload_format = payload_format
+
+    def __str__(self) -> str:
+        if self.payload_format == PayloadLogger.FORMAT_TEXT:
+            return text_format.MessageToString(self.payload, as_one_line=True)
+        payload_dict = MessageToDict(self.payload, preserving_proto_field_name=True)
+        return json.dumps(payload_dict)
+
+
+class PayloadLogger:
+    """Logs SessionDsm request and response payloads.
+
+    Nothing is serialized unless `level` is enabled on the logger and the
+    payload is sampled. With `sample_rate` N only 1 in N game sessions are
+    logged; the decision is made on the session ID so the request and response
+    of a session are either both logged or both skipped.
+
+    `payload_format` is either `json` (same output as `MessageToDict`) or the
+    cheaper protobuf `text` format.
+    """
+
+    FORMAT_JSON: str = "json"
+    FORMAT_TEXT: str = "text"
+
+    DEFAULT_LEVEL: int = logging.INFO
+    DEFAULT_SAMPLE_RATE: int = 1
+    DEFAULT_PAYLOAD_FORMAT: str = FORMAT_JSON
+
+    def __init__(
+        self,
+        logger: Optional[Logger] = None,
+        level: Optional[int] = None,
+        sample_rate: Optional[int] = None,
+        payload_format: Optional[str] = None,
+    ) -> None:
+        if level is None:
+            level = self.DEFAULT_LEVEL
+        if sample_rate is None:
+            sample_rate = self.DEFAULT_SAMPLE_RATE
+        if payload_format is None:
+            payload_format = self.DEFAULT_PAYLOAD_FORMAT
+        payload_format = payload_format.lower()
+        if payload_format not in (self.FORMAT_JSON, self.FORMAT_TEXT):
+            raise ValueError(f"unknown payload format: {payload_format}")
+
+        self.logger = logger
+        self.level = level
+        self.sample_rate = max(sample_rate, 1)
+        self.payload_format = payload_format
+
+        self.count: int = 0
+
+    # noinspection PyShadowingBuiltins
+    def log(self, format: str, payload: Any) -> None:
+        if self.logger is None or not self.logger.isEnabledFor(self.level):
+            return
+        if self.sample_rate > 1 and not self.is_sampled(payload):
+            return
+        self.logger.log(self.level, format, LazyPayload(payload, self.payload_format))
+
+    def is_sampled(self, payload: Any) -> bool:
+        session_id = getattr(payload, "session_id", None)
+        if session_id:
+            return zlib.crc32(session_id.encode()) % self.sample_rate == 0
+        self.count += 1
+        return self.count % self.sample_rate == 0
+
+
+__all__ = [
+    "PayloadLogger",
+]
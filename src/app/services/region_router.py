@@ -0,0 +1,198 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+# requires:
+# - prometheus-client
+
+import asyncio
+
+from logging import Logger
+from typing import (
+    Awaitable,
+    Callable,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from prometheus_client import Counter
+
+from app.services.deadline import spawn_detached
+
+REGION_ATTEMPTS = Counter(
+    name="session_dsm_region_attempts",
+    documentation="number of game session creation attempts by provider, region and result (success, failure, skipped or lost)",
+    labelnames=["provider", "region", "result"],
+)
+
+T = TypeVar("T")
+
+
+class NoRegionAvailableError(ValueError):
+    pass
+
+
+class RegionRouter(Generic[T]):
+    """Creates a game session in the first region of `requested_region` that works.
+
+    `requested_region` is ordered by the players' preference. Regions that the
+    provider does not support are skipped, and so are regions `is_healthy`
+    reports as unhealthy, unless no healthy region is left. The remaining
+    regions are tried one after another until a creation succeeds.
+
+    With `race` enabled the two most preferred regions are tried at the same
+    time: the first success wins, the other attempt is cancelled, and its
+    result is released with `cleanup` if it finished anyway. Only providers
+    whose creation is safe to cancel should race.
+    """
+
+    DEFAULT_RACE: bool = False
+
+    def __init__(
+        self,
+        provider: str,
+        is_supported: Optional[Callable[[str], bool]] = None,
+        is_healthy: Optional[Callable[[str], bool]] = None,
+        race: Optional[bool] = None,
+        logger: Optional[Logger] = None,
+    ) -> None:
+        if race is None:
+            race = self.DEFAULT_RACE
+
+        self.provider = provider
+        self.is_supported = is_supported
+        self.is_healthy = is_healthy
+        self.race = race
+        self.logger = logger
+
+        self.tasks: Set[asyncio.Task] = set()
+
+    def get_candidates(self, requested_regions: Sequence[str]) -> List[str]:
+        regions = list(dict.fromkeys(r for r in requested_regions if r))
+        supported = [
+            r for r in regions if self.is_supported is None or self.is_supported(r)
+        ]
+        if not supported:
+            raise NoRegionAvailableError(
+                f"Unknown AWS Region: {', '.join(regions)}"
+                if regions
+                else "Please provide requested region."
+            )
+
+        healthy = [
+            r for r in supported if self.is_healthy is None or self.is_healthy(r)
+        ]
+        for region in supported:
+            if region not in healthy:
+                REGION_ATTEMPTS.labels(
+                    provider=self.provider, region=region, result="skipped"
+                ).inc()
+
+        # better to try an unhealthy region than to fail outright
+        return healthy if healthy else supported
+
+    async def route(
+        self,
+        requested_regions: Sequence[str],
+        create: Callable[[str], Awaitable[T]],
+        cleanup: Optional[Callable[[str, T], Awaitable[None]]] = None,
+    ) -> Tuple[str, T]:
+        candidates = self.get_candidates(requested_regions)
+
+        exception: Optional[Exception] = None
+        if self.race and len(candidates) > 1:
+            try:
+                return await self.route_race(candidates[:2], create, cleanup)
+            except Exception as e:
+                exception = e
+            candidates = candidates[2:]
+
+        for region in candidates:
+            try:
+                result = await create(region)
+            except Exception as e:
+                exception = e
+                self.record(region, "failure", e)
+                continue
+            self.record(region, "success")
+            return region, result
+
+        assert exception is not None
+        raise exception
+
+    async def route_race(
+        self,
+        regions: List[str],
+        create: Callable[[str], Awaitable[T]],
+        cleanup: Optional[Callable[[str, T], Awaitable[None]]],
+    ) -> Tuple[str, T]:
+        pending = {asyncio.ensure_future(create(region)): region for region in regions}
+        exception: Optional[Exception] = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending.keys(), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    region = pending.pop(task)
+                    if task.exception() is None:
+                        self.record(region, "success")
+                        return region, task.result()
+                    exception = task.exception()
+                    self.record(region, "failure", exception)
+        finally:
+            for task, region in pending.items():
+                task.cancel()
+                self.spawn(self.release(task, region, cleanup))
+
+        assert exception is not None
+        raise exception
+
+    async def release(
+        self,
+        task: "asyncio.Future[T]",
+        region: str,
+        cleanup: Optional[Callable[[str, T], Awaitable[None]]],
+    ) -> None:
+        REGION_ATTEMPTS.labels(
+            provider=self.provider, region=region, result="lost"
+        ).inc()
+        try:
+            result = await task
+        except BaseException:
+            return
+        if cleanup is not None:
+            try:
+                await cleanup(region, result)
+            except Exception as exception:
+                if self.logger:
+                    self.logger.warning(
+                        f"Failed to release the game session created in {region}: {exception}"
+                    )
+
+    def record(
+        self, region: str, result: str, exception: Optional[BaseException] = None
+    ) -> None:
+        REGION_ATTEMPTS.labels(
+            provider=self.provider, region=region, result=result
+        ).inc()
+        if exception is not None and self.logger:
+            self.logger.warning(
+                f"Failed to create game session in {region}: {exception}"
+            )
+
+    def spawn(self, coroutine) -> None:
+        task = spawn_detached(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+__all__ = [
+    "NoRegionAvailableError",
+    "RegionRouter",
+]
@@ -0,0 +1,169 @@
+# Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
+# This is licensed software from AccelByte Inc, for limitations
+# and restrictions contact your company contract manager.
+
+import asyncio
+import time
+
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open."""
+
+    def __init__(self, provider: str, scope: str, retry_after: float) -> None:
+        super().__init__(
+            f"{provider} backend for {scope} is unavailable, retry in {retry_after:.1f}s"
+        )
+        self.provider = provider
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def get_retry_pushback(exception: CircuitOpenError) -> Tuple[Tuple[str, str], ...]:
+    """Returns the trailing metadata that tells gRPC clients when to retry."""
+    return (("grpc-retry-pushback-ms", str(max(0, int(exception.retry_after * 1000)))),)
+
+
+class CircuitBreaker:
+    """Stops calling a backend after `failure_threshold` failures in a row.
+
+    The circuit stays open for `reset_timeout` seconds, after which one probe
+    call is let through (half-open). The circuit closes when the probe succeeds
+    and opens again when it fails.
+    """
+
+    CLOSED: int = 0
+    HALF_OPEN: int = 1
+    OPEN: int = 2
+
+    DEFAULT_FAILURE_THRESHOLD: int = 5
+    DEFAULT_RESET_TIMEOUT: float = 30.0
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+    ) -> None:
+        if failure_threshold is None:
+            failure_threshold = self.DEFAULT_FAILURE_THRESHOLD
+        if reset_timeout is None:
+            reset_timeout = self.DEFAULT_RESET_TIMEOUT
+
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+
+        self.state: int = self.CLOSED
+        self.failures: int = 0
+        self.opened_until: float = 0.0
+        self.probing: bool = False
+
+    def get_state(self) -> int:
+        if self.state == self.OPEN and time.monotonic() >= self.opened_until:
+            self.state = self.HALF_OPEN
+        return self.state
+
+    def get_retry_after(self) -> Optional[float]:
+        """Returns how long to wait before calling the backend, None if it can be called now."""
+        state = self.get_state()
+        if state == self.OPEN:
+            return self.opened_until - time.monotonic()
+        if state == self.HALF_OPEN and self.probing:
+            # the outcome of the probe is not known yet
+            return min(1.0, self.reset_timeout)
+        return None
+
+    def begin(self) -> None:
+        if self.get_state() == self.HALF_OPEN:
+            self.probing = True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_until = time.monotonic() + self.reset_timeout
+        self.probing = False
+
+    def record_unknown(self) -> None:
+        # the call was cancelled, let the next call probe instead
+        self.probing = False
+
+
+class AimdLimiter:
+    """Limits concurrent calls with additive increase, multiplicative decrease.
+
+    Every successful call raises the limit by `1 / limit`, so it grows by about
+    one per round of calls, up to `max_limit`. Every failed call multiplies it
+    by `backoff`, down to `min_limit`. Callers over the limit wait in FIFO order.
+    """
+
+    DEFAULT_MIN_LIMIT: int = 1
+    DEFAULT_BACKOFF: float = 0.5
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: Optional[int] = None,
+        backoff: Optional[float] = None,
+    ) -> None:
+        if min_limit is None:
+            min_limit = self.DEFAULT_MIN_LIMIT
+        if backoff is None:
+            backoff = self.DEFAULT_BACKOFF
+
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.backoff = backoff
+
+        self.limit: float = float(self.max_limit)
+        self.in_flight: int = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        if not self.waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just before the cancellation
+                self.release(success=None)
+            else:
+                try:
+                    self.waiters.remove(future)
+                except ValueError:
+                    pass
+            raise
+
+    def release(self, success: Optional[bool]) -> None:
+        self.in_flight -= 1
+        if success is True:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        elif success is False:
+            self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        self.wake()
+
+    def wake(self) -> None:
+        while self.waiters and self.in_flight < int(self.limit):
+            future = self.waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+
+__all__ = [
+    "AimdLimiter",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "get_retry_pushback",
+]
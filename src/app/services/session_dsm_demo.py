@@ -1,12 +1,10 @@
 # Copyright (c) 2024 AccelByte Inc. All Rights Reserved.
 # This is licensed software from AccelByte Inc, for limitations
 # and restrictions contact your company contract manager.
-import json
 
 from logging import Logger
-from typing import Any, Optional
+from typing import Optional
 
-from google.protobuf.json_format import MessageToDict
 from grpc import ServicerContext, StatusCode
 
 from session_dsm_pb2 import (
@@ -18,20 +16,32 @@ from session_dsm_pb2 import (
 )
 from session_dsm_pb2_grpc import SessionDsmServicer
 
+from app.services.payload_logger import PayloadLogger
+from app.services.region_router import NoRegionAvailableError, RegionRouter
+
 
 class AsyncSessionDsmDemoService(SessionDsmServicer):
     full_name: str = DESCRIPTOR.services_by_name["SessionDsm"].full_name
 
     def __init__(
         self,
+        payload_logger: Optional[PayloadLogger] = None,
         logger: Optional[Logger] = None,
     ) -> None:
         self.logger = logger
+        self.payload_logger = (
+            payload_logger if payload_logger is not None else PayloadLogger(logger)
+        )
+        self.region_router: RegionRouter[None] = RegionRouter(
+            provider="DEMO", logger=logger
+        )
 
     async def CreateGameSession(
         self, request: RequestCreateGameSession, context: ServicerContext
     ) -> ResponseCreateGameSession:
-        self.log_payload(f"{self.CreateGameSession.__name__} request: %s", request)
+        self.payload_logger.log(
+            f"{self.CreateGameSession.__name__} request: %s", request
+        )
 
         response = ResponseCreateGameSession()
 
@@ -40,7 +50,14 @@ class AsyncSessionDsmDemoService(SessionDsmServicer):
             details: str = "Please provide requested region."
             await context.abort(code=code, details=details)
 
-        selected_region = request.requested_region[0]
+        try:
+            selected_region = self.region_router.get_candidates(
+                request.requested_region
+            )[0]
+        except NoRegionAvailableError as exception:
+            code: StatusCode = StatusCode.INVALID_ARGUMENT
+            details: str = str(exception)
+            await context.abort(code=code, details=details)
 
         response.client_version = request.client_version
         response.created_region = selected_region
@@ -57,14 +74,18 @@ class AsyncSessionDsmDemoService(SessionDsmServicer):
         response.port = 8080
         response.server_id = f"demo-local-{request.session_id}"
 
-        self.log_payload(f"{self.CreateGameSession.__name__} response: %s", response)
+        self.payload_logger.log(
+            f"{self.CreateGameSession.__name__} response: %s", response
+        )
 
         return response
 
     async def TerminateGameSession(
         self, request: RequestTerminateGameSession, context: ServicerContext
     ) -> ResponseTerminateGameSession:
-        self.log_payload(f"{self.TerminateGameSession.__name__} request: %s", request)
+        self.payload_logger.log(
+            f"{self.TerminateGameSession.__name__} request: %s", request
+        )
 
         response = ResponseTerminateGameSession()
 
@@ -73,20 +94,12 @@ class AsyncSessionDsmDemoService(SessionDsmServicer):
         response.session_id = request.session_id
         response.success = True
 
-        self.log_payload(f"{self.TerminateGameSession.__name__} response: %s", response)
+        self.payload_logger.log(
+            f"{self.TerminateGameSession.__name__} response: %s", response
+        )
 
         return response
 
-    # noinspection PyShadowingBuiltins
-    def log_payload(self, format: str, payload: Any) -> None:
-        if not self.logger:
-            return
-
-        payload_dict = MessageToDict(payload, preserving_proto_field_name=True)
-        payload_json = json.dumps(payload_dict)
-
-        self.logger.info(format % payload_json)
-
 
 __all__ = [
     "AsyncSessionDsmDemoService",
@@ -2,14 +2,16 @@
 # This is licensed software from AccelByte Inc, for limitations
 # and restrictions contact your company contract manager.
 
-import json
+import asyncio
 
+from collections import OrderedDict
 from logging import Logger
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import boto3
 
-from google.protobuf.json_format import MessageToDict
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from grpc import ServicerContext, StatusCode
 
 from session_dsm_pb2 import (
@@ -21,24 +23,267 @@ from session_dsm_pb2 import (
 )
 from session_dsm_pb2_grpc import SessionDsmServicer
 
+from app.services.deadline import (
+    DeadlineExceededError,
+    check_deadline,
+    set_deadline,
+    spawn_detached,
+)
+from app.services.executor import ProviderExecutor
+from app.services.gamelift_placement import GameLiftPlacementTracker
+from app.services.gamelift_reaper import GameLiftTerminationReaper
+from app.services.payload_logger import PayloadLogger
+from app.services.region_router import NoRegionAvailableError, RegionRouter
+from app.services.resilience import CircuitOpenError, get_retry_pushback
+
 
 class AsyncSessionDsmGameLiftService(SessionDsmServicer):
     full_name: str = DESCRIPTOR.services_by_name["SessionDsm"].full_name
 
+    DEFAULT_PLACEMENT_TIMEOUT: float = 60.0
+    DEFAULT_MAX_ASSIGNED_GAME_SESSIONS: int = 10000
+
+    # error codes that mean GameLift itself is struggling, not that the request is wrong
+    BACKEND_FAILURE_CODES = (
+        "InternalServiceException",
+        "ServiceUnavailableException",
+        "ThrottlingException",
+    )
+
     def __init__(
-        self, region_name: Optional[str] = None, logger: Optional[Logger] = None
+        self,
+        region_name: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        circuit_failure_threshold: Optional[int] = None,
+        circuit_reset_timeout: Optional[float] = None,
+        placement_queue: Optional[str] = None,
+        placement_poll_interval: Optional[float] = None,
+        placement_timeout: Optional[float] = None,
+        termination_mode: Optional[str] = None,
+        reaper_batch_size: Optional[int] = None,
+        reaper_max_attempts: Optional[int] = None,
+        max_assigned_game_sessions: Optional[int] = None,
+        gamelift_client: Optional[Any] = None,
+        payload_logger: Optional[PayloadLogger] = None,
+        logger: Optional[Logger] = None,
     ) -> None:
-        client_kwargs = {}
-        if region_name:
-            client_kwargs["region_name"] = region_name
-
-        self.gamelift_client = boto3.client("gamelift", **client_kwargs)
+        self.executor = ProviderExecutor(
+            provider="GAMELIFT",
+            max_workers=max_workers,
+            max_concurrency=max_concurrency,
+            failure_threshold=circuit_failure_threshold,
+            reset_timeout=circuit_reset_timeout,
+            is_failure=self.is_backend_failure,
+        )
+
+        if gamelift_client is None:
+            client_kwargs = {
+                # one pooled connection per executor worker
+                "config": Config(max_pool_connections=self.executor.max_workers),
+            }
+            if region_name:
+                client_kwargs["region_name"] = region_name
+            gamelift_client = boto3.client("gamelift", **client_kwargs)
+
+        self.gamelift_client = gamelift_client
         self.logger = logger
+        self.payload_logger = (
+            payload_logger if payload_logger is not None else PayloadLogger(logger)
+        )
+        # the IdempotencyToken is the session ID, so regions must not be raced
+        self.region_router: RegionRouter[Dict[str, Any]] = RegionRouter(
+            provider="GAMELIFT",
+            is_healthy=self.executor.is_available,
+            race=False,
+            logger=logger,
+        )
+
+        # with a queue, sessions are placed by GameLift instead of created directly
+        self.placement_queue = placement_queue
+        self.placement_timeout = (
+            placement_timeout
+            if placement_timeout is not None
+            else self.DEFAULT_PLACEMENT_TIMEOUT
+        )
+        self.placement_tracker = GameLiftPlacementTracker(
+            gamelift_client=self.gamelift_client,
+            executor=self.executor,
+            poll_interval=placement_poll_interval,
+            logger=logger,
+        )
+
+        # game sessions are terminated in the background, after the RPC returns
+        self.termination_reaper = GameLiftTerminationReaper(
+            gamelift_client=self.gamelift_client,
+            executor=self.executor,
+            termination_mode=termination_mode,
+            batch_size=reaper_batch_size,
+            max_attempts=reaper_max_attempts,
+            logger=logger,
+        )
+        # game sessions created by this process, by (namespace, session ID);
+        # other sessions are resolved from their placement (queue mode only)
+        self.max_assigned_game_sessions = (
+            max_assigned_game_sessions
+            if max_assigned_game_sessions is not None
+            else self.DEFAULT_MAX_ASSIGNED_GAME_SESSIONS
+        )
+        self.assigned_game_sessions: OrderedDict[Tuple[str, str], Tuple[str, str]] = (
+            OrderedDict()
+        )
+        self.background_tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def is_backend_failure(cls, exception: BaseException) -> bool:
+        if isinstance(exception, ClientError):
+            error = exception.response.get("Error", {})
+            status = exception.response.get("ResponseMetadata", {}).get(
+                "HTTPStatusCode", 0
+            )
+            return error.get("Code") in cls.BACKEND_FAILURE_CODES or status >= 500
+        # connection errors and timeouts
+        return isinstance(exception, (BotoCoreError, OSError))
+
+    async def create_game_session(
+        self, request: RequestCreateGameSession, location: str
+    ) -> Dict[str, Any]:
+        return await self.executor.run(
+            location,
+            self.gamelift_client.create_game_session,
+            AliasId=request.deployment,
+            GameSessionData=request.session_data,
+            IdempotencyToken=request.session_id,
+            MaximumPlayerSessionCount=request.maximum_player,
+            Location=location,
+        )
+
+    async def place_game_session(
+        self, request: RequestCreateGameSession, regions: List[str]
+    ) -> Dict[str, Any]:
+        queue_name = self.placement_queue.replace("{deployment}", request.deployment)
+        try:
+            placement = await self.placement_tracker.place(
+                timeout=self.placement_timeout,
+                PlacementId=request.session_id,
+                GameSessionQueueName=queue_name,
+                GameSessionData=request.session_data,
+                MaximumPlayerSessionCount=request.maximum_player,
+                # queues favour the locations with the lowest reported latency,
+                # so the preference order of the requested regions is encoded as latency
+                PlayerLatencies=[
+                    {
+                        "PlayerId": request.session_id,
+                        "RegionIdentifier": region,
+                        "LatencyInMilliseconds": float(10 * (index + 1)),
+                    }
+                    for index, region in enumerate(regions)
+                ],
+            )
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # nobody waits for the placement anymore, but it may still be fulfilled
+            self.spawn(
+                self.abandon_placement(
+                    placement_id=request.session_id, queue_name=queue_name
+                )
+            )
+            check_deadline(verbose_name="StartGameSessionPlacement")
+            raise
+
+        # same shape as the create_game_session response
+        game_session_arn = placement.get("GameSessionArn", "")
+        arn_parts = game_session_arn.split("/")
+        return {
+            "GameSession": {
+                "GameSessionId": game_session_arn,
+                "FleetId": arn_parts[1] if len(arn_parts) > 2 else "",
+                "Location": placement.get("GameSessionRegion", ""),
+                "IpAddress": placement.get("IpAddress", ""),
+                "Port": placement.get("Port", 0),
+            }
+        }
+
+    async def abandon_placement(self, placement_id: str, queue_name: str) -> None:
+        try:
+            await self.executor.run(
+                queue_name,
+                self.gamelift_client.stop_game_session_placement,
+                PlacementId=placement_id,
+            )
+        except Exception:
+            # the placement may have ended already, its status tells
+            pass
+
+        try:
+            placement = await self.placement_tracker.describe(placement_id)
+        except Exception as exception:
+            if self.logger:
+                self.logger.warning(
+                    f"Failed to describe abandoned placement {placement_id}: {exception}"
+                )
+            return
+
+        if placement.get("Status") == "FULFILLED":
+            self.termination_reaper.enqueue(
+                game_session_id=placement["GameSessionArn"],
+                location=placement.get("GameSessionRegion", ""),
+            )
+
+    def assign_game_session(
+        self, key: Tuple[str, str], game_session_id: str, location: str
+    ) -> None:
+        self.assigned_game_sessions[key] = (game_session_id, location)
+        while len(self.assigned_game_sessions) > self.max_assigned_game_sessions:
+            self.assigned_game_sessions.popitem(last=False)
+
+    async def resolve_game_session(
+        self, request: RequestTerminateGameSession
+    ) -> Tuple[Optional[Tuple[str, str]], str]:
+        """Returns the (game session ID, location) of the session and a reason.
+
+        Sessions created by another worker, or before a restart, are looked up
+        by their placement, whose ID is the session ID. Without a placement
+        queue GameLift can only look them up by fleet, which the request does
+        not carry, so they cannot be resolved and LookupError is raised.
+        """
+        game_session = self.assigned_game_sessions.pop(
+            (request.namespace, request.session_id), None
+        )
+        if game_session is not None:
+            return game_session, "termination queued"
+        if not self.placement_queue:
+            raise LookupError("unknown game session")
+
+        placement = await self.placement_tracker.describe(request.session_id)
+        status = placement.get("Status", "")
+        if status == "FULFILLED":
+            return (
+                placement["GameSessionArn"],
+                placement.get("GameSessionRegion", ""),
+            ), "termination queued"
+        if status == "PENDING":
+            self.spawn(
+                self.abandon_placement(
+                    placement_id=request.session_id,
+                    queue_name=placement.get("GameSessionQueueName", ""),
+                )
+            )
+            return None, "placement abandoned"
+        # CANCELLED, TIMED_OUT or FAILED: no game session was created
+        return None, f"placement {status.lower()}"
+
+    def spawn(self, coroutine) -> None:
+        task = spawn_detached(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
 
     async def CreateGameSession(
         self, request: RequestCreateGameSession, context: ServicerContext
     ) -> ResponseCreateGameSession:
-        self.log_payload(f"{self.CreateGameSession.__name__} request: %s", request)
+        self.payload_logger.log(
+            f"{self.CreateGameSession.__name__} request: %s", request
+        )
+        set_deadline(context)
 
         response = ResponseCreateGameSession()
 
@@ -47,24 +292,28 @@ class AsyncSessionDsmGameLiftService(SessionDsmServicer):
             details: str = "Please provide requested region."
             await context.abort(code=code, details=details)
 
-        selected_region = request.requested_region[0]
-
         try:
-            cgs_response = self.gamelift_client.create_game_sesion(
-                AliasId=request.deployment,
-                GameSessionData=request.session_data,
-                IdempotencyToken=request.session_id,
-                MaximumPlayerSessionCount=request.maximum_player,
-                Location=selected_region,
-            )
-
-            if isinstance(cgs_response, dict):
+            if self.placement_queue:
+                regions = self.region_router.get_candidates(request.requested_region)
+                selected_region = regions[0]
+                cgs_response = await self.place_game_session(
+                    request=request, regions=regions
+                )
+            else:
+                selected_region, cgs_response = await self.region_router.route(
+                    requested_regions=request.requested_region,
+                    create=lambda region: self.create_game_session(
+                        request=request, location=region
+                    ),
+                )
+
+            if not isinstance(cgs_response, dict):
                 raise TypeError("Expected response to be a dict.")
 
             if "GameSession" not in cgs_response:
                 raise ValueError("Expected 'GameSession' to be in response.")
 
-            if isinstance(cgs_response["GameSession"], dict):
+            if not isinstance(cgs_response["GameSession"], dict):
                 raise TypeError("Expected response['GameSession'] to be a dict.")
 
             response.client_version = request.client_version
@@ -82,10 +331,32 @@ class AsyncSessionDsmGameLiftService(SessionDsmServicer):
             response.port = cgs_response["GameSession"]["Port"]
             response.server_id = cgs_response["GameSession"]["GameSessionId"]
 
-            self.log_payload(
+            self.assign_game_session(
+                key=(request.namespace, request.session_id),
+                game_session_id=response.server_id,
+                location=response.created_region,
+            )
+
+            self.payload_logger.log(
                 f"{self.CreateGameSession.__name__} response: %s", response
             )
 
+        except NoRegionAvailableError as exception:
+            code: StatusCode = StatusCode.INVALID_ARGUMENT
+            details: str = str(exception)
+            await context.abort(code=code, details=details)
+        except CircuitOpenError as exception:
+            code: StatusCode = StatusCode.UNAVAILABLE
+            details: str = f"CreateGameSession Exception: {exception}"
+            await context.abort(
+                code=code,
+                details=details,
+                trailing_metadata=get_retry_pushback(exception),
+            )
+        except DeadlineExceededError as exception:
+            code: StatusCode = StatusCode.DEADLINE_EXCEEDED
+            details: str = f"CreateGameSession Exception: {exception}"
+            await context.abort(code=code, details=details)
         except Exception as exception:
             code: StatusCode = StatusCode.INTERNAL
             details: str = f"CreateGameSession Exception: {exception}"
@@ -96,29 +367,46 @@ class AsyncSessionDsmGameLiftService(SessionDsmServicer):
     async def TerminateGameSession(
         self, request: RequestTerminateGameSession, context: ServicerContext
     ) -> ResponseTerminateGameSession:
-        self.log_payload(f"{self.TerminateGameSession.__name__} request: %s", request)
+        self.payload_logger.log(
+            f"{self.TerminateGameSession.__name__} request: %s", request
+        )
+
+        success = True
+        try:
+            game_session, reason = await self.resolve_game_session(request)
+        except LookupError as exception:
+            game_session, reason, success = None, str(exception), False
+        except Exception as exception:
+            game_session, reason, success = (
+                None,
+                f"failed to resolve game session: {exception}",
+                False,
+            )
+
+        if game_session is not None:
+            game_session_id, location = game_session
+            self.termination_reaper.enqueue(
+                game_session_id=game_session_id,
+                location=location if location else request.zone,
+            )
+        elif not success and self.logger:
+            self.logger.warning(
+                f"Cannot terminate the game session of session {request.session_id}: {reason}"
+            )
 
         response = ResponseTerminateGameSession()
 
         response.namespace = request.namespace
-        response.reason = ""
+        response.reason = reason
         response.session_id = request.session_id
-        response.success = True
+        response.success = success
 
-        self.log_payload(f"{self.TerminateGameSession.__name__} response: %s", response)
+        self.payload_logger.log(
+            f"{self.TerminateGameSession.__name__} response: %s", response
+        )
 
         return response
 
-    # noinspection PyShadowingBuiltins
-    def log_payload(self, format: str, payload: Any) -> None:
-        if not self.logger:
-            return
-
-        payload_dict = MessageToDict(payload, preserving_proto_field_name=True)
-        payload_json = json.dumps(payload_dict)
-
-        self.logger.info(format % payload_json)
-
 
 __all__ = [
     "AsyncSessionDsmGameLiftService",
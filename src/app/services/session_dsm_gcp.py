@@ -2,16 +2,18 @@
 # This is licensed software from AccelByte Inc, for limitations
 # and restrictions contact your company contract manager.
 import asyncio
-import json
-import random
+import re
+import time
+import uuid
 
+from collections import OrderedDict
 from logging import Logger
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from google.api_core import exceptions as core_exceptions
 from google.api_core.extended_operation import ExtendedOperation
 from google.cloud import compute_v1
 from google.oauth2 import service_account
-from google.protobuf.json_format import MessageToDict
 from grpc import ServicerContext, StatusCode
 
 from session_dsm_pb2 import (
@@ -23,41 +25,89 @@ from session_dsm_pb2 import (
 )
 from session_dsm_pb2_grpc import SessionDsmServicer
 
+from app.services.deadline import (
+    DeadlineExceededError,
+    cap_timeout,
+    check_deadline,
+    set_deadline,
+    spawn_detached,
+)
+from app.services.executor import ProviderExecutor
+from app.services.gcp_delete_tracker import GcpDeleteTracker
+from app.services.gcp_readiness import GcpReadinessWatcher
+from app.services.gcp_warm_pool import GcpWarmInstance, GcpWarmPool
+from app.services.gcp_zone_scheduler import ZONE_FAILOVER_SECONDS, GcpZoneScheduler
+from app.services.payload_logger import PayloadLogger
+from app.services.region_router import NoRegionAvailableError, RegionRouter
+from app.services.resilience import CircuitOpenError, get_retry_pushback
+
+
+class GcpOperationError(RuntimeError):
+    def __init__(self, error_code: str, error_message: str) -> None:
+        super().__init__(f"{error_code}: {error_message}")
+        self.error_code = error_code
+        self.error_message = error_message
 
-def wait_for_extended_operation(
+
+async def wait_for_extended_operation(
     operation: ExtendedOperation,
+    executor: ProviderExecutor,
+    scope: str,
     verbose_name: str = "operation",
-    timeout: int = 300,
+    timeout: float = 300,
+    poll_interval: float = 1.0,
     logger: Optional[Logger] = None,
 ) -> Any:
     """
     Waits for the extended (long-running) operation to complete.
 
+    The operation is polled through the executor every `poll_interval` seconds,
+    so neither the event loop nor a worker thread is held while the
+    operation is still running.
+
     If the operation is successful, it will return its result.
     If the operation ends with an error, an exception will be raised.
     If there were any warnings during the execution of the operation
-    they will be printed to sys.stderr.
+    they will be logged.
 
     Args:
         operation: a long-running operation you want to wait on.
+        executor: the executor used to run the blocking polling calls.
+        scope: the executor scope (zone) the operation belongs to.
         verbose_name: (optional) a more verbose name of the operation,
             used only during error and warning reporting.
         timeout: how long (in seconds) to wait for operation to finish.
             If None, wait indefinitely.
+        poll_interval: how long (in seconds) to wait between polls.
         logger: (optional) the logger to log errors and warnings to.
 
     Returns:
         Whatever the operation.result() returns.
 
     Raises:
-        This method will raise the exception received from `operation.exception()`
-        or RuntimeError if there is no exception set, but there is an `error_code`
-        set for the `operation`.
+        This method will raise a `GcpOperationError` with the `error_code` of the
+        `operation`, chained to the exception received from `operation.exception()`.
 
         In case of an operation taking longer than `timeout` seconds to complete,
-        a `concurrent.futures.TimeoutError` will be raised.
+        an `asyncio.TimeoutError` will be raised, and a `DeadlineExceededError`
+        once the deadline of the current call has passed.
     """
-    result = operation.result(timeout=timeout)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+
+    while not await executor.run(scope, operation.done):
+        sleep_for = poll_interval
+        if deadline is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(
+                    f"{verbose_name} did not finish within {timeout} seconds"
+                )
+            sleep_for = min(poll_interval, remaining)
+        # the next poll fails fast once the deadline of the call has passed
+        await asyncio.sleep(cap_timeout(sleep_for))
+
+    result = await executor.run(scope, operation.result)
 
     if operation.error_code:
         if logger:
@@ -65,7 +115,10 @@ def wait_for_extended_operation(
                 f"Error during {verbose_name}: [Code: {operation.error_code}]: {operation.error_message}\n"
                 f"Operation ID: {operation.name}"
             )
-        raise operation.exception() or RuntimeError(operation.error_message)
+        raise GcpOperationError(
+            error_code=operation.error_code,
+            error_message=operation.error_message,
+        ) from operation.exception()
 
     if operation.warnings:
         if logger:
@@ -83,6 +136,20 @@ def wait_for_extended_operation(
 class AsyncSessionDsmGcpService(SessionDsmServicer):
     full_name: str = DESCRIPTOR.services_by_name["SessionDsm"].full_name
 
+    instance_labels: Dict[str, str] = {"managed-by": "session-dsm-plugin"}
+    # identifies the plugin deployment that created an instance, shared by its
+    # workers and restarts
+    OWNER_LABEL: str = "session-dsm-owner"
+    # identifies the process that created an instance
+    PROCESS_LABEL: str = "session-dsm-process"
+    # identify the session an instance serves, set when the session is assigned
+    NAMESPACE_LABEL: str = "session-dsm-namespace"
+    SESSION_LABEL: str = "session-dsm-session"
+
+    DEFAULT_MAX_ASSIGNED_INSTANCES: int = 10000
+    DEFAULT_OWNER_ID: str = "default"
+    DEFAULT_ALWAYS_FIND_INSTANCES: bool = False
+
     aws_to_gcp_region_map: Dict[str, str] = {
         "us-east-1": "us-east1",
         "us-east-2": "us-east4",
@@ -167,6 +234,27 @@ class AsyncSessionDsmGcpService(SessionDsmServicer):
         image_open_port: int,
         max_retries: int = 3,
         retry_interval: float = 5,
+        max_workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        circuit_failure_threshold: Optional[int] = None,
+        circuit_reset_timeout: Optional[float] = None,
+        operation_poll_interval: float = 1.0,
+        ready_min_interval: Optional[float] = None,
+        ready_max_interval: Optional[float] = None,
+        warm_pool: Optional[GcpWarmPool] = None,
+        instance_template: Optional[str] = None,
+        zone_block_duration: Optional[float] = None,
+        zone_max_attempts: Optional[int] = None,
+        region_race: Optional[bool] = None,
+        delete_batch_size: Optional[int] = None,
+        delete_batch_delay: Optional[float] = None,
+        delete_verify_interval: Optional[float] = None,
+        delete_max_attempts: Optional[int] = None,
+        max_assigned_instances: Optional[int] = None,
+        owner_id: Optional[str] = None,
+        always_find_instances: Optional[bool] = None,
+        instances_client: Optional[compute_v1.InstancesClient] = None,
+        payload_logger: Optional[PayloadLogger] = None,
         logger: Optional[Logger] = None,
     ) -> None:
         self.service_account_file = service_account_file
@@ -180,12 +268,99 @@ class AsyncSessionDsmGcpService(SessionDsmServicer):
         self.max_retries = max_retries
         self.retry_interval = retry_interval
 
+        self.operation_poll_interval = operation_poll_interval
+
+        self.instance_template = instance_template
+        self.owner_id = self.to_label_value(owner_id or self.DEFAULT_OWNER_ID)
+        self.process_id = uuid.uuid4().hex[:16]
+        self.instance_labels = {
+            **self.instance_labels,
+            self.OWNER_LABEL: self.owner_id,
+            self.PROCESS_LABEL: self.process_id,
+        }
+        # prebuilt instance resources per (deployment, zone, machine_type)
+        self.instance_prototypes: Dict[Tuple[str, str, str], Any] = {}
+
         self.logger = logger
+        self.payload_logger = (
+            payload_logger if payload_logger is not None else PayloadLogger(logger)
+        )
 
-        self.credentials = service_account.Credentials.from_service_account_file(
-            filename=service_account_file,
+        self.executor = ProviderExecutor(
+            provider="GCP",
+            max_workers=max_workers,
+            max_concurrency=max_concurrency,
+            failure_threshold=circuit_failure_threshold,
+            reset_timeout=circuit_reset_timeout,
+            is_failure=self.is_backend_failure,
+        )
+
+        if instances_client is None:
+            self.credentials = service_account.Credentials.from_service_account_file(
+                filename=service_account_file,
+            )
+            instances_client = compute_v1.InstancesClient(credentials=self.credentials)
+        self.instances_client = instances_client
+
+        self.readiness_watcher = GcpReadinessWatcher(
+            instances_client=self.instances_client,
+            executor=self.executor,
+            project_id=self.project_id,
+            min_interval=ready_min_interval,
+            max_interval=(
+                ready_max_interval if ready_max_interval is not None else retry_interval
+            ),
+            logger=self.logger,
+        )
+
+        self.zone_scheduler = GcpZoneScheduler(
+            block_duration=zone_block_duration,
+            logger=self.logger,
+        )
+        self.zone_max_attempts = zone_max_attempts
+
+        self.region_router: RegionRouter[Tuple[str, str, str]] = RegionRouter(
+            provider="GCP",
+            is_supported=self.is_region_supported,
+            is_healthy=self.is_region_healthy,
+            race=region_race,
+            logger=self.logger,
+        )
+        self.background_tasks: Set[asyncio.Task] = set()
+
+        # instances of ended sessions are deleted in the background
+        self.delete_tracker = GcpDeleteTracker(
+            instances_client=self.instances_client,
+            executor=self.executor,
+            project_id=self.project_id,
+            batch_size=delete_batch_size,
+            batch_delay=delete_batch_delay,
+            verify_interval=delete_verify_interval,
+            max_attempts=delete_max_attempts,
+            logger=self.logger,
+        )
+
+        # instances of the sessions created by this process, by (namespace, session ID);
+        # other sessions are looked up by their session labels
+        self.max_assigned_instances = (
+            max_assigned_instances
+            if max_assigned_instances is not None
+            else self.DEFAULT_MAX_ASSIGNED_INSTANCES
+        )
+        self.assigned_instances: OrderedDict[Tuple[str, str], Tuple[str, str]] = (
+            OrderedDict()
+        )
+        # with several workers, a retried CreateGameSession can create a second
+        # instance on another worker, so terminations also look up the labels
+        self.always_find_instances = (
+            always_find_instances
+            if always_find_instances is not None
+            else self.DEFAULT_ALWAYS_FIND_INSTANCES
         )
-        self.instances_client = compute_v1.InstancesClient(credentials=self.credentials)
+
+        self.warm_pool = warm_pool
+        if self.warm_pool is not None:
+            self.warm_pool.bind(service=self)
 
     async def delete_instance(self, instance_name: str, zone: str) -> Tuple[bool, str]:
         di_request = compute_v1.DeleteInstanceRequest(
@@ -194,16 +369,21 @@ class AsyncSessionDsmGcpService(SessionDsmServicer):
             instance=instance_name,
         )
 
-        di_operation = self.instances_client.delete(
-            request=di_request,
-        )
-
         success: bool = True
         message: str = ""
         try:
-            di_response = wait_for_extended_operation(
+            di_operation = await self.executor.run(
+                zone,
+                self.instances_client.delete,
+                request=di_request,
+            )
+
+            di_response = await wait_for_extended_operation(
                 operation=di_operation,
+                executor=self.executor,
+                scope=zone,
                 verbose_name="DeleteInstanceRequest",
+                poll_interval=self.operation_poll_interval,
                 logger=self.logger,
             )
 
@@ -215,197 +395,574 @@ class AsyncSessionDsmGcpService(SessionDsmServicer):
 
         return success, message
 
-    async def CreateGameSession(
-        self, request: RequestCreateGameSession, context: ServicerContext
-    ) -> ResponseCreateGameSession:
-        self.log_payload(f"{self.CreateGameSession.__name__} request: %s", request)
-
-        response = ResponseCreateGameSession()
-
-        if len(request.requested_region) == 0:
-            code: StatusCode = StatusCode.INVALID_ARGUMENT
-            details: str = "Please provide requested region."
-            await context.abort(code=code, details=details)
-
-        selected_region = request.requested_region[0]
-
-        # translate
-        if selected_region not in self.aws_to_gcp_region_map:
-            code: StatusCode = StatusCode.INVALID_ARGUMENT
-            details: str = f"Unknown AWS Region: {selected_region}"
-            await context.abort(code=code, details=details)
-
-        gcp_region = self.aws_to_gcp_region_map[selected_region]
-
-        if gcp_region not in self.gcp_zones_map:
-            code: StatusCode = StatusCode.INVALID_ARGUMENT
-            details: str = f"Unknown GCP Region: {gcp_region}"
-            await context.abort(code=code, details=details)
-
-        gcp_zones = self.gcp_zones_map[gcp_region]
-        gcp_zone = random.choice(gcp_zones)
-
-        try:
-            instance_name: str = f"{request.namespace}-{request.session_id}"
-
-            machine_type = self.machine_type
-
-            if "{zone}" in machine_type:
-                machine_type = machine_type.replace("{zone}", gcp_zone)
+    def build_container_declaration(self, instance_name: str, deployment: str) -> str:
+        return (
+            f"spec:\n"
+            f"  containers:\n"
+            f"  - name: {instance_name}\n"
+            f"    image: {self.repository_name}/{deployment}\n"
+            f"    env:\n"
+            f"    - name: SESSION_ID\n"
+            f"      value: {instance_name}\n"
+            f"    securityContext:\n"
+            f"      privileged: true\n"
+            f"    stdin: true\n"
+            f"    tty: true\n"
+            f"  restartPolicy: Never\n"
+            f"# This container declaration format is not public API and may change without notice.\n"
+            f"# Please use gcloud command-line tool or Google Cloud Console to run Containers on\n"
+            f"# Google Compute Engine."
+        )
 
-            instance_resource = compute_v1.Instance(
-                name=instance_name,
-                machine_type=machine_type,
-                shielded_instance_config=compute_v1.ShieldedInstanceConfig(
-                    enable_integrity_monitoring=True,
-                    enable_secure_boot=True,
-                    enable_vtpm=True,
-                ),
-                reservation_affinity=compute_v1.ReservationAffinity(
-                    consume_reservation_type="ANY_RESERVATION",
-                ),
-                confidential_instance_config=compute_v1.ConfidentialInstanceConfig(
-                    enable_confidential_compute=False,
+    def build_instance(
+        self,
+        instance_name: str,
+        deployment: str,
+        gcp_region: str,
+        gcp_zone: str,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> compute_v1.Instance:
+        machine_type = self.machine_type
+
+        if "{zone}" in machine_type:
+            machine_type = machine_type.replace("{zone}", gcp_zone)
+
+        return compute_v1.Instance(
+            name=instance_name,
+            machine_type=machine_type,
+            labels={**self.instance_labels, **(labels or {})},
+            shielded_instance_config=compute_v1.ShieldedInstanceConfig(
+                enable_integrity_monitoring=True,
+                enable_secure_boot=True,
+                enable_vtpm=True,
+            ),
+            reservation_affinity=compute_v1.ReservationAffinity(
+                consume_reservation_type="ANY_RESERVATION",
+            ),
+            confidential_instance_config=compute_v1.ConfidentialInstanceConfig(
+                enable_confidential_compute=False,
+            ),
+            tags=compute_v1.Tags(
+                items=[
+                    "http-server",
+                    "https-server",
+                ],
+            ),
+            metadata=compute_v1.Metadata(
+                items=[
+                    compute_v1.Items(
+                        key="gce-container-declaration",
+                        value=self.build_container_declaration(
+                            instance_name=instance_name,
+                            deployment=deployment,
+                        ),
+                    )
+                ],
+            ),
+            disks=[
+                compute_v1.AttachedDisk(
+                    auto_delete=True,
+                    boot=True,
+                    device_name=f"{instance_name}-disk",
+                    initialize_params=compute_v1.AttachedDiskInitializeParams(
+                        disk_size_gb=10,
+                        disk_type=f"projects/{self.project_id}/zones/{gcp_zone}/diskTypes/pd-balanced",
+                        source_image="projects/cos-cloud/global/images/cos-stable-113-18244-85-5",
+                    ),
+                    mode="READ_WRITE",
+                    type="PERSISTENT",
                 ),
-                tags=compute_v1.Tags(
-                    items=[
-                        "http-server",
-                        "https-server",
+            ],
+            network_interfaces=[
+                compute_v1.NetworkInterface(
+                    stack_type="IPV4_ONLY",
+                    subnetwork=f"projects/{self.project_id}/regions/{gcp_region}/subnetworks/{self.network_name}",
+                    access_configs=[
+                        compute_v1.AccessConfig(
+                            name="External NAT",
+                            network_tier="PREMIUM",
+                        )
                     ],
                 ),
+            ],
+        )
+
+    def render_instance(
+        self,
+        instance_name: str,
+        deployment: str,
+        gcp_region: str,
+        gcp_zone: str,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> compute_v1.Instance:
+        container_declaration = self.build_container_declaration(
+            instance_name=instance_name,
+            deployment=deployment,
+        )
+
+        if self.instance_template:
+            # everything else comes from the instance template
+            return compute_v1.Instance(
+                name=instance_name,
+                labels={**self.instance_labels, **(labels or {})},
                 metadata=compute_v1.Metadata(
                     items=[
                         compute_v1.Items(
                             key="gce-container-declaration",
-                            value=(
-                                f"spec:\n"
-                                f"  containers:\n"
-                                f"  - name: {instance_name}\n"
-                                f"    image: {self.repository_name}/{request.deployment}\n"
-                                f"    env:\n"
-                                f"    - name: SESSION_ID\n"
-                                f"      value: {instance_name}\n"
-                                f"    securityContext:\n"
-                                f"      privileged: true\n"
-                                f"    stdin: true\n"
-                                f"    tty: true\n"
-                                f"  restartPolicy: Never\n"
-                                f"# This container declaration format is not public API and may change without notice.\n"
-                                f"# Please use gcloud command-line tool or Google Cloud Console to run Containers on\n"
-                                f"# Google Compute Engine."
-                            ),
+                            value=container_declaration,
                         )
                     ],
                 ),
-                disks=[
-                    compute_v1.AttachedDisk(
-                        auto_delete=True,
-                        boot=True,
-                        device_name=f"{instance_name}-disk",
-                        initialize_params=compute_v1.AttachedDiskInitializeParams(
-                            disk_size_gb=10,
-                            disk_type=f"projects/{self.project_id}/zones/{gcp_zone}/diskTypes/pd-balanced",
-                            source_image="projects/cos-cloud/global/images/cos-stable-113-18244-85-5",
-                        ),
-                        mode="READ_WRITE",
-                        type="PERSISTENT",
-                    ),
-                ],
-                network_interfaces=[
-                    compute_v1.NetworkInterface(
-                        stack_type="IPV4_ONLY",
-                        subnetwork=f"projects/{self.project_id}/regions/{gcp_region}/subnetworks/{self.network_name}",
-                        access_configs=[
-                            compute_v1.AccessConfig(
-                                name="External NAT",
-                                network_tier="PREMIUM",
-                            )
-                        ],
-                    ),
-                ],
             )
 
-            ii_request = compute_v1.InsertInstanceRequest(
-                project=self.project_id,
-                zone=gcp_zone,
-                instance_resource=instance_resource,
+        key = (deployment, gcp_zone, self.machine_type)
+        prototype = self.instance_prototypes.get(key)
+        if prototype is None:
+            prototype = compute_v1.Instance.pb(
+                self.build_instance(
+                    instance_name="",
+                    deployment=deployment,
+                    gcp_region=gcp_region,
+                    gcp_zone=gcp_zone,
+                )
             )
+            self.instance_prototypes[key] = prototype
 
-            ii_operation = self.instances_client.insert(
+        # copying the raw protobuf message skips the proto-plus marshalling
+        instance = type(prototype)()
+        instance.CopyFrom(prototype)
+        instance.name = instance_name
+        instance.disks[0].device_name = f"{instance_name}-disk"
+        instance.metadata.items[0].value = container_declaration
+        if labels:
+            instance.labels.update(labels)
+
+        return compute_v1.Instance.wrap(instance)
+
+    async def provision_instance(
+        self,
+        instance_name: str,
+        deployment: str,
+        gcp_region: str,
+        gcp_zone: str,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> compute_v1.Instance:
+        instance_resource = self.render_instance(
+            instance_name=instance_name,
+            deployment=deployment,
+            gcp_region=gcp_region,
+            gcp_zone=gcp_zone,
+            labels=labels,
+        )
+
+        ii_request = compute_v1.InsertInstanceRequest(
+            project=self.project_id,
+            zone=gcp_zone,
+            instance_resource=instance_resource,
+        )
+        if self.instance_template:
+            ii_request.source_instance_template = self.instance_template.replace(
+                "{region}", gcp_region
+            )
+
+        # the insert keeps running on its worker thread even if this call is cancelled
+        insert = asyncio.ensure_future(
+            self.executor.run(
+                gcp_zone,
+                self.instances_client.insert,
                 request=ii_request,
             )
+        )
 
-            ii_response = wait_for_extended_operation(
+        try:
+            ii_operation = await asyncio.shield(insert)
+
+            ii_response = await wait_for_extended_operation(
                 operation=ii_operation,
+                executor=self.executor,
+                scope=gcp_zone,
                 verbose_name="InsertInstanceRequest",
+                poll_interval=self.operation_poll_interval,
                 logger=self.logger,
             )
 
-            gi_request = compute_v1.GetInstanceRequest(
-                project=self.project_id,
+            return await self.readiness_watcher.wait_until_running(
+                instance_name=instance_name,
                 zone=gcp_zone,
-                instance=instance_name,
+                timeout=self.max_retries * self.retry_interval,
+            )
+        except BaseException as exception:
+            # the instance may exist even though the creation failed, e.g. when
+            # polling the operation fails, so it is deleted in the background
+            # before the next zone is tried (the deadline of the call may be over)
+            self.spawn(
+                self.discard_instance(
+                    insert=insert, instance_name=instance_name, zone=gcp_zone
+                )
             )
+            if isinstance(exception, asyncio.TimeoutError) and not isinstance(
+                exception, DeadlineExceededError
+            ):
+                check_deadline(verbose_name="InsertInstanceRequest")
+                raise Exception("Instance creation process failed.") from exception
+            raise
+
+    async def discard_instance(
+        self, insert: asyncio.Future, instance_name: str, zone: str
+    ) -> None:
+        # wait for the insert to land first, or the delete could run before it
+        try:
+            operation = await insert
+        except (CircuitOpenError, core_exceptions.ClientError):
+            # never issued or rejected, a conflict means the name belongs to
+            # another instance
+            return
+        except Exception:
+            # e.g. a server error or a lost connection, the request may still
+            # have created the instance
+            operation = None
+
+        if operation is not None:
+            try:
+                await wait_for_extended_operation(
+                    operation=operation,
+                    executor=self.executor,
+                    scope=zone,
+                    verbose_name="InsertInstanceRequest",
+                    poll_interval=self.operation_poll_interval,
+                )
+            except Exception:
+                pass
+
+        # instances that do not exist count as deleted
+        self.delete_tracker.enqueue(instance_name=instance_name, zone=zone)
 
-            instance_ready: bool = False
-            check_retry: int = 0
-            while True:
-                gi_response = self.instances_client.get(
-                    request=gi_request,
+    async def release_instance(self, instance_name: str, zone: str) -> None:
+        self.delete_tracker.enqueue(instance_name=instance_name, zone=zone)
+
+    def spawn(self, coroutine) -> None:
+        task = spawn_detached(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def provision_instance_in_region(
+        self,
+        instance_name: str,
+        deployment: str,
+        gcp_region: str,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> Tuple[compute_v1.Instance, str]:
+        zones = self.zone_scheduler.rank(self.gcp_zones_map[gcp_region])
+        # zones with an open circuit last, they would fail right away
+        zones.sort(key=lambda zone: not self.executor.is_available(zone))
+        if self.zone_max_attempts:
+            zones = zones[: self.zone_max_attempts]
+
+        started_at = time.monotonic()
+        exception: Optional[Exception] = None
+        for gcp_zone in zones:
+            attempt_started_at = time.monotonic()
+            try:
+                instance = await self.provision_instance(
+                    instance_name=instance_name,
+                    deployment=deployment,
+                    gcp_region=gcp_region,
+                    gcp_zone=gcp_zone,
+                    labels=labels,
                 )
+            except DeadlineExceededError:
+                # no time left to try another zone
+                raise
+            except Exception as e:
+                exception = e
+                if not isinstance(e, CircuitOpenError):
+                    self.zone_scheduler.record_failure(zone=gcp_zone, exception=e)
+                if self.logger:
+                    self.logger.warning(
+                        f"Failed to provision {instance_name} in {gcp_zone}: {e}"
+                    )
+                continue
 
-                if gi_response.status == "RUNNING":
-                    instance_ready = True
-                    break
-
-                check_retry += 1
-                if check_retry == self.max_retries:
-                    break
-                await asyncio.sleep(self.retry_interval)
-
-            if instance_ready:
-                external_ip: str = ""
-                for network_interface in gi_response.network_interfaces:
-                    if len(network_interface.access_configs) > 0:
-                        external_ip = network_interface.access_configs[0].nat_i_p
-                        break
-
-                response.client_version = request.client_version
-                response.created_region = gcp_zone
-                response.deployment = request.deployment
-                response.game_mode = request.game_mode
-                response.namespace = request.namespace
-                response.port = self.image_open_port
-                response.region = selected_region
-                response.server_id = instance_name
-                response.session_data = request.session_data
-                response.session_id = request.session_id
-                response.source = "GCP"
-                response.status = "READY"
-
-                response.ip = external_ip
-
-                self.log_payload(
-                    f"{self.CreateGameSession.__name__} response: %s", response
+            now = time.monotonic()
+            self.zone_scheduler.record_success(
+                zone=gcp_zone, latency=now - attempt_started_at
+            )
+            if exception is not None:
+                ZONE_FAILOVER_SECONDS.labels(region=gcp_region).observe(
+                    attempt_started_at - started_at
                 )
+            return instance, gcp_zone
 
-                # success
+        assert exception is not None
+        raise exception
 
-            else:
-                # clean-up
+    async def assign_instance(
+        self, instance: compute_v1.Instance, zone: str, namespace: str, session_id: str
+    ) -> None:
+        # pooled instances are booted before the session exists, so the session is
+        # published through the instance metadata instead of the SESSION_ID env var,
+        # and through the session labels that TerminateGameSession looks it up by.
+        await asyncio.gather(
+            self.set_session_metadata(
+                instance=instance,
+                zone=zone,
+                namespace=namespace,
+                session_id=session_id,
+            ),
+            self.set_session_labels(
+                instance=instance,
+                zone=zone,
+                namespace=namespace,
+                session_id=session_id,
+            ),
+        )
 
-                delete_success, _ = await self.delete_instance(
-                    instance_name=instance_name,
-                    zone=gcp_zone,
+    async def set_session_metadata(
+        self, instance: compute_v1.Instance, zone: str, namespace: str, session_id: str
+    ) -> None:
+        items = [
+            item
+            for item in instance.metadata.items
+            if item.key not in ("namespace", "session-id")
+        ]
+        items.append(compute_v1.Items(key="namespace", value=namespace))
+        items.append(compute_v1.Items(key="session-id", value=session_id))
+
+        sm_request = compute_v1.SetMetadataInstanceRequest(
+            project=self.project_id,
+            zone=zone,
+            instance=instance.name,
+            metadata_resource=compute_v1.Metadata(
+                fingerprint=instance.metadata.fingerprint,
+                items=items,
+            ),
+        )
+
+        sm_operation = await self.executor.run(
+            zone,
+            self.instances_client.set_metadata,
+            request=sm_request,
+        )
+
+        await wait_for_extended_operation(
+            operation=sm_operation,
+            executor=self.executor,
+            scope=zone,
+            verbose_name="SetMetadataInstanceRequest",
+            poll_interval=self.operation_poll_interval,
+            logger=self.logger,
+        )
+
+    async def set_session_labels(
+        self, instance: compute_v1.Instance, zone: str, namespace: str, session_id: str
+    ) -> None:
+        sl_request = compute_v1.SetLabelsInstanceRequest(
+            project=self.project_id,
+            zone=zone,
+            instance=instance.name,
+            instances_set_labels_request_resource=compute_v1.InstancesSetLabelsRequest(
+                label_fingerprint=instance.label_fingerprint,
+                labels={
+                    **instance.labels,
+                    **self.get_session_labels(
+                        namespace=namespace, session_id=session_id
+                    ),
+                },
+            ),
+        )
+
+        sl_operation = await self.executor.run(
+            zone,
+            self.instances_client.set_labels,
+            request=sl_request,
+        )
+
+        await wait_for_extended_operation(
+            operation=sl_operation,
+            executor=self.executor,
+            scope=zone,
+            verbose_name="SetLabelsInstanceRequest",
+            poll_interval=self.operation_poll_interval,
+            logger=self.logger,
+        )
+
+    def get_session_labels(self, namespace: str, session_id: str) -> Dict[str, str]:
+        return {
+            self.NAMESPACE_LABEL: self.to_label_value(namespace),
+            self.SESSION_LABEL: self.to_label_value(session_id),
+        }
+
+    @staticmethod
+    def to_label_value(value: str) -> str:
+        # label values are at most 63 lowercase letters, digits, "_" and "-"
+        return re.sub(r"[^a-z0-9_-]", "-", value.lower())[:63]
+
+    async def find_session_instances(
+        self, namespace: str, session_id: str
+    ) -> List[Tuple[str, str]]:
+        """Returns the (name, zone) of the instances labelled with the session."""
+        labels = self.get_session_labels(namespace=namespace, session_id=session_id)
+        request = compute_v1.AggregatedListInstancesRequest(
+            project=self.project_id,
+            filter=" AND ".join(
+                f'(labels.{key} = "{value}")' for key, value in labels.items()
+            ),
+            return_partial_success=True,
+        )
+        return await self.executor.run(
+            "aggregated", self.list_instances_by_zone, request
+        )
+
+    def list_instances_by_zone(
+        self, request: compute_v1.AggregatedListInstancesRequest
+    ) -> List[Tuple[str, str]]:
+        # the pager fetches the remaining pages lazily, so drain it on the worker thread
+        instances = []
+        for scope, scoped_list in self.instances_client.aggregated_list(
+            request=request
+        ):
+            # scopes are named "zones/<zone>"
+            zone = scope.rsplit("/", 1)[-1]
+            instances.extend(
+                (instance.name, zone) for instance in scoped_list.instances
+            )
+        return instances
+
+    @staticmethod
+    def get_external_ip(instance: compute_v1.Instance) -> str:
+        for network_interface in instance.network_interfaces:
+            if len(network_interface.access_configs) > 0:
+                return network_interface.access_configs[0].nat_i_p
+        return ""
+
+    def is_region_supported(self, region: str) -> bool:
+        return self.aws_to_gcp_region_map.get(region) in self.gcp_zones_map
+
+    def is_region_healthy(self, region: str) -> bool:
+        gcp_region = self.aws_to_gcp_region_map[region]
+        zones = [
+            zone
+            for zone in self.gcp_zones_map[gcp_region]
+            if self.executor.is_available(zone)
+        ]
+        return self.zone_scheduler.is_available(zones)
+
+    @staticmethod
+    def is_backend_failure(exception: BaseException) -> bool:
+        # 5xx, rate limiting, and connection errors and timeouts
+        return isinstance(
+            exception,
+            (core_exceptions.ServerError, core_exceptions.TooManyRequests, OSError),
+        )
+
+    async def create_in_region(
+        self, request: RequestCreateGameSession, selected_region: str
+    ) -> Tuple[str, str, str]:
+        gcp_region = self.aws_to_gcp_region_map[selected_region]
+
+        warm_instance: Optional[GcpWarmInstance] = None
+        if self.warm_pool is not None:
+            warm_instance = self.warm_pool.acquire(
+                gcp_region=gcp_region,
+                deployment=request.deployment,
+            )
+
+        if warm_instance is not None:
+            try:
+                await self.assign_instance(
+                    instance=warm_instance.instance,
+                    zone=warm_instance.zone,
+                    namespace=request.namespace,
+                    session_id=request.session_id,
                 )
+            except BaseException:
+                self.delete_tracker.enqueue(
+                    instance_name=warm_instance.name, zone=warm_instance.zone
+                )
+                raise
+            return warm_instance.name, warm_instance.zone, warm_instance.ip
 
-                if delete_success:
-                    raise Exception("Instance creation process failed.")
-                else:
-                    raise Exception(
-                        "Instance creation process isn't finish and failed to delete it."
-                    )
+        instance_name = f"{request.namespace}-{request.session_id}"
+        instance, gcp_zone = await self.provision_instance_in_region(
+            instance_name=instance_name,
+            deployment=request.deployment,
+            gcp_region=gcp_region,
+            labels=self.get_session_labels(
+                namespace=request.namespace, session_id=request.session_id
+            ),
+        )
+        return instance_name, gcp_zone, self.get_external_ip(instance)
+
+    async def CreateGameSession(
+        self, request: RequestCreateGameSession, context: ServicerContext
+    ) -> ResponseCreateGameSession:
+        self.payload_logger.log(
+            f"{self.CreateGameSession.__name__} request: %s", request
+        )
+        set_deadline(context)
+
+        response = ResponseCreateGameSession()
+
+        if len(request.requested_region) == 0:
+            code: StatusCode = StatusCode.INVALID_ARGUMENT
+            details: str = "Please provide requested region."
+            await context.abort(code=code, details=details)
+
+        try:
+            selected_region, (instance_name, gcp_zone, external_ip) = (
+                await self.region_router.route(
+                    requested_regions=request.requested_region,
+                    create=lambda region: self.create_in_region(
+                        request=request, selected_region=region
+                    ),
+                    cleanup=lambda region, result: self.release_instance(
+                        instance_name=result[0], zone=result[1]
+                    ),
+                )
+            )
 
+            self.assigned_instances[(request.namespace, request.session_id)] = (
+                instance_name,
+                gcp_zone,
+            )
+            while len(self.assigned_instances) > self.max_assigned_instances:
+                self.assigned_instances.popitem(last=False)
+
+            response.client_version = request.client_version
+            response.created_region = gcp_zone
+            response.deployment = request.deployment
+            response.game_mode = request.game_mode
+            response.namespace = request.namespace
+            response.port = self.image_open_port
+            response.region = selected_region
+            response.server_id = instance_name
+            response.session_data = request.session_data
+            response.session_id = request.session_id
+            response.source = "GCP"
+            response.status = "READY"
+
+            response.ip = external_ip
+
+            self.payload_logger.log(
+                f"{self.CreateGameSession.__name__} response: %s", response
+            )
+
+        except NoRegionAvailableError as exception:
+            code: StatusCode = StatusCode.INVALID_ARGUMENT
+            details: str = str(exception)
+            await context.abort(code=code, details=details)
+        except CircuitOpenError as exception:
+            code: StatusCode = StatusCode.UNAVAILABLE
+            details: str = f"CreateGameSession Exception: {exception}"
+            await context.abort(
+                code=code,
+                details=details,
+                trailing_metadata=get_retry_pushback(exception),
+            )
+        except DeadlineExceededError as exception:
+            code: StatusCode = StatusCode.DEADLINE_EXCEEDED
+            details: str = f"CreateGameSession Exception: {exception}"
+            await context.abort(code=code, details=details)
         except Exception as exception:
             code: StatusCode = StatusCode.INTERNAL
             details: str = f"CreateGameSession Exception: {exception}"
@@ -416,41 +973,49 @@ class AsyncSessionDsmGcpService(SessionDsmServicer):
     async def TerminateGameSession(
         self, request: RequestTerminateGameSession, context: ServicerContext
     ) -> ResponseTerminateGameSession:
-        self.log_payload(f"{self.TerminateGameSession.__name__} request: %s", request)
-
-        instance_name = f"{request.namespace}-{request.session_id}"
+        self.payload_logger.log(
+            f"{self.TerminateGameSession.__name__} request: %s", request
+        )
 
-        success, message = await self.delete_instance(
-            instance_name=instance_name,
-            zone=request.zone,
+        instance = self.assigned_instances.pop(
+            (request.namespace, request.session_id), None
         )
+        instances = [instance] if instance is not None else []
+        if instance is None or self.always_find_instances:
+            # created by another worker or before a restart
+            try:
+                found = await self.find_session_instances(
+                    namespace=request.namespace, session_id=request.session_id
+                )
+            except Exception as exception:
+                if not instances:
+                    code: StatusCode = StatusCode.INTERNAL
+                    details: str = f"TerminateGameSession Exception: {exception}"
+                    await context.abort(code=code, details=details)
+                if self.logger:
+                    self.logger.warning(
+                        f"Failed to look up the instances of session"
+                        f" {request.session_id}: {exception}"
+                    )
+            else:
+                instances.extend(i for i in found if i not in instances)
 
-        if not success:
-            code: StatusCode = StatusCode.INTERNAL
-            details: str = f"TerminateGameSession Exception: Could not delete instance: {instance_name}"
-            await context.abort(code=code, details=details)
+        for instance_name, zone in instances:
+            self.delete_tracker.enqueue(instance_name=instance_name, zone=zone)
 
         response = ResponseTerminateGameSession()
 
         response.namespace = request.namespace
-        response.reason = message
+        response.reason = "deletion queued" if instances else "no instance found"
         response.session_id = request.session_id
         response.success = True
 
-        self.log_payload(f"{self.TerminateGameSession.__name__} response: %s", response)
+        self.payload_logger.log(
+            f"{self.TerminateGameSession.__name__} response: %s", response
+        )
 
         return response
 
-    # noinspection PyShadowingBuiltins
-    def log_payload(self, format: str, payload: Any) -> None:
-        if not self.logger:
-            return
-
-        payload_dict = MessageToDict(payload, preserving_proto_field_name=True)
-        payload_json = json.dumps(payload_dict)
-
-        self.logger.info(format % payload_json)
-
 
 __all__ = [
     "AsyncSessionDsmGcpService",
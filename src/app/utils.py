@@ -17,11 +17,14 @@ def create_env(**kwargs) -> Env:
 
     ds_provider = env("DS_PROVIDER", "DEMO")
     if ds_provider == "GAMELIFT":
-        env("AWS_ACCESS_KEY_ID")
-        env("AWS_SECRET_ACCESS_KEY")
-        env("AWS_REGION", env("GAMELIFT_REGION"))
+        # the fake client needs no credentials or region
+        if env.str("GAMELIFT_CLIENT", "AWS").upper() != "FAKE":
+            env("AWS_ACCESS_KEY_ID")
+            env("AWS_SECRET_ACCESS_KEY")
+            env("AWS_REGION", env("GAMELIFT_REGION"))
     elif ds_provider == "GCP":
-        env("GCP_SERVICE_ACCOUNT_FILE")
+        if env.str("GCP_CLIENT", "GCP").upper() != "FAKE":
+            env("GCP_SERVICE_ACCOUNT_FILE")
         env("GCP_PROJECT_ID")
         env("GCP_MACHINE_TYPE")
         env("GCP_REPOSITORY")